@@ -0,0 +1,45 @@
+import argparse
+import logging
+
+from bulk_mode import DeferredIndexes, load_lock
+from instrumentation import metrics
+from main import ingest, ingest_sources
+from partitions import event_partitions
+from setup import SOURCES
+from sources import load_sources
+
+logger = logging.getLogger("__name__")
+logging.basicConfig(level=logging.INFO)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Loads usage data sources in bulk mode (an initial history load or a backfill)"
+    )
+    parser.add_argument(
+        "--source", action="append", help="name of a source to load (default: all sources)"
+    )
+    parser.add_argument(
+        "--restore",
+        action="store_true",
+        help="only restore indexes and foreign keys of an interrupted bulk load",
+    )
+    args = parser.parse_args()
+
+    # 'event' indexes and foreign keys are dropped for a load and rebuilt after it (also after
+    # a failed one). Loaded events are only deduplicated within a chunk, a resent file is still
+    # skipped by its load manifest. Regular loads don't start meanwhile (see bulk_mode.load_lock)
+    bulk_mode = DeferredIndexes()
+    if args.restore:
+        with load_lock(exclusive=True):
+            bulk_mode.restore()
+    else:
+        event_partitions.ensure_partitions()
+        sources = load_sources([{**config, "bulk": True} for config in SOURCES], args.source)
+        with bulk_mode.deferred():
+            if len(sources) == 1:
+                ingest(sources[0], "backfill")
+            else:
+                ingest_sources(sources)
+    metrics.export("backfill_restore")
+    logger.info("'event' indexes and foreign keys restored")
@@ -0,0 +1,229 @@
+import argparse
+from collections import defaultdict
+from contextlib import contextmanager
+import datetime
+import json
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from data_utils import data_utils
+from generate_data import generate
+from rule_engine import rule_engine
+from setup import (
+    CHUNK_SIZE,
+    COLUMN_NAMES,
+    COLUMN_TYPES,
+    CURRENCY_COLUMNS,
+    DATE_COLUMNS,
+    INTEGER_COLUMNS,
+    READER_BACKEND,
+    VALIDATION_RULES,
+)
+
+logger = logging.getLogger("__name__")
+logging.basicConfig(level=logging.INFO)
+
+# a stage slower than in a compared run by more than this share is reported as a regression
+REGRESSION_THRESHOLD = 0.1
+
+
+class Benchmark:
+    """Accumulates time, processed rows and (optionally) peak allocated memory of ETL stages.
+        Memory tracing (tracemalloc) slows pandas code down many times, so time and memory
+        are measured in separate runs
+
+    Attributes:
+        trace_memory: measure peak allocated memory
+        stages: stage name -> {"rows", "seconds", "peak_bytes"}
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages = defaultdict(lambda: {"rows": 0, "seconds": 0.0, "peak_bytes": 0})
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, rows: int) -> Iterator[None]:
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield
+        stats = self.stages[name]
+        stats["seconds"] += time.perf_counter() - start
+        stats["rows"] += rows
+        if self.trace_memory:
+            stats["peak_bytes"] = max(
+                stats["peak_bytes"], tracemalloc.get_traced_memory()[1] - start_bytes
+            )
+
+    def iterate(self, name: str, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Measures producing chunks (e.g. reading them)"""
+        chunks = iter(chunks)
+        while True:
+            with self.stage(name, 0):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            self.stages[name]["rows"] += chunk.shape[0]
+            yield chunk
+
+    def results(self, memory: Optional["Benchmark"] = None) -> Dict[str, Dict[str, float]]:
+        """Results of stages
+
+        Args:
+            memory (Optional[Benchmark], optional): run with traced memory. Defaults to None.
+
+        Returns:
+            Dict[str, Dict[str, float]]: stage name -> rows, seconds, rows/sec and peak memory
+             (None for stages without traced memory)
+        """
+        results = {}
+        for name, stats in self.stages.items():
+            traced = memory.stages.get(name) if memory is not None else None
+            results[name] = {
+                "rows": stats["rows"],
+                "seconds": round(stats["seconds"], 3),
+                "rows_per_sec": round(stats["rows"] / stats["seconds"], 1)
+                if stats["seconds"]
+                else None,
+                "peak_memory_mb": round(traced["peak_bytes"] / 2**20, 1)
+                if traced
+                else None,
+            }
+        return results
+
+
+def run(
+    path: str,
+    chunksize: int = CHUNK_SIZE,
+    backend: str = READER_BACKEND,
+    db: bool = False,
+    max_chunks: Optional[int] = None,
+    trace_memory: bool = False,
+) -> Benchmark:
+    """Runs ETL stages over a file. Legacy DataUtils validators are chained like in a validation
+        before the rule engine, validate_and_clean_data is timed as a rule engine split it wraps
+
+    Args:
+        path (str): path to a usage file
+        chunksize (int, optional): number of rows in a chunk. Defaults to CHUNK_SIZE.
+        backend (str, optional): reader backend. Defaults to READER_BACKEND.
+        db (bool, optional): also run populate_db and a retention purge of all loaded events
+         (use a dedicated database). Defaults to False.
+        max_chunks (Optional[int], optional): number of chunks to process. Defaults to None (all).
+        trace_memory (bool, optional): measure peak allocated memory. Defaults to False.
+
+    Returns:
+        Benchmark: measured stages
+    """
+    benchmark = Benchmark(trace_memory)
+    if db:
+        # imported only here, as they need a database connection
+        from main import dimension_caches, populate_db
+        from unit_of_work import unit_of_work
+
+    chunks = data_utils.read_csv_chunks(
+        COLUMN_NAMES, chunksize, dtype=COLUMN_TYPES, backend=backend, path=path
+    )
+    for chunk in benchmark.iterate("read_csv_chunks", islice(chunks, max_chunks)):
+        rows = chunk.shape[0]
+        with benchmark.stage("drop_nans", rows):
+            data, _ = data_utils.drop_nans(chunk)
+        with benchmark.stage("validate_convert_date_columns", data.shape[0]):
+            data, _ = data_utils.validate_convert_date_columns(data, DATE_COLUMNS)
+        with benchmark.stage("validate_convert_integer_columns", data.shape[0]):
+            data, _ = data_utils.validate_convert_integer_columns(data, INTEGER_COLUMNS)
+        with benchmark.stage("validate_currency_columns", data.shape[0]):
+            data_utils.validate_currency_columns(data, CURRENCY_COLUMNS)
+        with benchmark.stage("validate_and_clean_data", rows):
+            df, _ = rule_engine.split(chunk, VALIDATION_RULES)
+        if db and not df.empty:
+            with benchmark.stage("populate_db", df.shape[0]):
+                with unit_of_work():
+                    populate_db(df)
+                for cache in dimension_caches.values():
+                    cache.commit()
+
+    if db:
+        from purge import RetentionPurge
+
+        purge = RetentionPurge(throttle_seconds=0)
+        purge.start(datetime.datetime.now() + datetime.timedelta(days=1))
+        with benchmark.stage("purge", 0):
+            benchmark.stages["purge"]["rows"] += purge.delete_events()
+        purge.finish()
+    return benchmark
+
+
+def compare(results: Dict, previous: Dict) -> Dict[str, float]:
+    """Rows/sec of stages relative to a previous run (1.0 - the same speed)
+
+    Args:
+        results (Dict): benchmark results
+        previous (Dict): benchmark results of a previous run
+
+    Returns:
+        Dict[str, float]: stage name -> speed ratio
+    """
+    ratios = {}
+    for name, stats in results["stages"].items():
+        before = previous["stages"].get(name, {}).get("rows_per_sec")
+        if before and stats["rows_per_sec"]:
+            ratios[name] = round(stats["rows_per_sec"] / before, 3)
+    return ratios
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks ETL stages")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--path", help="existing usage file (generated if not given)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--backend", default=READER_BACKEND)
+    parser.add_argument(
+        "--db",
+        action="store_true",
+        help="run populate_db and a purge of all events (use a dedicated database)",
+    )
+    parser.add_argument("--output", help="results file (json)")
+    parser.add_argument("--compare", help="results file of a previous run (json)")
+    args = parser.parse_args()
+
+    path = args.path or f"{os.getcwd()}/benchmark_{args.rows}.csv"
+    if not os.path.exists(path):
+        generate(path, args.rows)
+
+    started_at = datetime.datetime.now()
+    benchmark = run(path, args.chunk_size, args.backend, args.db)
+    # peak memory of stages processing a chunk (database stages aren't repeated)
+    memory = run(path, args.chunk_size, args.backend, max_chunks=1, trace_memory=True)
+    results = {
+        "started_at": started_at.isoformat(),
+        "file": path,
+        "backend": args.backend,
+        "chunk_size": args.chunk_size,
+        # linux reports kilobytes
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": benchmark.results(memory),
+    }
+    if args.compare:
+        with open(args.compare) as file:
+            results["compared_to"] = args.compare
+            results["speed_ratio"] = compare(results, json.load(file))
+        for name, ratio in results["speed_ratio"].items():
+            if ratio < 1 - REGRESSION_THRESHOLD:
+                logger.warning(f"stage '{name}' regressed: {ratio:.2f}x rows/sec")
+
+    output = args.output or f"benchmark_{started_at:%Y%m%d_%H%M%S}.json"
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    logger.info(json.dumps(results["stages"], indent=2))
+    logger.info(f"results saved to '{output}'")
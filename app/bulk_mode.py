@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+import logging
+from typing import Dict, Iterator, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from crud import deferred_definition
+from instrumentation import metrics
+from models import engine
+from setup import BULK_INDEX_WORKERS, BULK_MAINTENANCE_WORK_MEM
+from unit_of_work import pinned_connection, unit_of_work
+
+logger = logging.getLogger("__name__")
+
+# key of a postgres advisory lock of loads: regular loads share it, a bulk load holds it alone
+LOAD_LOCK_KEY = 727001
+
+
+class BulkModeError(Exception):
+    """Raised when a load conflicts with a running or an interrupted bulk load"""
+
+
+@contextmanager
+def load_lock(exclusive: bool = False) -> Iterator[None]:
+    """Holds an advisory lock of loads for a block (on a pinned connection). Regular loads take it
+        shared and run together, a bulk load takes it exclusively, so they never overlap
+
+    Args:
+        exclusive (bool, optional): take a lock exclusively (a bulk load). Defaults to False.
+
+    Raises:
+        BulkModeError: a conflicting load holds a lock
+    """
+    lock, unlock = (
+        ("pg_try_advisory_lock", "pg_advisory_unlock")
+        if exclusive
+        else ("pg_try_advisory_lock_shared", "pg_advisory_unlock_shared")
+    )
+    with pinned_connection() as connection:
+        # a session lock outlives a transaction, crud statements of a block run in their own ones
+        with connection.begin():
+            locked = connection.execute(
+                text(f"SELECT {lock}(:key)"), {"key": LOAD_LOCK_KEY}
+            ).scalar()
+        if not locked:
+            raise BulkModeError(
+                "other loads are running" if exclusive else "a bulk load is running"
+            )
+        try:
+            yield
+        finally:
+            with connection.begin():
+                connection.execute(text(f"SELECT {unlock}(:key)"), {"key": LOAD_LOCK_KEY})
+
+
+class DeferredIndexes:
+    """Bulk mode of a table: secondary indexes and foreign keys are dropped for the time of a bulk
+        load (an initial history load or a backfill), so inserted rows don't maintain them, and are
+        restored after it. Definitions are recorded in the 'deferred_definition' table in the same
+        transaction they're dropped in, so a bulk load interrupted by a crash is continued or
+        restored by the next run
+
+    Attributes:
+        table: table name
+        index_workers: number of indexes rebuilt in parallel (a database connection each)
+        maintenance_work_mem: memory of one index build (postgres setting value)
+    """
+
+    def __init__(
+        self,
+        table: str = "event",
+        index_workers: int = BULK_INDEX_WORKERS,
+        maintenance_work_mem: str = BULK_MAINTENANCE_WORK_MEM,
+    ):
+        self.table = table
+        self.index_workers = index_workers
+        self.maintenance_work_mem = maintenance_work_mem
+
+    def check_restored(self) -> None:
+        """Checks that no indexes or foreign keys of a table are left dropped by a bulk load
+
+        Raises:
+            BulkModeError: an interrupted bulk load wasn't restored
+        """
+        deferred = deferred_definition.get_deferred(self.table)
+        if not deferred.empty:
+            raise BulkModeError(
+                f"{deferred.shape[0]} indexes and foreign keys of '{self.table}' are dropped by an "
+                "interrupted bulk load, run 'backfill.py' to finish it or 'backfill.py --restore'"
+            )
+
+    def _quote(self, name: str) -> str:
+        return engine.dialect.identifier_preparer.quote(name)
+
+    def drop(self) -> int:
+        """Records and drops secondary indexes and foreign keys of a table (in one transaction).
+            Ones already dropped by an interrupted bulk load stay recorded
+
+        Returns:
+            int: number of dropped indexes and foreign keys
+        """
+        with unit_of_work() as connection:
+            recorded = deferred_definition.record(self.table).to_dict("records")
+            for definition in recorded:
+                name = self._quote(definition["name"])
+                if definition["kind"] == "index":
+                    connection.execute(text(f"DROP INDEX {name}"))
+                else:
+                    connection.execute(
+                        text(f"ALTER TABLE {self._quote(self.table)} DROP CONSTRAINT {name}")
+                    )
+        for definition in recorded:
+            logger.info(f"deferred {definition['kind']} '{definition['name']}' of '{self.table}'")
+        return len(recorded)
+
+    def _prepare(self, connection: Connection) -> None:
+        # a build over a whole table outlasts a statement timeout of loads
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+        connection.execute(
+            text("SELECT set_config('maintenance_work_mem', :memory, true)"),
+            {"memory": self.maintenance_work_mem},
+        )
+
+    def _build_index(self, name: str, definition: str) -> None:
+        # a definition of a partitioned index covers a parent table only ('ON ONLY'), without
+        # it indexes of all partitions are built (and attached) by the same statement
+        with metrics.timer("restore_index", name), unit_of_work() as connection:
+            self._prepare(connection)
+            connection.execute(text(definition.replace(" ON ONLY ", " ON ", 1)))
+            deferred_definition.delete([name])
+        logger.info(f"rebuilt index '{name}' of '{self.table}'")
+
+    def _add_foreign_keys(self, foreign_keys: List[Dict[str, str]]) -> None:
+        # one statement, all constraints are validated in one transaction
+        constraints = ", ".join(
+            f"ADD CONSTRAINT {self._quote(key['name'])} {key['definition']}"
+            for key in foreign_keys
+        )
+        with metrics.timer("restore_foreign_keys", self.table), unit_of_work() as connection:
+            self._prepare(connection)
+            connection.execute(text(f"ALTER TABLE {self._quote(self.table)} {constraints}"))
+            deferred_definition.delete([key["name"] for key in foreign_keys])
+        logger.info(f"validated {len(foreign_keys)} foreign keys of '{self.table}'")
+
+    def restore(self) -> None:
+        """Rebuilds recorded indexes in parallel, then adds and validates recorded foreign keys.
+            Every index (and all foreign keys) is restored in its own transaction together with
+            deleting its definition, a failed restore can be repeated
+
+        Raises:
+            Exception: the first error of a failed index build or foreign key validation (raised
+             once all of them were attempted)
+        """
+        deferred = deferred_definition.get_deferred(self.table).to_dict("records")
+        indexes = [item for item in deferred if item["kind"] == "index"]
+        foreign_keys = [item for item in deferred if item["kind"] == "foreign_key"]
+        errors = []
+
+        if indexes:
+            with ThreadPoolExecutor(max_workers=self.index_workers) as executor:
+                # every build runs in an empty context, so it doesn't join a pinned connection
+                # (transaction) of a caller but connects on its own
+                futures = {
+                    executor.submit(
+                        contextvars.Context().run,
+                        self._build_index,
+                        index["name"],
+                        index["definition"],
+                    ): index["name"]
+                    for index in indexes
+                }
+            for future, name in futures.items():
+                error = future.exception()
+                if error is not None:
+                    logger.error(f"index '{name}' of '{self.table}' not rebuilt: {error!r}")
+                    errors.append(error)
+
+        # adding a foreign key locks out index builds of a table, they run after them
+        if foreign_keys:
+            try:
+                self._add_foreign_keys(foreign_keys)
+            except Exception as error:
+                logger.error(f"foreign keys of '{self.table}' not validated: {error!r}")
+                errors.append(error)
+
+        if errors:
+            raise errors[0]
+
+    @contextmanager
+    def deferred(self) -> Iterator[None]:
+        """Drops secondary indexes and foreign keys for a block, restores them when the block exits
+            (also when it raises). A block holds an exclusive load lock (see load_lock)
+
+        Raises:
+            BulkModeError: other loads are running
+        """
+        with load_lock(exclusive=True):
+            self.drop()
+            try:
+                yield
+            except BaseException:
+                # an error of a load is the one reported, a failed restore is repeated later
+                try:
+                    self.restore()
+                except Exception as error:
+                    logger.error(
+                        f"'{self.table}' not restored after a failed bulk load: {error!r}, "
+                        "run 'backfill.py --restore'"
+                    )
+                raise
+            self.restore()
@@ -0,0 +1,133 @@
+from contextlib import contextmanager
+import logging
+import time
+from typing import Iterator, Optional
+
+import pandas as pd
+
+logger = logging.getLogger("__name__")
+
+
+def _status_bytes(field: str) -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"no '{field}' in /proc/self/status")
+
+
+def reset_peak_rss() -> int:
+    """Resets a resident set size high-water mark of this process (Linux)
+
+    Raises:
+        OSError: a high-water mark can't be reset (not Linux, or /proc not writable)
+
+    Returns:
+        int: current resident set size (bytes)
+    """
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+    return _status_bytes("VmRSS")
+
+
+def peak_rss() -> int:
+    """Resident set size high-water mark of this process since the last reset (bytes, Linux)"""
+    return _status_bytes("VmHWM")
+
+
+class AdaptiveChunkSizer:
+    """Picks a number of rows of the next chunk from measurements of processed chunks, so a chunk
+        fits a memory budget and is processed in about a target time. Without a budget and
+        a target the size stays fixed
+
+    Attributes:
+        size: number of rows of the next chunk
+        min_size: lower bound of a chunk size
+        max_size: upper bound of a chunk size
+        memory_budget: max growth of a process resident set size (over its size when a sizer
+         is created) while a chunk is processed, measured by a high-water mark of a process, so
+         memory of anything else it holds meanwhile (e.g. the next chunk read by a pipeline)
+         counts too. Memory retained between chunks (e.g. dimension caches) takes a part of it,
+         but only a peak over a chunk start scales with its rows. Linux only, not enforced
+         elsewhere
+        target_seconds: target time to process a chunk
+    """
+
+    def __init__(
+        self,
+        size: int,
+        min_size: int = 1,
+        max_size: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        target_seconds: Optional[float] = None,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size or size
+        self.size = min(max(size, self.min_size), self.max_size)
+        self.memory_budget = memory_budget
+        self.target_seconds = target_seconds
+        self._base_rss = None
+        if memory_budget is not None:
+            try:
+                self._base_rss = reset_peak_rss()
+            except OSError as error:
+                logger.warning(f"chunk memory budget not enforced, peak RSS unavailable: {error}")
+
+    def next_size(self) -> int:
+        return self.size
+
+    @contextmanager
+    def measure(self, *frames: pd.DataFrame) -> Iterator[None]:
+        """Measures peak memory and time of processing a chunk and adjusts the next chunk size
+
+        Args:
+            frames (pd.DataFrame): dataframes of a chunk (e.g. valid and rejected rows)
+        """
+        rows = sum(frame.shape[0] for frame in frames)
+        chunk_start_rss = None
+        if self._base_rss is not None:
+            chunk_start_rss = reset_peak_rss()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        peak_bytes = retained_bytes = 0
+        if chunk_start_rss is not None:
+            peak_bytes = max(peak_rss() - chunk_start_rss, 0)
+            retained_bytes = max(chunk_start_rss - self._base_rss, 0)
+        self.observe(rows, peak_bytes, seconds, retained_bytes)
+
+    def observe(
+        self, rows: int, peak_bytes: int, seconds: float, retained_bytes: int = 0
+    ) -> int:
+        """Adjusts the next chunk size. A size over a memory budget or a target time is cut down
+            at once, growth is limited to doubling per chunk (one chunk is a noisy sample)
+
+        Args:
+            rows (int): number of rows of a processed chunk
+            peak_bytes (int): peak memory allocated while a chunk was processed (over its start)
+            seconds (float): time a chunk was processed in
+            retained_bytes (int, optional): memory retained before a chunk started (over a base),
+             the rest of a memory budget is left to a chunk. Defaults to 0.
+
+        Returns:
+            int: number of rows of the next chunk
+        """
+        if not rows:
+            return self.size
+
+        target = self.max_size
+        if self.memory_budget is not None and peak_bytes > 0:
+            available = max(self.memory_budget - retained_bytes, 0)
+            target = min(target, available * rows / peak_bytes)
+        if self.target_seconds is not None and seconds > 0:
+            target = min(target, self.target_seconds * rows / seconds)
+        size = int(min(max(min(target, self.size * 2), self.min_size), self.max_size))
+
+        if size != self.size:
+            logger.info(
+                f"chunk size {self.size} -> {size} (last chunk: {rows} rows, "
+                f"peak {peak_bytes / 2**20:.1f} MiB, retained {retained_bytes / 2**20:.1f} MiB, "
+                f"{seconds:.2f} s)"
+            )
+            self.size = size
+        return size
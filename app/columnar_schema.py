@@ -0,0 +1,155 @@
+import datetime
+import decimal
+from functools import lru_cache
+from typing import Annotated, Any, List, NamedTuple, Optional, Type, Union
+from typing import get_args, get_origin, get_type_hints
+
+import pandas as pd
+from pydantic import BaseModel
+
+from data_utils import data_utils
+
+
+class ColumnSpec(NamedTuple):
+    """Column level definition derived from a pydantic model field
+
+    Attributes:
+        name: column name
+        kind: one of 'int', 'str', 'datetime', 'decimal'
+        nullable: whether None/NaN values are allowed
+        scale: max number of digits after a decimal point (decimal columns only), values of
+         a decimal column with a scale are converted to integers scaled by 10**scale
+    """
+
+    name: str
+    kind: str
+    nullable: bool = False
+    scale: Optional[int] = None
+
+
+_KINDS = (
+    (bool, "int"),
+    (int, "int"),
+    (str, "str"),
+    (datetime.datetime, "datetime"),
+    (decimal.Decimal, "decimal"),
+)
+
+
+def _column_spec(name: str, annotation: Any) -> ColumnSpec:
+    nullable = False
+    metadata = []
+    if get_origin(annotation) is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        nullable = len(args) < len(get_args(annotation))
+        annotation = args[0]
+    if get_origin(annotation) is Annotated:
+        annotation, *metadata = get_args(annotation)
+
+    # constrained types (e.g. condecimal) carry constraints as Annotated metadata
+    scale = None
+    for item in metadata:
+        scale = getattr(item, "decimal_places", None) or scale
+
+    for type_, kind in _KINDS:
+        if isinstance(annotation, type) and issubclass(annotation, type_):
+            return ColumnSpec(name, kind, nullable, scale)
+    raise TypeError(f"unsupported type of a '{name}' field: {annotation}")
+
+
+class ColumnarSchema:
+    """Vectorized counterpart of a pydantic model. Validates and converts whole dataframe columns
+        instead of building a model instance per row
+
+    Attributes:
+        model: pydantic model the column definitions are derived from
+        columns: column definitions in model field order
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        annotations = get_type_hints(model, include_extras=True)
+        self.columns = [
+            _column_spec(name, annotations[name])
+            for name in model.model_fields
+        ]
+
+    @property
+    def field_names(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    def _convert(self, series: pd.Series, spec: ColumnSpec) -> pd.Series:
+        if spec.kind == "str":
+            return series.where(series.isna(), series.astype(str))
+        if spec.kind == "datetime":
+            return pd.to_datetime(series, errors="coerce")
+
+        if spec.kind == "decimal" and spec.scale is not None:
+            invalid = series.notna() & ~data_utils.valid_currency_mask(
+                series, spec.scale
+            )
+            self._raise_invalid(invalid, spec)
+            valid = series.notna()
+            if valid.all():
+                return data_utils.to_scaled_integer(series, spec.scale)
+            converted = pd.Series(pd.NA, index=series.index, dtype="Int64")
+            converted[valid] = data_utils.to_scaled_integer(series[valid], spec.scale)
+            return converted
+
+        converted = pd.to_numeric(series, errors="coerce")
+        invalid = converted.isna() & series.notna()
+        if spec.kind == "int":
+            invalid |= converted.notna() & (converted % 1 != 0)
+        self._raise_invalid(invalid, spec)
+        if spec.kind == "int" and converted.notna().all():
+            return converted.astype("int64")
+        return converted
+
+    def _raise_invalid(self, invalid: pd.Series, spec: ColumnSpec) -> None:
+        if invalid.any():
+            raise ValueError(
+                f"'{spec.name}': {invalid.sum()} value(s) are not valid {spec.kind}, "
+                f"first at index {invalid.idxmax()}"
+            )
+
+    def validate(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Validates and converts dataframe columns to the types declared in a model
+
+        Args:
+            data (pd.DataFrame): dataframe with (at least) columns named after model fields
+
+        Raises:
+            ValueError: if a column is missing, has a value that can't be converted or has
+             a null value in a non nullable column
+
+        Returns:
+            pd.DataFrame: a new dataframe with model columns (in model field order) converted
+             to typed arrays
+        """
+        missing = set(self.field_names) - set(data.columns)
+        if missing:
+            raise ValueError(f"missing columns: {sorted(missing)}")
+
+        validated = {}
+        for spec in self.columns:
+            series = self._convert(data[spec.name], spec)
+            if not spec.nullable and series.isna().any():
+                raise ValueError(
+                    f"'{spec.name}': {series.isna().sum()} null or invalid value(s), "
+                    f"first at index {series.isna().idxmax()}"
+                )
+            validated[spec.name] = series
+        return pd.DataFrame(validated, index=data.index)
+
+
+@lru_cache(maxsize=None)
+def columnar_schema(model: Type[BaseModel]) -> ColumnarSchema:
+    """Returns a (cached) ColumnarSchema of a pydantic model
+
+    Args:
+        model (Type[BaseModel]): pydantic model class
+
+    Returns:
+        ColumnarSchema: columnar schema derived from model fields
+    """
+    return ColumnarSchema(model)
@@ -1,11 +1,34 @@
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Union, Optional, Tuple
 import datetime
+import io
 
+import numpy as np
 import pandas as pd
 from sqlalchemy import insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from models import Customer, Event, ServiceType, RatePlan, engine
+from columnar_schema import columnar_schema
+from data_utils import data_utils
+from instrumentation import metrics
+from models import (
+    Customer,
+    Event,
+    ServiceType,
+    RatePlan,
+    PurgeCheckpoint,
+    UsageSummary,
+    LoadFile,
+    LoadChunk,
+    LoadMetric,
+    CustomerSketch,
+    DataVersion,
+    DeferredDefinition,
+    engine,
+)
 from schemas import CustomerSchema, RatePlanSchema, ServiceTypeSchema, EventSchema
+from setup import CUSTOMER_SKETCH_PRECISION
+from sketches import HyperLogLog, grouped_registers, hash_values
+from unit_of_work import unit_of_work
 
 
 class Crud:
@@ -28,7 +51,7 @@ class Crud:
         Returns:
             pd.DataFrame: DataFrame representing the result of statement execution
         """
-        with engine.connect() as connection:
+        with unit_of_work() as connection:
             return pd.DataFrame(
                 connection.execute(
                     statement,
@@ -38,6 +61,24 @@ class Crud:
                 .all()
             )
 
+    def execute_write(
+        self,
+        statement: Union[insert, text],
+        data: Optional[Union[Dict, List[Dict]]] = None,
+    ) -> int:
+        """Executes a data modifying statement (without RETURNING) in a current unit of work
+
+        Args:
+            statement (Union[insert, text]): database statement
+            data (Optional[Union[Dict, List[Dict]]], optional): parameters to use in statement execution.
+             Defaults to None.
+
+        Returns:
+            int: number of affected records
+        """
+        with unit_of_work() as connection:
+            return connection.execute(statement, data).rowcount
+
     def bulk_insert(
         self,
         data: List[Dict[str, Union[str, int, datetime.datetime]]],
@@ -51,7 +92,55 @@ class Crud:
             pd.DataFrame: DataFrame with id's of inserted records
         """
         statement = insert(self.model).returning(self.model.id)
-        return self.execute_statement(statement, data)
+        with metrics.timer("bulk_insert", self.model.__tablename__, rows=len(data)):
+            return self.execute_statement(statement, data)
+
+    def bulk_load(self, data: pd.DataFrame) -> int:
+        """Bulk load into a table. Uses postgres COPY streamed from an in-memory CSV buffer,
+            falls back to an executemany insert on other backends. Id's of inserted records are not returned
+
+        Args:
+            data (pd.DataFrame): validated data, column names must match table column names
+
+        Returns:
+            int: number of inserted records
+        """
+        if data.empty:
+            return 0
+
+        table = self.model.__tablename__
+        if engine.dialect.name != "postgresql":
+            with metrics.timer("bulk_load", table, rows=data.shape[0]):
+                with unit_of_work() as connection:
+                    connection.execute(insert(self.model), data.to_dict("records"))
+            return data.shape[0]
+
+        with metrics.timer("serialize", table, rows=data.shape[0]) as counts:
+            buffer = io.StringIO()
+            data.to_csv(buffer, index=False, header=False)
+            counts["bytes"] = buffer.tell()
+            buffer.seek(0)
+        statement = (
+            f"COPY {table} ({', '.join(data.columns)}) FROM STDIN WITH (FORMAT csv)"
+        )
+        with metrics.timer("bulk_load", table, rows=data.shape[0], bytes_=counts["bytes"]):
+            with unit_of_work() as connection:
+                # COPY runs on the DBAPI connection of a unit of work, inside its transaction
+                with connection.connection.cursor() as cursor:
+                    cursor.copy_expert(statement, buffer)
+        return data.shape[0]
+
+    def validate_frame(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Validates dataframe columns against a crud schema (column-wise, without building
+            a pydantic model per row)
+
+        Args:
+            data (pd.DataFrame): dataframe with columns named after schema fields
+
+        Returns:
+            pd.DataFrame: DataFrame with schema columns converted to typed arrays
+        """
+        return columnar_schema(self.schema).validate(data)
 
     def get_all(self) -> pd.DataFrame:
         """Get all records from a table
@@ -62,104 +151,987 @@ class Crud:
         return self.execute_statement(select(self.model))
 
 
-class CustomerCrud(Crud):
-    """Customer crud class. Inherits from Crud class
+class DimensionCrud(Crud):
+    """Base class for dimension cruds. Inherits from Crud class
 
     Attributes:
-        schema: defaults to a CustomerSchema
-        model: defaults to a Customer
+        natural_key: name of a column holding the natural (source) key of a dimension
+        event_fk: name of an 'event' column referencing a dimension
     """
 
     def __init__(self):
-        self.schema = CustomerSchema
-        self.model = Customer
+        super().__init__()
+        self.natural_key = None
+        self.event_fk = None
 
-    def delete_orphans(self) -> pd.DataFrame:
-        """Deletes orphans from 'customer' table
+    def get_ids(self, values: List[Union[str, int]]) -> pd.DataFrame:
+        """Get surrogate id's of provided natural key values
+
+        Args:
+            values (List[Union[str, int]]): natural key values to look up
 
         Returns:
-            pd.DataFrame: DataFrame with id's of deleted records
+            pd.DataFrame: DataFrame with 'id' and natural key columns of found records
         """
+        key = getattr(self.model, self.natural_key)
         return self.execute_statement(
+            select(self.model.id, key).where(key.in_(values))
+        )
+
+    def insert_missing(self, values: List[Union[str, int]]) -> pd.DataFrame:
+        """Validates and inserts natural key values, skipping ones that already exist
+            (INSERT ... ON CONFLICT DO NOTHING RETURNING)
+
+        Args:
+            values (List[Union[str, int]]): natural key values to insert
+
+        Returns:
+            pd.DataFrame: DataFrame with 'id' and natural key columns of inserted records
+        """
+        # sorted, concurrent loaders inserting the same new values lock them in the same order
+        # (and wait for each other instead of deadlocking)
+        validated_data = self.validate_frame(
+            pd.DataFrame({self.natural_key: values})
+        ).sort_values(self.natural_key)
+        statement = (
+            pg_insert(self.model)
+            .values(validated_data.to_dict("records"))
+            .on_conflict_do_nothing(index_elements=[self.natural_key])
+            .returning(self.model.id, getattr(self.model, self.natural_key))
+        )
+        return self.execute_statement(statement)
+
+    def touch(self, ids: List[int]) -> int:
+        """Marks dimension records as referenced by just loaded events. 'last_seen_at' is only
+            refreshed once a day to keep dimension row updates cheap
+
+        Args:
+            ids (List[int]): surrogate id's referenced by loaded events
+
+        Returns:
+            int: number of updated records
+        """
+        table = self.model.__tablename__
+        return self.execute_write(
             text(
-                """DELETE FROM customer 
-                   WHERE customer.id NOT IN (SELECT DISTINCT event.customer_fk FROM event) 
-                   RETURNING customer.id"""
-            )
+                f"""UPDATE {table} SET last_seen_at = now()
+                    WHERE {table}.id = ANY(:ids) AND {table}.last_seen_at < now() - interval '1 day'"""
+            ),
+            {"ids": sorted(int(id_) for id_ in ids)},
+        )
+
+    def delete_orphans(self, cutoff: datetime.datetime, batch_size: int) -> int:
+        """Deletes orphans (records no event references). Only records not seen by a load since
+            a cutoff are candidates, so the cost scales with a number of dimension records rather
+            than event records. Candidates that are still referenced get their 'last_seen_at'
+            refreshed from their latest event, the rest are deleted in batches
+
+        Args:
+            cutoff (datetime.datetime): records with 'last_seen_at' before it are orphan candidates
+            batch_size (int): max number of records deleted in one transaction
+
+        Returns:
+            int: number of deleted records
+        """
+        table = self.model.__tablename__
+        referenced = (
+            f"SELECT max(event.created_at) FROM event WHERE event.{self.event_fk} = {table}.id"
         )
+        with metrics.timer("refresh_last_seen", table) as counts:
+            counts["rows"] = self.execute_write(
+                text(
+                    f"""UPDATE {table} SET last_seen_at = ({referenced})
+                        WHERE {table}.last_seen_at < :cutoff AND EXISTS ({referenced})"""
+                ),
+                {"cutoff": cutoff},
+            )
+
+        deleted = 0
+        while True:
+            with metrics.timer("delete_orphans", table) as counts:
+                count = counts["rows"] = self.execute_write(
+                    text(
+                        f"""DELETE FROM {table} WHERE {table}.id IN (
+                                SELECT {table}.id FROM {table}
+                                WHERE {table}.last_seen_at < :cutoff
+                                  AND NOT EXISTS (SELECT 1 FROM event WHERE event.{self.event_fk} = {table}.id)
+                                LIMIT :batch_size
+                            )"""
+                    ),
+                    {"cutoff": cutoff, "batch_size": batch_size},
+                )
+            deleted += count
+            if count < batch_size:
+                return deleted
+
+
+class CustomerCrud(DimensionCrud):
+    """Customer crud class. Inherits from DimensionCrud class
+
+    Attributes:
+        schema: defaults to a CustomerSchema
+        model: defaults to a Customer
+        natural_key: defaults to a 'customer_id'
+        event_fk: defaults to a 'customer_fk'
+    """
+
+    def __init__(self):
+        self.schema = CustomerSchema
+        self.model = Customer
+        self.natural_key = "customer_id"
+        self.event_fk = "customer_fk"
 
 
-class ServiceTypeCrud(Crud):
-    """ServiceType crud class. Inherits from Crud class
+class ServiceTypeCrud(DimensionCrud):
+    """ServiceType crud class. Inherits from DimensionCrud class
 
     Attributes:
         schema: defaults to a ServiceTypeSchema
         model: defaults to a ServiceType
+        natural_key: defaults to a 'service_type'
+        event_fk: defaults to a 'service_type_fk'
     """
 
     def __init__(self):
         self.schema = ServiceTypeSchema
         self.model = ServiceType
+        self.natural_key = "service_type"
+        self.event_fk = "service_type_fk"
+
+
+class RatePlanCrud(DimensionCrud):
+    """RatePlan crud class. Inherits from DimensionCrud class
+
+    Attributes:
+        schema: defaults to a RatePlanSchema
+        model: defaults to a RatePlan
+        natural_key: defaults to a 'rate_plan_id'
+        event_fk: defaults to a 'rate_plan_fk'
+    """
+
+    def __init__(self):
+        self.schema = RatePlanSchema
+        self.model = RatePlan
+        self.natural_key = "rate_plan_id"
+        self.event_fk = "rate_plan_fk"
+
 
-    def delete_orphans(self) -> pd.DataFrame:
-        """Deletes orphans from 'service_type' table
+class EventCrud(Crud):
+    """Event crud class. Inherits from Crud class
+
+    Attributes:
+        schema: defaults to a EventSchema
+        model: defaults to a Event
+        charge_scale: number of digits after a decimal point of a charge, charges are stored
+         as integers scaled by 10**charge_scale
+    """
+
+    def __init__(self):
+        self.schema = EventSchema
+        self.model = Event
+        self.charge_scale = 6
+
+    def bulk_load(self, data: pd.DataFrame) -> int:
+        """Bulk loads validated events in the storage layout: a charge is stored as a scaled
+            integer ('charge_micros') and a month is derived from a start date by the database
+
+        Args:
+            data (pd.DataFrame): validated events (see Crud.validate_frame)
+
+        Returns:
+            int: number of inserted records
+        """
+        if data.empty:
+            return 0
+        # a validated charge is already scaled (see columnar_schema.ColumnSpec)
+        stored = data.drop(columns=["month"]).rename(columns={"charge": "charge_micros"})
+        return super().bulk_load(stored)
+
+    def get_existing_hashes(self, hashes: List[int]) -> pd.DataFrame:
+        """Get row hashes (see data_utils.hash_rows) already present in the 'event' table
+
+        Args:
+            hashes (List[int]): row hashes to look up
 
         Returns:
-            pd.DataFrame: DataFrame with id's of deleted records
+            pd.DataFrame: DataFrame with a 'row_hash' column of found hashes
         """
         return self.execute_statement(
             text(
-                """DELETE FROM service 
-                   WHERE service.id NOT IN (SELECT DISTINCT event.service_type_fk FROM event) 
-                   RETURNING service.id"""
-            )
+                """SELECT DISTINCT row_hash FROM event
+                   WHERE row_hash = ANY(CAST(:hashes AS bigint[]))"""
+            ),
+            {"hashes": hashes},
+        )
+
+    def delete_expired_batch(
+        self, checkpoint_id: int, batch_size: int
+    ) -> Tuple[int, Optional[int]]:
+        """Deletes one batch of events created before a purge cutoff, in id order after the last
+            id of a purge checkpoint. The checkpoint is advanced in the same statement (transaction)
+
+        Args:
+            checkpoint_id (int): id of a 'purge_checkpoint' record
+            batch_size (int): max number of events to delete
+
+        Returns:
+            Tuple[int, Optional[int]]: number of deleted events and the last deleted id (None when
+             nothing was deleted)
+        """
+        response = self.execute_statement(
+            text(
+                """WITH checkpoint AS (
+                       SELECT cutoff, last_event_id FROM purge_checkpoint WHERE id = :checkpoint_id
+                   ), batch AS (
+                       SELECT event.id, event.created_at FROM event, checkpoint
+                       WHERE event.created_at < checkpoint.cutoff AND event.id > checkpoint.last_event_id
+                       ORDER BY event.id
+                       LIMIT :batch_size
+                   ), deleted AS (
+                       DELETE FROM event USING batch
+                       WHERE event.id = batch.id AND event.created_at = batch.created_at
+                       RETURNING event.id
+                   ), summary AS (
+                       SELECT count(*) AS deleted, max(id) AS last_id FROM deleted
+                   ), progress AS (
+                       UPDATE purge_checkpoint
+                       SET last_event_id = coalesce(summary.last_id, purge_checkpoint.last_event_id),
+                           deleted = purge_checkpoint.deleted + summary.deleted,
+                           updated_at = now()
+                       FROM summary
+                       WHERE purge_checkpoint.id = :checkpoint_id
+                   )
+                   SELECT deleted, last_id FROM summary"""
+            ),
+            {"checkpoint_id": checkpoint_id, "batch_size": batch_size},
         )
+        deleted, last_id = response.iloc[0]
+        return int(deleted), None if pd.isna(last_id) else int(last_id)
 
 
-class RatePlanCrud(Crud):
-    """RatePlan crud class. Inherits from Crud class
+class PurgeCheckpointCrud(Crud):
+    """PurgeCheckpoint crud class. Inherits from Crud class
 
     Attributes:
-        schema: defaults to a RatePlanSchema
-        model: defaults to a RatePlan
+        model: defaults to a PurgeCheckpoint
     """
 
     def __init__(self):
-        self.schema = RatePlanSchema
-        self.model = RatePlan
+        self.schema = None
+        self.model = PurgeCheckpoint
+
+    def get_unfinished(self) -> pd.DataFrame:
+        """Get the latest unfinished purge checkpoint
+
+        Returns:
+            pd.DataFrame: DataFrame with (at most) one checkpoint record
+        """
+        return self.execute_statement(
+            select(self.model)
+            .where(self.model.finished_at.is_(None))
+            .order_by(self.model.id.desc())
+            .limit(1)
+        )
 
-    def delete_orphans(self) -> pd.DataFrame:
-        """Deletes orphans from 'plan' table
+    def start(self, cutoff: datetime.datetime) -> pd.DataFrame:
+        """Creates a new purge checkpoint
+
+        Args:
+            cutoff (datetime.datetime): events created before it are purged
 
         Returns:
-            pd.DataFrame: DataFrame with id's of deleted records
+            pd.DataFrame: DataFrame with the created checkpoint record
         """
         return self.execute_statement(
+            insert(self.model).values(cutoff=cutoff).returning(*self.model.__table__.c)
+        )
+
+    def finish(self, checkpoint_id: int) -> int:
+        """Marks a purge checkpoint as finished
+
+        Args:
+            checkpoint_id (int): id of a checkpoint
+
+        Returns:
+            int: number of updated records
+        """
+        return self.execute_write(
             text(
-                """DELETE FROM plan 
-                   WHERE plan.id NOT IN (SELECT DISTINCT event.rate_plan_fk FROM event) 
-                   RETURNING plan.id"""
+                """UPDATE purge_checkpoint SET finished_at = now(), updated_at = now()
+                   WHERE id = :checkpoint_id"""
+            ),
+            {"checkpoint_id": checkpoint_id},
+        )
+
+
+class LoadFileCrud(Crud):
+    """LoadFile crud class. Inherits from Crud class
+
+    Attributes:
+        model: defaults to a LoadFile
+    """
+
+    def __init__(self):
+        self.schema = None
+        self.model = LoadFile
+
+    def get_or_create(self, path: str, fingerprint: str, size: int) -> pd.DataFrame:
+        """Registers a file in a load manifest (or gets it, if a file with the same content
+            was registered before)
+
+        Args:
+            path (str): path to a file
+            fingerprint (str): fingerprint of a file content
+            size (int): file size in bytes
+
+        Returns:
+            pd.DataFrame: DataFrame with a 'load_file' record
+        """
+        statement = (
+            pg_insert(self.model)
+            .values(path=path, fingerprint=fingerprint, size=size, status="loading")
+            .on_conflict_do_update(
+                index_elements=["fingerprint"], set_={"updated_at": text("now()")}
             )
+            .returning(*self.model.__table__.c)
         )
+        return self.execute_statement(statement)
 
+    def set_status(self, file_id: int, status: str) -> int:
+        return self.execute_write(
+            text(
+                "UPDATE load_file SET status = :status, updated_at = now() WHERE id = :file_id"
+            ),
+            {"file_id": file_id, "status": status},
+        )
 
-class EventCrud(Crud):
-    """Event crud class. Inherits from Crud class
+
+class LoadChunkCrud(Crud):
+    """LoadChunk crud class. Inherits from Crud class
 
     Attributes:
-        schema: defaults to a EventSchema
-        model: defaults to a Event
+        model: defaults to a LoadChunk
     """
 
     def __init__(self):
-        self.schema = EventSchema
-        self.model = Event
+        self.schema = None
+        self.model = LoadChunk
+
+    def get_committed(self, file_id: int) -> pd.DataFrame:
+        """Get committed chunks of a file
+
+        Args:
+            file_id (int): id of a 'load_file' record
+
+        Returns:
+            pd.DataFrame: DataFrame with committed chunks ordered by chunk index
+        """
+        return self.execute_statement(
+            select(self.model)
+            .where(self.model.file_fk == file_id, self.model.status == "committed")
+            .order_by(self.model.chunk_index)
+        )
+
+    def commit(
+        self, file_id: int, chunk_index: int, start_row: int, row_count: int
+    ) -> int:
+        """Records a chunk as committed
+
+        Args:
+            file_id (int): id of a 'load_file' record
+            chunk_index (int): chunk number within a file
+            start_row (int): first row of a chunk (0 - the first data row of a file)
+            row_count (int): number of rows in a chunk
+
+        Returns:
+            int: number of inserted or updated records
+        """
+        statement = pg_insert(self.model).values(
+            file_fk=file_id,
+            chunk_index=chunk_index,
+            start_row=start_row,
+            row_count=row_count,
+            status="committed",
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["file_fk", "chunk_index"],
+            set_={
+                "start_row": statement.excluded.start_row,
+                "row_count": statement.excluded.row_count,
+                "status": statement.excluded.status,
+                "updated_at": text("now()"),
+            },
+        )
+        return self.execute_write(statement)
+
+
+class DataVersionCrud(Crud):
+    """DataVersion crud class. Inherits from Crud class
+
+    Attributes:
+        model: defaults to a DataVersion
+    """
+
+    def __init__(self):
+        self.schema = None
+        self.model = DataVersion
+
+    def get(self) -> int:
+        return int(self.execute_statement(select(self.model.version)).iat[0, 0])
+
+    def bump(self) -> int:
+        """Increments a data version in a current unit of work (call it last in a transaction,
+            its row stays locked until a commit)
+
+        Returns:
+            int: number of updated records
+        """
+        return self.execute_write(text("UPDATE data_version SET version = version + 1"))
+
+
+class LoadMetricCrud(Crud):
+    """LoadMetric crud class. Inherits from Crud class
+
+    Attributes:
+        model: defaults to a LoadMetric
+    """
+
+    def __init__(self):
+        self.schema = None
+        self.model = LoadMetric
+
+    def save(self, file_id: int, metrics: pd.DataFrame) -> int:
+        """Saves (replaces) metrics of a file
+
+        Args:
+            file_id (int): id of a 'load_file' record
+            metrics (pd.DataFrame): 'column_name', 'metric', 'value' records
+
+        Returns:
+            int: number of saved records
+        """
+        with unit_of_work():
+            self.execute_write(
+                text("DELETE FROM load_metric WHERE file_fk = :file_id"),
+                {"file_id": file_id},
+            )
+            if metrics.empty:
+                return 0
+            return self.execute_write(
+                insert(self.model),
+                metrics.assign(file_fk=file_id).to_dict("records"),
+            )
+
+    def get_previous(self, file_id: int, loads: int) -> pd.DataFrame:
+        """Get metrics of files loaded before a file
+
+        Args:
+            file_id (int): id of a 'load_file' record
+            loads (int): number of previous loaded files
+
+        Returns:
+            pd.DataFrame: DataFrame with 'file_fk', 'column_name', 'metric', 'value' columns
+        """
+        return self.execute_statement(
+            text(
+                """SELECT file_fk, column_name, metric, value FROM load_metric
+                   WHERE file_fk IN (
+                       SELECT id FROM load_file
+                       WHERE status = 'loaded' AND id <> :file_id
+                       ORDER BY created_at DESC
+                       LIMIT :loads
+                   )"""
+            ),
+            {"file_id": file_id, "loads": loads},
+        )
+
+
+class DeferredDefinitionCrud(Crud):
+    """DeferredDefinition crud class. Inherits from Crud class
+
+    Attributes:
+        model: defaults to a DeferredDefinition
+    """
+
+    def __init__(self):
+        self.schema = None
+        self.model = DeferredDefinition
+
+    def record(self, table: str) -> pd.DataFrame:
+        """Records definitions of secondary (non unique) indexes and foreign keys of a table.
+            Already recorded ones are skipped
+
+        Args:
+            table (str): table name
+
+        Returns:
+            pd.DataFrame: DataFrame with 'name' and 'kind' columns of recorded definitions
+        """
+        # a partitioned index is defined 'ON ONLY' a parent table, it's recreated with
+        # partition indexes (see bulk_mode.DeferredIndexes.restore)
+        return self.execute_statement(
+            text(
+                """INSERT INTO deferred_definition (name, table_name, kind, definition)
+                   SELECT index_class.relname, :table, 'index', pg_get_indexdef(pg_index.indexrelid)
+                   FROM pg_index JOIN pg_class AS index_class ON index_class.oid = pg_index.indexrelid
+                   WHERE pg_index.indrelid = CAST(:table AS regclass)
+                     AND NOT pg_index.indisprimary AND NOT pg_index.indisunique
+                   UNION ALL
+                   SELECT conname, :table, 'foreign_key', pg_get_constraintdef(oid)
+                   FROM pg_constraint
+                   WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'
+                   ON CONFLICT (name) DO NOTHING
+                   RETURNING name, kind"""
+            ),
+            {"table": table},
+        )
+
+    def get_deferred(self, table: str) -> pd.DataFrame:
+        """Get recorded definitions of a table
+
+        Args:
+            table (str): table name
+
+        Returns:
+            pd.DataFrame: DataFrame with 'name', 'kind' and 'definition' columns
+        """
+        return self.execute_statement(
+            select(self.model.name, self.model.kind, self.model.definition)
+            .where(self.model.table_name == table)
+            .order_by(self.model.created_at, self.model.name)
+        )
+
+    def delete(self, names: List[str]) -> int:
+        """Deletes definitions of restored indexes or foreign keys
+
+        Args:
+            names (List[str]): index or constraint names
+
+        Returns:
+            int: number of deleted records
+        """
+        return self.execute_write(
+            text("DELETE FROM deferred_definition WHERE name = ANY(CAST(:names AS text[]))"),
+            {"names": names},
+        )
+
+
+class UsageSummaryCrud(Crud):
+    """UsageSummary crud class. Inherits from Crud class. Keeps usage aggregates by service type,
+        rate plan and month in sync with the 'event' table, so reports don't scan events
+
+    Attributes:
+        model: defaults to a UsageSummary
+        charge_scale: number of digits after a decimal point of an event charge
+    """
+
+    def __init__(self):
+        self.schema = None
+        self.model = UsageSummary
+        self.charge_scale = 6
+
+    def add_events(self, data: pd.DataFrame) -> int:
+        """Adds loaded events to the aggregates. Distinct customer counts are incremented by
+            customers new to a (service type, rate plan, month) record
+
+        Args:
+            data (pd.DataFrame): validated events (see EventCrud.validate_frame)
+
+        Returns:
+            int: number of inserted or updated aggregate records
+        """
+        if data.empty:
+            return 0
+
+        keys = ["service_type_fk", "rate_plan_fk", "month"]
+        start_date = data["start_date"]
+        events = pd.DataFrame(
+            {
+                "service_type_fk": data["service_type_fk"],
+                "rate_plan_fk": data["rate_plan_fk"],
+                "month": start_date.dt.year * 100 + start_date.dt.month,
+                "customer_fk": data["customer_fk"],
+                "duration": data["duration"],
+                "charge": data["charge"],
+            }
+        )
+        summary = (
+            events.groupby(keys)
+            .agg(
+                event_count=("customer_fk", "size"),
+                total_duration=("duration", "sum"),
+                total_charge=("charge", "sum"),
+            )
+            .reset_index()
+        )
+        # aggregates are upserted in key order, concurrent loads lock shared records in the same order
+        customers = (
+            events[keys + ["customer_fk"]].drop_duplicates().sort_values(keys + ["customer_fk"])
+        )
+
+        def months(column: pd.Series) -> List[str]:
+            return column.map(
+                {month: f"{month // 100}-{month % 100:02d}-01" for month in column.unique()}
+            ).tolist()
+
+        return self.execute_write(
+            text(
+                """WITH new_customers AS (
+                       INSERT INTO usage_summary_customer (service_type_fk, rate_plan_fk, month, customer_fk)
+                       SELECT * FROM unnest(
+                           CAST(:customer_service AS integer[]), CAST(:customer_plan AS integer[]),
+                           CAST(:customer_month AS date[]), CAST(:customer AS integer[])
+                       )
+                       ON CONFLICT DO NOTHING
+                       RETURNING service_type_fk, rate_plan_fk, month
+                   ), new_counts AS (
+                       SELECT service_type_fk, rate_plan_fk, month, count(*) AS customers
+                       FROM new_customers GROUP BY service_type_fk, rate_plan_fk, month
+                   ), chunk AS (
+                       SELECT * FROM unnest(
+                           CAST(:service AS integer[]), CAST(:plan AS integer[]), CAST(:month AS date[]),
+                           CAST(:event_count AS bigint[]), CAST(:total_duration AS bigint[]),
+                           CAST(:total_charge AS numeric[])
+                       ) AS chunk (service_type_fk, rate_plan_fk, month, event_count, total_duration, total_charge)
+                   )
+                   INSERT INTO usage_summary
+                       (service_type_fk, rate_plan_fk, month, event_count, total_duration, total_charge, customers)
+                   SELECT chunk.*, coalesce(new_counts.customers, 0)
+                   FROM chunk LEFT JOIN new_counts USING (service_type_fk, rate_plan_fk, month)
+                   ORDER BY service_type_fk, rate_plan_fk, month
+                   ON CONFLICT (service_type_fk, rate_plan_fk, month) DO UPDATE SET
+                       event_count = usage_summary.event_count + excluded.event_count,
+                       total_duration = usage_summary.total_duration + excluded.total_duration,
+                       total_charge = usage_summary.total_charge + excluded.total_charge,
+                       customers = usage_summary.customers + excluded.customers,
+                       updated_at = now()"""
+            ),
+            {
+                "customer_service": customers["service_type_fk"].tolist(),
+                "customer_plan": customers["rate_plan_fk"].tolist(),
+                "customer_month": months(customers["month"]),
+                "customer": customers["customer_fk"].tolist(),
+                "service": summary["service_type_fk"].tolist(),
+                "plan": summary["rate_plan_fk"].tolist(),
+                "month": months(summary["month"]),
+                "event_count": summary["event_count"].tolist(),
+                "total_duration": summary["total_duration"].tolist(),
+                "total_charge": data_utils.format_scaled_integer(
+                    summary["total_charge"], self.charge_scale
+                ).tolist(),
+            },
+        )
+
+    def rebuild(self, until: datetime.date) -> int:
+        """Rebuilds aggregates of months up to (including) a month of a date from remaining events.
+            Used after a retention purge: events created before a purge cutoff can only start
+            in a month up to the cutoff month
+
+        Args:
+            until (datetime.date): the last month to rebuild
+
+        Returns:
+            int: number of rebuilt aggregate records
+        """
+        month = until.replace(day=1)
+        with unit_of_work() as connection:
+            for statement in (
+                "DELETE FROM usage_summary_customer WHERE month <= :month",
+                "DELETE FROM usage_summary WHERE month <= :month",
+                """INSERT INTO usage_summary_customer (service_type_fk, rate_plan_fk, month, customer_fk)
+                   SELECT DISTINCT service_type_fk, rate_plan_fk, month, customer_fk
+                   FROM event
+                   WHERE start_date < CAST(:month AS date) + interval '1 month'""",
+            ):
+                connection.execute(text(statement), {"month": month})
+            return connection.execute(
+                text(
+                    """INSERT INTO usage_summary
+                           (service_type_fk, rate_plan_fk, month, event_count, total_duration, total_charge, customers)
+                       SELECT service_type_fk, rate_plan_fk, month, count(*), coalesce(sum(duration), 0),
+                              coalesce(sum(charge_micros), 0) / :charge_factor, count(DISTINCT customer_fk)
+                       FROM event
+                       WHERE start_date < CAST(:month AS date) + interval '1 month'
+                       GROUP BY 1, 2, 3"""
+                ),
+                # event charges are scaled integers (see EventCrud.charge_scale)
+                {"month": month, "charge_factor": 10 ** self.charge_scale},
+            ).rowcount
+
+    def get_usage(
+        self, start_month: datetime.date, end_month: datetime.date
+    ) -> pd.DataFrame:
+        """Usage distribution and number of customers by service type and rate plan
+
+        Args:
+            start_month (datetime.date): first month of a period
+            end_month (datetime.date): last month of a period (inclusive)
+
+        Returns:
+            pd.DataFrame: DataFrame with service_type, rate_plan_id, event_count, total_duration,
+             total_charge and customers columns
+        """
+        return self.execute_statement(
+            text(
+                """SELECT service.service_type, plan.rate_plan_id, usage.event_count,
+                          usage.total_duration, usage.total_charge, customers.customers
+                   FROM (
+                       SELECT service_type_fk, rate_plan_fk, sum(event_count) AS event_count,
+                              sum(total_duration) AS total_duration, sum(total_charge) AS total_charge
+                       FROM usage_summary WHERE month BETWEEN :start_month AND :end_month
+                       GROUP BY service_type_fk, rate_plan_fk
+                   ) AS usage
+                   JOIN (
+                       SELECT service_type_fk, rate_plan_fk, count(DISTINCT customer_fk) AS customers
+                       FROM usage_summary_customer WHERE month BETWEEN :start_month AND :end_month
+                       GROUP BY service_type_fk, rate_plan_fk
+                   ) AS customers USING (service_type_fk, rate_plan_fk)
+                   JOIN service ON service.id = usage.service_type_fk
+                   JOIN plan ON plan.id = usage.rate_plan_fk
+                   ORDER BY service.service_type, plan.rate_plan_id"""
+            ),
+            {
+                "start_month": start_month.replace(day=1),
+                "end_month": end_month.replace(day=1),
+            },
+        )
+
+
+class CustomerSketchCrud(Crud):
+    """CustomerSketch crud class. Inherits from Crud class. Keeps HyperLogLog sketches of
+        customers by service type, rate plan and day, so distinct customers of any range of days
+        are estimated by merging sketches instead of scanning events. An estimate of a merged
+        range has the same standard error as of a single day: 1.04 / sqrt(2**precision)
+        (1.6% for precision 12, within 3.3% for 95% of estimates), counts up to a few thousand
+        customers are almost exact. Merging is idempotent, events added twice don't change a sketch
+
+    Attributes:
+        model: defaults to a CustomerSketch
+        precision: number of hash bits selecting a register (2**precision bytes per sketch)
+    """
+
+    def __init__(self, precision: int = CUSTOMER_SKETCH_PRECISION):
+        self.schema = None
+        self.model = CustomerSketch
+        self.precision = precision
+
+    def add_events(self, data: pd.DataFrame) -> int:
+        """Merges customers of events into sketches of their (service type, rate plan, day)
+
+        Args:
+            data (pd.DataFrame): events with 'service_type_fk', 'rate_plan_fk', 'start_date' and
+             'customer_fk' columns
+
+        Returns:
+            int: number of inserted or changed sketches
+        """
+        if data.empty:
+            return 0
+
+        keys = pd.DataFrame(
+            {
+                "service_type_fk": data["service_type_fk"].astype("int64"),
+                "rate_plan_fk": data["rate_plan_fk"].astype("int64"),
+                "day": data["start_date"].dt.normalize(),
+            }
+        )
+        # sketches are numbered in key order, concurrent loads lock shared sketches in the same order
+        groups = keys.groupby(list(keys.columns), sort=True).ngroup().to_numpy()
+        keys = keys.drop_duplicates().sort_values(list(keys.columns))
+        # customer ids are hashed as int64, so equal customers get equal hashes in every load
+        registers = grouped_registers(
+            groups,
+            keys.shape[0],
+            hash_values(data["customer_fk"].astype("int64")),
+            self.precision,
+        )
+        sketch_keys = list(
+            zip(
+                keys["service_type_fk"].tolist(),
+                keys["rate_plan_fk"].tolist(),
+                keys["day"].dt.date.tolist(),
+            )
+        )
+        return self._merge(sketch_keys, registers)
+
+    def _merge(
+        self, keys: List[Tuple[int, int, datetime.date]], registers: np.ndarray
+    ) -> int:
+        def parameters(positions: List[int]) -> Dict[str, List]:
+            return {
+                "service": [keys[position][0] for position in positions],
+                "plan": [keys[position][1] for position in positions],
+                "day": [keys[position][2] for position in positions],
+                "registers": [registers[position].tobytes() for position in positions],
+            }
+
+        rows = """SELECT * FROM unnest(
+                      CAST(:service AS integer[]), CAST(:plan AS integer[]),
+                      CAST(:day AS date[]), CAST(:registers AS bytea[])
+                  ) AS chunk (service_type_fk, rate_plan_fk, day, registers)"""
+        with unit_of_work() as connection:
+            # new sketches are inserted, existing ones (possibly inserted by a concurrent load
+            # in the meantime) are locked and merged
+            inserted = connection.execute(
+                text(
+                    f"""INSERT INTO customer_sketch (service_type_fk, rate_plan_fk, day, registers)
+                        {rows}
+                        ON CONFLICT DO NOTHING
+                        RETURNING service_type_fk, rate_plan_fk, day"""
+                ),
+                parameters(list(range(len(keys)))),
+            ).fetchall()
+            position = {key: index for index, key in enumerate(keys)}
+            for key in inserted:
+                del position[tuple(key)]
+            if not position:
+                return len(inserted)
+
+            stored = connection.execute(
+                text(
+                    f"""SELECT customer_sketch.service_type_fk, customer_sketch.rate_plan_fk,
+                               customer_sketch.day, customer_sketch.registers
+                        FROM customer_sketch JOIN ({rows}) AS chunk
+                            USING (service_type_fk, rate_plan_fk, day)
+                        ORDER BY 1, 2, 3
+                        FOR UPDATE OF customer_sketch"""
+                ),
+                parameters(list(position.values())),
+            ).fetchall()
+            changed = []
+            for service_type_fk, rate_plan_fk, day, stored_registers in stored:
+                index = position[(service_type_fk, rate_plan_fk, day)]
+                stored_registers = np.frombuffer(stored_registers, dtype=np.uint8)
+                if stored_registers.shape[0] != registers.shape[1]:
+                    raise ValueError(
+                        f"sketch precision changed to {self.precision}, rebuild customer sketches"
+                    )
+                merged = np.maximum(registers[index], stored_registers)
+                if not np.array_equal(merged, stored_registers):
+                    registers[index] = merged
+                    changed.append(index)
+            if changed:
+                connection.execute(
+                    text(
+                        f"""UPDATE customer_sketch SET registers = chunk.registers, updated_at = now()
+                            FROM ({rows}) AS chunk
+                            WHERE customer_sketch.service_type_fk = chunk.service_type_fk
+                              AND customer_sketch.rate_plan_fk = chunk.rate_plan_fk
+                              AND customer_sketch.day = chunk.day"""
+                    ),
+                    parameters(changed),
+                )
+            return len(inserted) + len(changed)
+
+    def rebuild(self, until: Optional[datetime.date] = None, batch_size: int = 1000000) -> int:
+        """Rebuilds sketches of days up to (including) a date from remaining events. Used after
+            a retention purge, sketches of purged days are dropped
+
+        Args:
+            until (Optional[datetime.date], optional): the last day to rebuild. Defaults to None
+             (all days, e.g. to sketch events loaded before sketches were kept).
+            batch_size (int, optional): number of events sketched at once. Defaults to 1000000.
+
+        Returns:
+            int: number of rebuilt sketches
+        """
+        days, events = "", ""
+        if until is not None:
+            days, events = "WHERE day <= :day", "AND start_date < CAST(:day AS date) + 1"
+        with unit_of_work() as connection:
+            connection.execute(text(f"DELETE FROM customer_sketch {days}"), {"day": until})
+            result = connection.execute(
+                text(
+                    f"""SELECT service_type_fk, rate_plan_fk, start_date, customer_fk
+                        FROM event
+                        WHERE service_type_fk IS NOT NULL AND rate_plan_fk IS NOT NULL
+                          AND start_date IS NOT NULL AND customer_fk IS NOT NULL {events}"""
+                ).execution_options(stream_results=True),
+                {"day": until},
+            )
+            for rows in result.partitions(batch_size):
+                self.add_events(pd.DataFrame(rows, columns=list(result.keys())))
+            # a sketch changed by several batches is counted once
+            return connection.execute(
+                text(f"SELECT count(*) FROM customer_sketch {days}"), {"day": until}
+            ).scalar()
+
+    def count_customers(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        service_types: Optional[List[str]] = None,
+        rate_plan_ids: Optional[List[int]] = None,
+    ) -> pd.DataFrame:
+        """Estimated number of distinct customers by service type and rate plan over days
+            [start, end), merged from daily sketches
+
+        Args:
+            start (datetime.date): first day of a range
+            end (datetime.date): day after the last day of a range
+            service_types (Optional[List[str]], optional): service types to count. Defaults to None (all).
+            rate_plan_ids (Optional[List[int]], optional): rate plans to count. Defaults to None (all).
+
+        Returns:
+            pd.DataFrame: DataFrame with 'service_type', 'rate_plan_id' and 'customers' columns
+        """
+        conditions = [CustomerSketch.day >= start, CustomerSketch.day < end]
+        if service_types:
+            conditions.append(ServiceType.service_type.in_(service_types))
+        if rate_plan_ids:
+            conditions.append(RatePlan.rate_plan_id.in_(rate_plan_ids))
+        statement = (
+            select(ServiceType.service_type, RatePlan.rate_plan_id, CustomerSketch.registers)
+            .join(ServiceType, ServiceType.id == CustomerSketch.service_type_fk)
+            .join(RatePlan, RatePlan.id == CustomerSketch.rate_plan_fk)
+            .where(*conditions)
+        )
+        # sketches are streamed and merged one by one, a long range isn't held in memory
+        merged = {}
+        with unit_of_work() as connection:
+            result = connection.execute(statement.execution_options(stream_results=True))
+            for service_type, rate_plan_id, registers in result:
+                sketch = HyperLogLog.from_bytes(bytes(registers))
+                key = (service_type, rate_plan_id)
+                if key in merged:
+                    merged[key].merge(sketch)
+                else:
+                    merged[key] = sketch
+        return pd.DataFrame(
+            [
+                (service_type, rate_plan_id, round(sketch.count()))
+                for (service_type, rate_plan_id), sketch in sorted(merged.items())
+            ],
+            columns=["service_type", "rate_plan_id", "customers"],
+        )
 
 
-customer, service_type, rate_plan, event, crud = (
+(
+    customer,
+    service_type,
+    rate_plan,
+    event,
+    purge_checkpoint,
+    load_file,
+    load_chunk,
+    data_version,
+    load_metric,
+    deferred_definition,
+    usage_summary,
+    customer_sketch,
+    crud,
+) = (
     CustomerCrud(),
     ServiceTypeCrud(),
     RatePlanCrud(),
     EventCrud(),
+    PurgeCheckpointCrud(),
+    LoadFileCrud(),
+    LoadChunkCrud(),
+    DataVersionCrud(),
+    LoadMetricCrud(),
+    DeferredDefinitionCrud(),
+    UsageSummaryCrud(),
+    CustomerSketchCrud(),
     Crud(),
 )
@@ -1,29 +1,215 @@
-from typing import List, Tuple
+from decimal import Decimal
+import hashlib
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
 
 from setup import DATA_FILE
 
+# layout of event timestamps, e.g. '2016-01-22T05:34:48.000+02:00'
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+# shortest and longest timestamp of the fixed layout parsed by DataUtils.parse_timestamps:
+# 1 to 6 fraction digits and a 'Z', '+HHMM' or '+HH:MM' offset
+ISO_TIMESTAMP_LENGTHS = (22, 32)
+# datetime64 / timedelta64 "not a time" as int64
+_NAT = np.iinfo(np.int64).min
+# microseconds representable by datetime64[ns]
+_MAX_MICROSECONDS = np.iinfo(np.int64).max // 1000
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+# max number of already loaded rows read (and dropped) at once by a resumed read
+SKIP_CHUNK_SIZE = 100000
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    # reader dtype -> arrow type
+    ARROW_TYPES = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+except ImportError:  # optional, used by the 'arrow' reader backend only
+    pa = None
+
 
 class DataUtils:
     def read_csv_chunks(
-        self, columns: List[str], chunksize: int = 500000
+        self,
+        columns: List[str],
+        chunksize: Union[int, Callable[[], int]] = 500000,
+        dtype: Optional[Dict[str, type]] = None,
+        start_row: int = 0,
+        backend: str = "pandas",
+        path: str = DATA_FILE,
     ) -> pd.DataFrame:
         """Reads a dataset in chunks
 
         Args:
             columns (List[str]): column names to asign to a dataframe
-            chunksize (int, optional): number of rows to read in one chunk. Defaults to 500000.
+            chunksize (Union[int, Callable[[], int]], optional): number of rows to read in one chunk,
+             or a callable returning a size of the next chunk (see chunk_sizing.AdaptiveChunkSizer).
+             Defaults to 500000.
+            dtype (Optional[Dict[str, type]], optional): column name -> type to read a column as
+             (e.g. str to keep raw text of currency columns). Defaults to None (inferred).
+            start_row (int, optional): number of data rows to skip (e.g. already loaded). Defaults to 0.
+            backend (str, optional): "pandas" or "arrow" (multithreaded pyarrow reader, also reads
+             parquet files). Defaults to "pandas".
+            path (str, optional): csv (optionally .gz/.zst compressed) or parquet file. Defaults to DATA_FILE.
 
         Yields:
-            Iterator[pd.DataFrame]: a dataframe with column names defined
+            Iterator[pd.DataFrame]: a dataframe with column names defined, indexed by a row number
+             of a dataset (0 - the first data row)
         """
-        with pd.read_csv(DATA_FILE, chunksize=chunksize) as reader:
-            for chunk in reader:
-                chunk.columns = columns
+        next_size = chunksize if callable(chunksize) else lambda: chunksize
+        if backend == "arrow":
+            yield from self._read_arrow_chunks(path, columns, next_size, dtype, start_row)
+            return
+        if backend != "pandas":
+            raise ValueError(f"unknown reader backend: '{backend}'")
+        if path.endswith(".parquet"):
+            raise ValueError("parquet files are read by the 'arrow' reader backend only")
+
+        with pd.read_csv(
+            path,
+            chunksize=next_size(),
+            names=columns,
+            header=0,
+            dtype=dtype,
+        ) as reader:
+            # already loaded rows are read and dropped in bounded chunks, so skipping takes
+            # constant memory (a reader keeps counting an index from them)
+            skipped = 0
+            while skipped < start_row:
+                try:
+                    skipped += len(reader.get_chunk(min(start_row - skipped, SKIP_CHUNK_SIZE)))
+                except StopIteration:
+                    return
+            while True:
+                try:
+                    chunk = reader.get_chunk(next_size())
+                except StopIteration:
+                    return
                 yield chunk
 
+    def _read_arrow_chunks(
+        self,
+        path: str,
+        columns: List[str],
+        next_size: Callable[[], int],
+        dtype: Optional[Dict[str, type]],
+        start_row: int,
+    ) -> Iterator[pd.DataFrame]:
+        """Streams record batches of a file (parsed by pyarrow worker threads) regrouped into
+            dataframes of next_size() rows. Only one chunk of batches is held in memory at a time"""
+        if pa is None:
+            raise ImportError("the 'arrow' reader backend requires pyarrow")
+
+        types = {
+            column: ARROW_TYPES[type_] for column, type_ in (dtype or {}).items()
+        }
+        if path.endswith(".parquet"):
+            batches = self._skip_rows(
+                (
+                    batch.rename_columns(columns)
+                    for batch in pq.ParquetFile(path).iter_batches(batch_size=65536)
+                ),
+                start_row,
+            )
+        else:
+            # compression (gzip, zstd, ...) is detected from a file extension
+            batches = pa_csv.open_csv(
+                pa.input_stream(path, compression="detect"),
+                read_options=pa_csv.ReadOptions(
+                    column_names=columns, skip_rows=start_row + 1, use_threads=True
+                ),
+                convert_options=pa_csv.ConvertOptions(
+                    column_types=types, strings_can_be_null=True
+                ),
+            )
+
+        offset = start_row
+        for table in self._rebatch(batches, next_size):
+            if types:
+                table = table.cast(
+                    pa.schema(
+                        [
+                            (field.name, types.get(field.name, field.type))
+                            for field in table.schema
+                        ]
+                    )
+                )
+            chunk = table.to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+    def _skip_rows(self, batches: Iterator, rows: int) -> Iterator:
+        for batch in batches:
+            if rows >= batch.num_rows:
+                rows -= batch.num_rows
+                continue
+            yield batch.slice(rows)
+            rows = 0
+
+    def _rebatch(self, batches: Iterator, next_size: Callable[[], int]) -> Iterator:
+        pending, rows = [], 0
+        for batch in batches:
+            pending.append(batch)
+            rows += batch.num_rows
+            while rows >= next_size():
+                table = pa.Table.from_batches(pending)
+                size = next_size()
+                yield table.slice(0, size)
+                rest = table.slice(size)
+                pending, rows = rest.to_batches(), rest.num_rows
+        if rows:
+            yield pa.Table.from_batches(pending)
+
+    def file_fingerprint(self, path: str, block_size: int = 1 << 20) -> str:
+        """Fingerprint of a file content (sha256), used to recognise resent files
+
+        Args:
+            path (str): path to a file
+            block_size (int, optional): number of bytes read at once. Defaults to 1 MiB.
+
+        Returns:
+            str: hex digest of a file content
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def hash_rows(self, data: pd.DataFrame) -> pd.Series:
+        """Vectorized 64-bit hash of every row (values only, not an index)
+
+        Args:
+            data (pd.DataFrame): dataframe with columns to hash
+
+        Returns:
+            pd.Series: int64 hashes (fits a bigint column)
+        """
+        hashes = pd.util.hash_pandas_object(data, index=False)
+        return pd.Series(hashes.to_numpy().view("int64"), index=data.index)
+
+    def shard_of(self, keys: pd.Series, shards: int) -> np.ndarray:
+        """Shard number of every row by a hash of an integer key. Raw keys are hashed as integers,
+            so differently formatted equal keys (e.g. '042' and '42') land in one shard. Keys that
+            aren't integers (rejected by validation anyway) go to shard 0
+
+        Args:
+            keys (pd.Series): raw key values (e.g. customer ids)
+            shards (int): number of shards
+
+        Returns:
+            np.ndarray: shard number of every row
+        """
+        ids = pd.to_numeric(keys, errors="coerce")
+        ids = ids.where(ids.abs() < 2**62).fillna(-1).astype("int64")
+        hashes = pd.util.hash_pandas_object(ids, index=False).to_numpy()
+        return np.where(ids.to_numpy() == -1, 0, hashes % np.uint64(shards)).astype(np.int64)
+
     def drop_nans(self, data: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Drops rows with nan in any column. Returns two dataframes (cleaned data and dropped data)
 
@@ -37,6 +223,119 @@ class DataUtils:
         data = data[~data.isnull().any(axis=1)]
         return data, error_ds
 
+    def _parse_iso_timestamps(self, strings: pd.Series) -> np.ndarray:
+        """Parses timestamps of the fixed ISO layout by slicing fixed-width fields of all strings
+            at once
+
+        Args:
+            strings (pd.Series): distinct timestamp strings
+
+        Returns:
+            np.ndarray: int64 UTC epoch microseconds (_NAT - not of the fixed layout or invalid)
+        """
+        lengths = strings.str.len().to_numpy(dtype=np.float64, na_value=np.nan)
+        fixed = (lengths >= ISO_TIMESTAMP_LENGTHS[0]) & (lengths <= ISO_TIMESTAMP_LENGTHS[1])
+        width = ISO_TIMESTAMP_LENGTHS[1]
+        text = np.asarray(strings.where(fixed, ""), dtype=f"U{width}")
+        chars = text.view(np.uint32).reshape(-1, width).astype(np.int64)
+        digits = chars - ord("0")
+        is_digit = (digits >= 0) & (digits <= 9)
+        rows = np.arange(chars.shape[0])
+        length = np.where(fixed, lengths, 0).astype(np.int64)
+
+        def at(positions: np.ndarray) -> np.ndarray:
+            return chars[rows, np.clip(positions, 0, width - 1)]
+
+        def number(start: int, count: int) -> np.ndarray:
+            value = np.zeros(chars.shape[0], dtype=np.int64)
+            for position in range(start, start + count):
+                value = value * 10 + digits[:, position]
+            return value
+
+        # the offset ends a string: 'Z', '+HH:MM' or '+HHMM'
+        zulu = at(length - 1) == ord("Z")
+        colon = at(length - 3) == ord(":")
+        offset_start = length - np.where(zulu, 1, np.where(colon, 6, 5))
+        fraction_digits = offset_start - 20
+
+        valid = fixed & (fraction_digits >= 1) & (fraction_digits <= 6)
+        valid &= is_digit[:, [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]].all(axis=1)
+        for position, separator in ((4, "-"), (7, "-"), (10, "T"), (13, ":"), (16, ":"), (19, ".")):
+            valid &= chars[:, position] == ord(separator)
+
+        # fraction digits are padded to microseconds
+        microsecond = np.zeros(chars.shape[0], dtype=np.int64)
+        for position in range(6):
+            present = position < fraction_digits
+            valid &= ~present | is_digit[:, 20 + position]
+            microsecond = microsecond * 10 + np.where(present, digits[:, 20 + position], 0)
+
+        sign = at(offset_start)
+        minute_start = offset_start + np.where(colon, 4, 3)
+        offset_positions = [offset_start + 1, offset_start + 2, minute_start, minute_start + 1]
+        offset_digits = [at(positions) - ord("0") for positions in offset_positions]
+        valid &= zulu | (
+            ((sign == ord("+")) | (sign == ord("-")))
+            & np.logical_and.reduce([(digit >= 0) & (digit <= 9) for digit in offset_digits])
+        )
+        offset_hours = offset_digits[0] * 10 + offset_digits[1]
+        offset_minutes = np.where(
+            zulu,
+            0,
+            np.where(sign == ord("-"), -1, 1)
+            * (offset_hours * 60 + offset_digits[2] * 10 + offset_digits[3]),
+        )
+
+        year, month, day = number(0, 4), number(5, 2), number(8, 2)
+        hour, minute, second = number(11, 2), number(14, 2), number(17, 2)
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        month_index = np.clip(month, 0, 12)
+        days_in_month = _DAYS_IN_MONTH[month_index] + ((month_index == 2) & leap)
+        valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month)
+        valid &= (hour <= 23) & (minute <= 59) & (second <= 59)
+        valid &= np.abs(offset_minutes) < 24 * 60
+
+        # days since the epoch of a proleptic Gregorian date (eras of 400 years start in March)
+        shifted_year = year - (month <= 2)
+        era = shifted_year // 400
+        year_of_era = shifted_year - era * 400
+        day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+        day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+        days = era * 146097 + day_of_era - 719468
+
+        seconds = days * 86400 + hour * 3600 + minute * 60 + second - offset_minutes * 60
+        microseconds = seconds * 10**6 + microsecond
+        valid &= np.abs(microseconds) < _MAX_MICROSECONDS
+        return np.where(valid, microseconds, _NAT)
+
+    def parse_timestamps(self, values: pd.Series) -> pd.Series:
+        """Parses DATE_FORMAT timestamps to UTC (offsets are applied, results are tz-naive UTC,
+            like 'event.start_date' stores them). Every distinct string is parsed once. Strings
+            of the fixed ISO layout are parsed by vectorized slicing, other ones are left to
+            pd.to_datetime (e.g. '+HH:MM:SS' offsets or single digit fields it accepts too)
+
+        Args:
+            values (pd.Series): timestamp strings
+
+        Returns:
+            pd.Series: datetime64[ns] values, NaT for nulls and invalid timestamps
+        """
+        codes, uniques = pd.factorize(values)
+        strings = pd.Series(uniques, dtype=object)
+        microseconds = self._parse_iso_timestamps(strings)
+        slow = np.flatnonzero(microseconds == _NAT)
+        if slow.shape[0]:
+            parsed = pd.to_datetime(
+                strings.iloc[slow], errors="coerce", format=DATE_FORMAT, utc=True
+            ).dt.tz_localize(None)
+            parsed = parsed.to_numpy(dtype="datetime64[us]").view(np.int64)
+            microseconds[slow] = np.where(np.abs(parsed) < _MAX_MICROSECONDS, parsed, _NAT)
+        # null values (code -1) map to the appended NaT
+        microseconds = np.append(microseconds, _NAT)[codes]
+        return pd.Series(
+            microseconds.view("datetime64[us]").astype("datetime64[ns]"), index=values.index
+        )
+
     def validate_convert_date_columns(
         self, data: pd.DataFrame, columns: List[str]
     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -52,9 +351,7 @@ class DataUtils:
         data_to_clean = data.copy()
         error_list = []
         for column in columns:
-            date_column = pd.to_datetime(
-                data[column], errors="coerce", format=f"%Y-%m-%dT%H:%M:%S.%f%z"
-            )
+            date_column = self.parse_timestamps(data[column])
             error_ds = data_to_clean[date_column.isna()]
             if not error_ds.empty:
                 error_list.append(error_ds)
@@ -63,7 +360,7 @@ class DataUtils:
 
         if error_list:
             error_ds = pd.concat(error_list)
-            error_ds["reason"] = "Date format is not: '%Y-%m-%dT%H:%M:%S.%f%z'"
+            error_ds["reason"] = f"Date format is not: '{DATE_FORMAT}'"
         else:
             error_ds = pd.DataFrame()
         return data_to_clean, error_ds
@@ -108,7 +405,8 @@ class DataUtils:
                 data_to_clean[column] = pd.to_numeric(
                     data_to_clean[column], errors="coerce"
                 )
-                errors = data[data_to_clean[column].isna()]
+                # rows rejected by previous columns are already dropped from data_to_clean
+                errors = data.loc[data_to_clean.index[data_to_clean[column].isna()]]
                 data_to_clean = data_to_clean[data_to_clean[column].notna()]
                 if not errors.empty:
                     error_list.append(errors)
@@ -127,10 +425,115 @@ class DataUtils:
 
         return data_to_clean, error_ds
 
+    def _split_decimal_text(
+        self, column: pd.Series
+    ) -> Tuple[pd.Series, pd.Series, pd.Series]:
+        """Splits decimal text ("-12.345e-2") into integer part, fraction and exponent columns"""
+        text = column.astype(str).str.strip().str.lower()
+        mantissa = text.str.partition("e")
+        integer_part = mantissa[0].str.partition(".")
+        exponent = pd.to_numeric(mantissa[2], errors="coerce").fillna(0)
+        return integer_part[0], integer_part[2], exponent
+
+    def valid_currency_mask(
+        self, column: pd.Series, num_digits_after_decimal_point: int = 6
+    ) -> pd.Series:
+        """Checks if values of a column can be converted to numeric type and digits after
+            a decimal point does not exceed a value of num_digits_after_decimal_point.
+            The scale is computed from the text of a value (trailing zeros of a fraction are not
+            significant), so raw strings are checked exactly, without a float conversion
+
+        Args:
+            column (pd.Series): column to perform a validation on
+            num_digits_after_decimal_point (int, optional): precision after a decimal point. Defaults to 6.
+
+        Returns:
+            pd.Series: boolean mask of valid values
+        """
+        numeric = pd.to_numeric(column, errors="coerce")
+        _, fraction, exponent = self._split_decimal_text(column)
+        scale = fraction.str.rstrip("0").str.len() - exponent
+        return (
+            numeric.notnull()
+            & np.isfinite(numeric.astype(float))
+            & (scale <= num_digits_after_decimal_point)
+        ).astype(bool)
+
+    def scaled_integer_in_range(self, column: pd.Series, scale: int = 6) -> pd.Series:
+        """Checks if decimal values scaled by 10**scale fit a 64-bit integer (an absolute value is
+            below 2**63 / 10**scale). Values close to the bound are compared exactly. Values that
+            aren't numeric are left to valid_currency_mask
+
+        Args:
+            column (pd.Series): column to perform a validation on
+            scale (int, optional): number of digits after a decimal point. Defaults to 6.
+
+        Returns:
+            pd.Series: boolean mask of values in range (and of values that aren't numeric)
+        """
+        limit = Decimal(2**63).scaleb(-scale)
+        magnitude = pd.to_numeric(column, errors="coerce").abs()
+        near = (magnitude >= float(limit) * (1 - 1e-9)).to_numpy()
+        in_range = pd.Series(~near, index=column.index)
+        if near.any():
+            in_range[near] = [
+                abs(Decimal(str(value).strip())) < limit for value in column[near]
+            ]
+        return in_range
+
+    def to_scaled_integer(self, column: pd.Series, scale: int = 6) -> pd.Series:
+        """Converts valid decimal values (see valid_currency_mask) to integers scaled by 10**scale
+            (e.g. '1.5' -> 1500000 with scale 6). Conversion is exact, no float round-trip is involved
+
+        Args:
+            column (pd.Series): column with valid decimal values
+            scale (int, optional): number of digits after a decimal point. Defaults to 6.
+
+        Raises:
+            ValueError: a scaled value doesn't fit a 64-bit integer (see scaled_integer_in_range)
+
+        Returns:
+            pd.Series: int64 column of scaled values
+        """
+        in_range = self.scaled_integer_in_range(column, scale)
+        if not in_range.all():
+            raise ValueError(
+                f"{(~in_range).sum()} value(s) don't fit a 64-bit integer scaled by 10**{scale}, "
+                f"first at index {(~in_range).idxmax()}"
+            )
+        integer_part, fraction, exponent = self._split_decimal_text(column)
+        digits = integer_part.where(integer_part.str.strip("+-") != "", integer_part + "0")
+        scaled = pd.to_numeric(
+            digits + fraction.str.ljust(scale, "0").str[:scale], errors="coerce"
+        )
+        with_exponent = exponent != 0
+        if with_exponent.any():
+            scaled[with_exponent] = [
+                int(Decimal(str(value).strip()).scaleb(scale))
+                for value in column[with_exponent]
+            ]
+        return scaled.astype("int64")
+
+    def format_scaled_integer(self, column: pd.Series, scale: int = 6) -> pd.Series:
+        """Formats integers scaled by 10**scale as decimal text (e.g. 1500000 -> '1.500000' with scale 6)
+
+        Args:
+            column (pd.Series): int64 column of scaled values
+            scale (int, optional): number of digits after a decimal point. Defaults to 6.
+
+        Returns:
+            pd.Series: column of decimal strings
+        """
+        absolute = column.abs()
+        text = (absolute // 10**scale).astype(str)
+        if scale:
+            text = text + "." + (absolute % 10**scale).astype(str).str.zfill(scale)
+        return text.where(column >= 0, "-" + text).astype(object)
+
     def validate_currency_columns(
         self,
         data: pd.DataFrame,
-        columns: List[str],
+        columns: Union[List[str], Dict[str, int]],
         num_digits_after_decimal_point: int = 6,
     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Validates provided columns by checking if they can be converted to numeric type and
@@ -138,32 +541,29 @@ class DataUtils:
 
         Args:
             data (pd.DataFrame): dataframe to perform a validation on
-            columns (List[str]): column names to perform a validation on
-            num_digits_after_decimal_point (int, optional): precision after a decimal point. Defaults to 6.
+            columns (Union[List[str], Dict[str, int]]): column names to perform a validation on or
+             column name -> precision after a decimal point of that column
+            num_digits_after_decimal_point (int, optional): precision after a decimal point of columns
+             without their own precision. Defaults to 6.
 
         Returns:
             Tuple[pd.DataFrame, pd.DataFrame]: a tuple with cleaned/converted data and data that cant be validated
         """
-        data_to_clean = data.copy()
-        error_list = []
-        for column in columns:
-            mask = pd.to_numeric(data_to_clean[column], errors="coerce").notnull()
-            error_list.append(data_to_clean[~mask])
-            data_to_clean = data_to_clean[mask]
+        if not isinstance(columns, dict):
+            columns = dict.fromkeys(columns, num_digits_after_decimal_point)
 
-            str_column = data_to_clean[column].astype(str)
-            mask = str_column.apply(
-                lambda x: len(x.split(".")[1]) <= num_digits_after_decimal_point
-            )
-            errors_ds = data_to_clean[~mask]
-            data_to_clean = data_to_clean[mask]
-            error_list.append(errors_ds)
+        mask = pd.Series(True, index=data.index)
+        for column, scale in columns.items():
+            mask &= self.valid_currency_mask(data[column], scale)
 
-        if error_list:
-            errors_ds = pd.concat(error_list)
-            errors_ds[
-                "reason"
-            ] = "wrong currency format. Tip: should be a maximum 6 digits after a decimal point"
+        data_to_clean = data[mask]
+        errors_ds = data[~mask]
+        if not errors_ds.empty:
+            scales = "/".join(str(scale) for scale in sorted(set(columns.values())))
+            errors_ds = errors_ds.assign(
+                reason="wrong currency format. Tip: should be a maximum "
+                f"{scales} digits after a decimal point"
+            )
         else:
             errors_ds = pd.DataFrame()
 
@@ -1,37 +1,51 @@
 import datetime
 import logging
 
-from sqlalchemy import delete
-from sqlalchemy.sql import text
-
-from crud import event, customer, rate_plan, service_type
-from setup import DELETE_AFTER_DAYS
+from bulk_mode import DeferredIndexes, load_lock
+from crud import customer, customer_sketch, rate_plan, service_type, usage_summary
+from instrumentation import metrics
+from partitions import event_partitions
+from purge import RetentionPurge
+from setup import DELETE_AFTER_DAYS, ORPHAN_BATCH_SIZE
 
 logger = logging.getLogger("__name__")
 logging.basicConfig(level=logging.INFO)
 
 
-def log_deleted(response, table):
-    logger.info(f"deleted: {response.shape[0]} records from a '{table}' table")
+def log_deleted(count, table):
+    logger.info(f"deleted: {count} records from a '{table}' table")
 
 
 if __name__ == "__main__":
-    statement = (
-        delete(event.model)
-        .where(
-            event.model.created_at
-            < (datetime.datetime.now() - datetime.timedelta(days=DELETE_AFTER_DAYS))
+    # every batch runs in its own transaction on one pinned connection. A purge holds a shared
+    # load lock: orphaned dimension records aren't deleted while a bulk load (which inserts events
+    # without foreign keys) runs or is left unrestored
+    with load_lock():
+        DeferredIndexes().check_restored()
+        purge = RetentionPurge()
+        cutoff = purge.start(
+            datetime.datetime.now() - datetime.timedelta(days=DELETE_AFTER_DAYS)
         )
-        .returning(event.model.id)
-    )
-    deleted_events = event.execute_statement(statement)
-    log_deleted(deleted_events, "event")
-
-    response = customer.delete_orphans()
-    log_deleted(response, "customer")
-
-    response = rate_plan.delete_orphans()
-    log_deleted(response, "plan")
 
-    response = service_type.delete_orphans()
-    log_deleted(response, "service")
+        # whole expired months are dropped as partitions, only the boundary partition is row-deleted
+        for partition in event_partitions.drop_expired(cutoff):
+            logger.info(
+                f"dropped partition '{partition.name}' (~{partition.estimated_rows} records) "
+                "of an 'event' table"
+            )
+
+        log_deleted(purge.delete_events(), "event")
+        with metrics.timer("rebuild", usage_summary.model.__tablename__) as counts:
+            count = counts["rows"] = usage_summary.rebuild(cutoff.date())
+        logger.info(f"rebuilt {count} '{usage_summary.model.__tablename__}' records")
+        # sketches of purged days are dropped, days with remaining events are sketched again
+        with metrics.timer("rebuild", customer_sketch.model.__tablename__) as counts:
+            count = counts["rows"] = customer_sketch.rebuild(cutoff.date())
+        logger.info(f"rebuilt {count} '{customer_sketch.model.__tablename__}' records")
+
+        for dimension in (customer, rate_plan, service_type):
+            count = dimension.delete_orphans(cutoff, ORPHAN_BATCH_SIZE)
+            log_deleted(count, dimension.model.__tablename__)
+
+        purge.finish()
+    metrics.export("purge")
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+
+class DimensionCache:
+    """Process-lifetime cache of dimension natural key -> surrogate id mappings.
+
+    In unbounded mode (max_size is None) the cache is warmed once with the whole dimension
+    table and is treated as complete afterwards. In bounded mode the cache is filled lazily,
+    least recently used entries are evicted and values missing from the cache are looked up
+    in the database.
+
+    Mappings of records inserted by the cache stay pending until commit() is called, so they
+    can be discarded by rollback() when a transaction inserting them fails.
+
+    Attributes:
+        crud: dimension crud (see crud.DimensionCrud) used for fallback lookups and inserts
+        max_size: maximum number of cached mappings. Defaults to None (unbounded)
+        hits: number of natural key values resolved from the cache
+        misses: number of natural key values not found in the cache
+        evictions: number of mappings evicted from the cache
+    """
+
+    def __init__(self, crud, max_size: Optional[int] = None):
+        self.crud = crud
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._mappings = OrderedDict()
+        self._pending = []
+        self._warmed = False
+
+    def warm(self) -> None:
+        """Loads the whole dimension table into the cache (unbounded mode only)"""
+        if self.max_size is None:
+            db_data = self.crud.get_all()
+            if not db_data.empty:
+                self._store(zip(db_data[self.crud.natural_key], db_data["id"]))
+        self._warmed = True
+
+    def _store(self, mappings: Iterable[Tuple[Union[str, int], int]]) -> None:
+        for value, id_ in mappings:
+            self._mappings[value] = id_
+            if self.max_size is not None:
+                self._mappings.move_to_end(value)
+                if len(self._mappings) > self.max_size:
+                    self._mappings.popitem(last=False)
+                    self.evictions += 1
+
+    def _lookup(self, values: List[Union[str, int]]) -> Dict[Union[str, int], int]:
+        if not values:
+            return {}
+        db_data = self.crud.get_ids(values)
+        if db_data.empty:
+            return {}
+        return dict(zip(db_data[self.crud.natural_key], db_data["id"]))
+
+    def resolve(self, values: Iterable[Union[str, int]]) -> Tuple[Dict, int]:
+        """Maps natural key values to surrogate id's. Values unknown to the database are inserted
+
+        Args:
+            values (Iterable[Union[str, int]]): natural key values
+
+        Returns:
+            Tuple[Dict, int]: a tuple with value -> id mappings and number of inserted records
+        """
+        if not self._warmed:
+            self.warm()
+
+        mappings = {}
+        missing = []
+        for value in pd.unique(pd.Series(values)):
+            id_ = self._mappings.get(value)
+            if id_ is None:
+                missing.append(value)
+                continue
+            mappings[value] = id_
+            if self.max_size is not None:
+                self._mappings.move_to_end(value)
+        self.hits += len(mappings)
+        self.misses += len(missing)
+
+        inserted = 0
+        if missing:
+            found = self._lookup(missing) if self.max_size is not None else {}
+            to_insert = [value for value in missing if value not in found]
+            if to_insert:
+                db_data = self.crud.insert_missing(to_insert)
+                inserted = db_data.shape[0]
+                if inserted:
+                    found.update(
+                        zip(db_data[self.crud.natural_key], db_data["id"])
+                    )
+                    self._pending.extend(db_data[self.crud.natural_key])
+                # values inserted by another process in the meantime
+                found.update(
+                    self._lookup([value for value in to_insert if value not in found])
+                )
+            self._store(found.items())
+            mappings.update(found)
+
+        return mappings, inserted
+
+    def commit(self) -> None:
+        """Keeps mappings of records inserted since the last commit (their transaction is committed)"""
+        self._pending = []
+
+    def rollback(self) -> None:
+        """Discards mappings of records inserted since the last commit (their transaction is rolled back)"""
+        for value in self._pending:
+            self._mappings.pop(value, None)
+        self._pending = []
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Cache counters
+
+        Returns:
+            Dict[str, Union[int, float]]: size, hits, misses, evictions and hit ratio
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._mappings),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
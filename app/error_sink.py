@@ -0,0 +1,60 @@
+import fcntl
+import gzip
+import os
+
+import pandas as pd
+
+from setup import ERROR_FILE
+
+
+class ErrorSink:
+    """Append-only, gzip compressed CSV of rejected rows of all loaded files. Every write
+        appends a gzip member, so the file stays readable as a whole (e.g. by pd.read_csv).
+        Writes are serialized by a file lock, sources loaded concurrently share a file
+
+    Attributes:
+        path: path to an error file
+    """
+
+    def __init__(self, path: str = ERROR_FILE):
+        self.path = path
+
+    def write(self, rejected: pd.DataFrame, file: str, chunk_index: int) -> int:
+        """Appends rejected rows of a chunk
+
+        Args:
+            rejected (pd.DataFrame): rejected rows with a 'reason' column, indexed by a row number
+             of a dataset
+            file (str): path to a loaded file
+            chunk_index (int): chunk number (in read order)
+
+        Returns:
+            int: number of written rows
+        """
+        if rejected.empty:
+            return 0
+
+        data = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        "file": file,
+                        "chunk": chunk_index,
+                        "row": rejected.index,
+                        "reason": rejected["reason"],
+                    },
+                    index=rejected.index,
+                ),
+                rejected.drop(columns="reason"),
+            ],
+            axis=1,
+        )
+        with open(self.path, "ab") as raw:
+            fcntl.flock(raw, fcntl.LOCK_EX)
+            try:
+                header = os.path.getsize(self.path) == 0
+                with gzip.open(raw, "at", newline="") as file_:
+                    data.to_csv(file_, index=False, header=header)
+            finally:
+                fcntl.flock(raw, fcntl.LOCK_UN)
+        return data.shape[0]
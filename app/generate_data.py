@@ -0,0 +1,163 @@
+import argparse
+import datetime
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from data_utils import data_utils
+from setup import COLUMN_NAMES, DATA_FILE, INTEGER_COLUMNS
+
+SERVICE_TYPES = ["VOICE", "SMS", "GPRS", "MMS", "ROAMING", "VAS"]
+# rule name -> share of generated rows breaking it
+DEFAULT_ERROR_RATES = {"not_null": 0.001, "integer": 0.001, "date": 0.001, "currency": 0.001}
+
+WEEK_SECONDS = 7 * 24 * 3600
+SECONDS_TEXT = np.array([f"{second:02d}.000+00:00" for second in range(60)], dtype=object)
+
+
+@lru_cache(maxsize=1)
+def _week_text(week_start: datetime.datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """Event start time (without seconds) and month text of every minute of a week, formatting
+    every record is the slowest part of generation"""
+    minutes = pd.date_range(week_start, periods=WEEK_SECONDS // 60, freq="min")
+    return (
+        minutes.strftime("%Y-%m-%dT%H:%M:").to_numpy(dtype=object),
+        minutes.strftime("%Y%m").to_numpy(dtype=object),
+    )
+
+
+def generate_chunk(
+    rng: np.random.Generator,
+    rows: int,
+    customers: int,
+    rate_plans: int,
+    week_start: datetime.datetime,
+    error_rates: Dict[str, float],
+) -> pd.DataFrame:
+    """Generates a chunk of usage records (as text, like in a billing provider file) with
+        injected errors
+
+    Args:
+        rng (np.random.Generator): random generator
+        rows (int): number of records
+        customers (int): number of distinct customers
+        rate_plans (int): number of distinct rate plans
+        week_start (datetime.datetime): start of a week events start in
+        error_rates (Dict[str, float]): rule name -> share of records breaking it
+
+    Returns:
+        pd.DataFrame: generated records
+    """
+    offsets = rng.integers(0, WEEK_SECONDS, rows)
+    minutes, months = _week_text(week_start)
+    start_times = minutes[offsets // 60] + SECONDS_TEXT[offsets % 60]
+    # customer activity is skewed, a few customers produce most events
+    customer_id = np.minimum(rng.zipf(1.3, rows), customers)
+    customer_id = (customer_id * 7919 % customers) + 1
+    data = pd.DataFrame(
+        {
+            "customer_id": customer_id.astype(str),
+            "event_start_time": start_times,
+            "service_type": rng.choice(SERVICE_TYPES, rows, p=[0.4, 0.3, 0.2, 0.04, 0.04, 0.02]),
+            "rate_plan_id": rng.integers(1, rate_plans + 1, rows).astype(str),
+            "billing_flag_1": rng.integers(0, 2, rows).astype(str),
+            "billing_flag_2": rng.integers(0, 2, rows).astype(str),
+            "duration": rng.exponential(120, rows).astype(np.int64).astype(str),
+            "charge": data_utils.format_scaled_integer(
+                pd.Series(rng.integers(0, 5 * 10**6, rows))
+            ),
+            "month": months[offsets // 60],
+        },
+        columns=COLUMN_NAMES,
+    ).astype(object)
+
+    for rule, rate in error_rates.items():
+        broken = np.flatnonzero(rng.random(rows) < rate)
+        if not broken.shape[0]:
+            continue
+        if rule == "not_null":
+            columns = rng.choice(COLUMN_NAMES, broken.shape[0])
+            for column in set(columns):
+                data.iloc[broken[columns == column], data.columns.get_loc(column)] = None
+        elif rule == "integer":
+            columns = rng.choice(sorted(set(INTEGER_COLUMNS)), broken.shape[0])
+            for column in set(columns):
+                index = broken[columns == column]
+                location = data.columns.get_loc(column)
+                data.iloc[index, location] = data.iloc[index, location] + ".5"
+        elif rule == "date":
+            data.iloc[broken, data.columns.get_loc("event_start_time")] = [
+                value.replace("T", " ")[:16] for value in start_times[broken]
+            ]
+        elif rule == "currency":
+            data.iloc[broken, data.columns.get_loc("charge")] = [
+                f"{value:.7f}" for value in rng.random(broken.shape[0])
+            ]
+        else:
+            raise ValueError(f"unknown rule: '{rule}'")
+    return data
+
+
+def generate(
+    path: str,
+    rows: int,
+    customers: int = 100000,
+    rate_plans: int = 50,
+    error_rates: Optional[Dict[str, float]] = None,
+    week_start: Optional[datetime.datetime] = None,
+    chunk_rows: int = 1000000,
+    seed: int = 0,
+) -> None:
+    """Writes a synthetic usage file (same layout as a billing provider file)
+
+    Args:
+        path (str): path to a csv file (compressed if it ends with .gz/.zst)
+        rows (int): number of records
+        customers (int, optional): number of distinct customers. Defaults to 100000.
+        rate_plans (int, optional): number of distinct rate plans. Defaults to 50.
+        error_rates (Optional[Dict[str, float]], optional): rule name -> share of records breaking it.
+         Defaults to DEFAULT_ERROR_RATES.
+        week_start (Optional[datetime.datetime], optional): start of a week events start in.
+         Defaults to a week ago.
+        chunk_rows (int, optional): number of records generated at once. Defaults to 1000000.
+        seed (int, optional): random seed. Defaults to 0.
+    """
+    rng = np.random.default_rng(seed)
+    error_rates = DEFAULT_ERROR_RATES if error_rates is None else error_rates
+    week_start = week_start or (
+        datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        - datetime.timedelta(days=7)
+    )
+    for offset in tqdm(range(0, rows, chunk_rows)):
+        chunk = generate_chunk(
+            rng, min(chunk_rows, rows - offset), customers, rate_plans, week_start, error_rates
+        )
+        chunk.to_csv(
+            path, mode="w" if offset == 0 else "a", header=offset == 0, index=False
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic usage file")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--path", default=DATA_FILE)
+    parser.add_argument("--customers", type=int, default=100000)
+    parser.add_argument("--rate-plans", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    for rule, rate in DEFAULT_ERROR_RATES.items():
+        parser.add_argument(f"--{rule.replace('_', '-')}-error-rate", type=float, default=rate)
+    args = parser.parse_args()
+
+    generate(
+        args.path,
+        args.rows,
+        customers=args.customers,
+        rate_plans=args.rate_plans,
+        error_rates={
+            rule: getattr(args, f"{rule}_error_rate") for rule in DEFAULT_ERROR_RATES
+        },
+        seed=args.seed,
+    )
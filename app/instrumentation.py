@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from setup import METRICS_TEXTFILE_DIR
+
+logger = logging.getLogger("__name__")
+
+
+class StageMetrics:
+    """Low overhead per-stage counters (calls, seconds, rows, bytes) of a job. A stage event is
+        logged as a JSON line (debug level), totals are logged and exported as a Prometheus
+        textfile (node_exporter textfile collector) when a job finishes. Metrics of validation
+        running in pipeline worker processes stay in those processes
+
+    Attributes:
+        textfile_dir: directory Prometheus textfiles are written to (None - not written)
+        stages: (stage, detail) -> counters
+    """
+
+    counters = ("calls", "seconds", "rows", "bytes")
+
+    def __init__(self, textfile_dir: Optional[str] = METRICS_TEXTFILE_DIR):
+        self.textfile_dir = textfile_dir
+        self.stages: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, stage: str, detail: str = "", seconds: float = 0.0, rows: int = 0, bytes_: int = 0
+    ) -> None:
+        with self._lock:
+            stats = self.stages.get((stage, detail))
+            if stats is None:
+                stats = self.stages[(stage, detail)] = {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "rows": 0,
+                    "bytes": 0,
+                    "max_seconds": 0.0,
+                }
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["rows"] += rows
+            stats["bytes"] += bytes_
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                json.dumps(
+                    {
+                        "event": "stage",
+                        "stage": stage,
+                        "detail": detail,
+                        "seconds": round(seconds, 6),
+                        "rows": rows,
+                        "bytes": bytes_,
+                    }
+                )
+            )
+
+    @contextmanager
+    def timer(
+        self, stage: str, detail: str = "", rows: int = 0, bytes_: int = 0
+    ) -> Iterator[Dict[str, int]]:
+        """Times a block. Yields a dict whose 'rows' and 'bytes' can be set inside a block
+        (e.g. to a number of inserted records)"""
+        counts = {"rows": rows, "bytes": bytes_}
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.record(
+                stage, detail, time.perf_counter() - start, counts["rows"], counts["bytes"]
+            )
+
+    def iterate(
+        self, stage: str, chunks: Iterable[pd.DataFrame]
+    ) -> Iterator[pd.DataFrame]:
+        """Times producing chunks (e.g. reading them), counts their rows and memory"""
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            self.record(
+                stage,
+                seconds=time.perf_counter() - start,
+                rows=chunk.shape[0],
+                bytes_=int(chunk.memory_usage(index=False).sum()),
+            )
+            yield chunk
+
+    def export(self, job: str) -> None:
+        """Logs totals of stages (one JSON line per stage) and writes a Prometheus textfile of a job
+
+        Args:
+            job (str): job name (e.g. "load" or "purge")
+        """
+        with self._lock:
+            stages = {key: dict(stats) for key, stats in self.stages.items()}
+        for (stage, detail), stats in stages.items():
+            logger.info(
+                json.dumps(
+                    {"event": "stage_total", "job": job, "stage": stage, "detail": detail, **stats}
+                )
+            )
+        if self.textfile_dir is not None:
+            self.write_textfile(job, stages)
+
+    def reset(self) -> None:
+        """Drops counters (e.g. of a job exported by a process running several jobs)"""
+        with self._lock:
+            self.stages = {}
+
+    def write_textfile(self, job: str, stages: Dict[Tuple[str, str], Dict[str, float]]) -> str:
+        lines = []
+        for counter in self.counters + ("max_seconds",):
+            name = f"etl_stage_{counter}" + ("" if counter == "max_seconds" else "_total")
+            lines.append(f"# TYPE {name} {'gauge' if counter == 'max_seconds' else 'counter'}")
+            for (stage, detail), stats in stages.items():
+                lines.append(
+                    f'{name}{{job="{job}",stage="{stage}",detail="{detail}"}} {stats[counter]}'
+                )
+        lines.append("# TYPE etl_last_run_timestamp_seconds gauge")
+        lines.append(f'etl_last_run_timestamp_seconds{{job="{job}"}} {time.time():.0f}')
+
+        # written atomically, a collector never reads a partial file
+        path = os.path.join(self.textfile_dir, f"etl_{job}.prom")
+        with open(f"{path}.tmp", "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.tmp", path)
+        return path
+
+
+metrics = StageMetrics()
@@ -1,64 +1,112 @@
-from datetime import datetime
+import argparse
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
 import logging
-from typing import List, Tuple, DefaultDict
+import multiprocessing
+from typing import Callable, Dict, List, Optional, Tuple, DefaultDict
 
 import pandas as pd
 from tqdm import tqdm
 
-from crud import customer, service_type, rate_plan, event
+from bulk_mode import DeferredIndexes, load_lock
+from chunk_sizing import AdaptiveChunkSizer
+from crud import customer, service_type, rate_plan, event, load_metric, usage_summary, customer_sketch
 from data_utils import data_utils
+from dimension_cache import DimensionCache
+from error_sink import ErrorSink
+from instrumentation import metrics
+from manifest import LoadManifest
+from partitions import event_partitions
+from pipeline import Pipeline
+from profiling import DatasetProfile, detect_drift
+from quality_gate import DataQualityError, QualityGate
+from rule_engine import rule_engine
+from sharded_loader import ShardedLoader
 from setup import (
-    CHUNK_SIZE,
-    ERROR_FILE_PATH,
+    CHUNK_MEMORY_BUDGET,
+    CHUNK_TARGET_SECONDS,
+    MIN_CHUNK_SIZE,
+    MAX_CHUNK_SIZE,
+    DATA_FILE,
+    DEDUPLICATE_EVENTS,
+    DIMENSION_CACHE_MAX_SIZE,
+    INGEST_MAX_DB_CONNECTIONS,
+    INGEST_MAX_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+    PROFILE_BASELINE_LOADS,
     COLUMN_NAMES,
-    INTEGER_COLUMNS,
-    DATE_COLUMNS,
-    CURRENCY_COLUMNS,
+    SOURCES,
+    VALIDATION_RULES,
 )
+from sources import IngestionBudget, SourceConfig, create_adapter, load_sources
+from unit_of_work import unit_of_work
 
 logger = logging.getLogger("__name__")
 logging.basicConfig(level=logging.INFO)
 
+dimension_caches = {
+    crud.natural_key: DimensionCache(crud, max_size=DIMENSION_CACHE_MAX_SIZE)
+    for crud in (customer, service_type, rate_plan)
+}
+error_sink = ErrorSink()
+
 
 def validate_and_clean_data(
     chunk: pd.DataFrame,
-    integer_columns: List[str],
-    date_columns: List[str],
-    currency_columns: List[str],
+    rules: Dict[str, List[str]] = VALIDATION_RULES,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Validates and, if needed, cleans data by splitting it into two dataframes: data (cleaned) and error_ds
+    """Validates and, if needed, cleans data by splitting it into two dataframes: data (cleaned) and error_ds.
+        All rules are evaluated once against the original chunk, rejected rows get every reason they failed
 
     Args:
         chunk (pd.DataFrame): dataframe to perform validation and cleaning on
-        integer_columns (List[str]): names of integer columns
-        date_columns (List[str]): names of date columns
-        currency_columns (List[str]): names of currency columns
+        rules (Dict[str, List[str]], optional): rule name -> column names. Defaults to VALIDATION_RULES.
 
     Returns:
         Tuple[pd.DataFrame, pd.DataFrame]: a tuple that contains two dataframes: cleaned data and
          not valid data that can't be cleaned
     """
+    return rule_engine.split(chunk, rules)
 
-    error_ds = pd.DataFrame(columns=["reason"])
-    data, errors_null = data_utils.drop_nans(chunk)
-    data, errors_int = data_utils.validate_convert_integer_columns(
-        data, integer_columns
-    )
-    data, errors_date = data_utils.validate_convert_date_columns(data, date_columns)
-    data, errors_currency = data_utils.validate_currency_columns(data, currency_columns)
-    error_ds = pd.concat(
-        [error_ds, errors_null, errors_int, errors_date, errors_currency]
-    )
 
-    return data, error_ds
+def drop_loaded_events(data: pd.DataFrame, lookup: bool = True) -> pd.DataFrame:
+    """Adds a 'row_hash' column to validated events and drops events that were already
+        loaded (e.g. from a resent file) or are repeated within a chunk
 
+    Args:
+        data (pd.DataFrame): validated events
+        lookup (bool, optional): look up already loaded events, otherwise only events repeated
+         within a chunk are dropped. Defaults to True.
 
-def populate_db(df: pd.DataFrame) -> DefaultDict[str, int]:
+    Returns:
+        pd.DataFrame: events to load
+    """
+    data["row_hash"] = data_utils.hash_rows(data)
+    deduplicated = data.drop_duplicates("row_hash")
+    existing = (
+        event.get_existing_hashes(deduplicated["row_hash"].tolist())
+        if lookup
+        else pd.DataFrame()
+    )
+    if not existing.empty:
+        deduplicated = deduplicated[
+            ~deduplicated["row_hash"].isin(existing["row_hash"])
+        ]
+    if deduplicated.shape[0] < data.shape[0]:
+        logger.info(
+            f"skipped {data.shape[0] - deduplicated.shape[0]} already loaded events"
+        )
+    return deduplicated
+
+
+def populate_db(df: pd.DataFrame, bulk: bool = False) -> DefaultDict[str, int]:
     """Populates database tables (event, customer, service_type, rate_plan_id)
 
     Args:
         df (pd.DataFrame): a dataframe containing values to be inserted into DB
+        bulk (bool, optional): bulk mode (see bulk_mode.DeferredIndexes), event indexes are
+         deferred, so loaded events aren't looked up by their hashes. Defaults to False.
 
     Returns:
         DefaultDict[str, int]: dictionary where keys represent a table name with
@@ -66,65 +114,279 @@ def populate_db(df: pd.DataFrame) -> DefaultDict[str, int]:
     """
     records_inserted = defaultdict(lambda: 0)
 
-    for crud, column_name in zip(
-        (customer, service_type, rate_plan),
-        ("customer_id", "service_type", "rate_plan_id"),
-    ):
-        values_to_insert_into_db = df[column_name].unique()
-        db_data = crud.get_all()
-
-        if not db_data.empty:
-            values_to_insert_into_db = values_to_insert_into_db[
-                ~pd.Series(values_to_insert_into_db).isin(db_data[column_name])
-            ]
-
-        if values_to_insert_into_db.size != 0:
-            validated_data = [
-                crud.schema(**{column_name: value}).dict()
-                for value in values_to_insert_into_db
-            ]
-            response = crud.bulk_insert(validated_data)
-            records_inserted[crud.model.__tablename__] = response.shape[0]
-
-        value_pk_mappings = crud.get_all().set_index(column_name)["id"].to_dict()
-        df[column_name] = df[column_name].map(value_pk_mappings)
+    for crud in (customer, service_type, rate_plan):
+        with metrics.timer("dimension", crud.natural_key, rows=df.shape[0]) as counts:
+            value_pk_mappings, inserted = dimension_caches[crud.natural_key].resolve(
+                df[crud.natural_key].unique()
+            )
+            if inserted:
+                records_inserted[crud.model.__tablename__] = inserted
+            df[crud.natural_key] = df[crud.natural_key].map(value_pk_mappings)
+            counts["rows"] = inserted
 
     df.columns = event.schema.get_field_names()
-    values_to_insert_into_db = df.to_dict("records")
-    validated_data = [
-        event.schema(**value).dict() for value in values_to_insert_into_db
-    ]
-    response = event.bulk_insert(validated_data)
-    records_inserted[event.model.__tablename__] += response.shape[0]
+    with metrics.timer("validate_frame", event.model.__tablename__, rows=df.shape[0]):
+        data = event.validate_frame(df)
+    if DEDUPLICATE_EVENTS:
+        with metrics.timer("deduplicate", event.model.__tablename__) as counts:
+            data = drop_loaded_events(data, lookup=not bulk)
+            counts["rows"] = df.shape[0] - data.shape[0]
+    records_inserted[event.model.__tablename__] += event.bulk_load(data)
+    with metrics.timer("aggregate", usage_summary.model.__tablename__, rows=data.shape[0]):
+        usage_summary.add_events(data)
+    with metrics.timer("sketch", customer_sketch.model.__tablename__, rows=data.shape[0]):
+        customer_sketch.add_events(data)
+
+    for crud in (customer, service_type, rate_plan):
+        with metrics.timer("touch", crud.model.__tablename__):
+            crud.touch(df[crud.event_fk].unique())
 
     return records_inserted
 
 
-if __name__ == "__main__":
+def load_chunk(
+    index: int,
+    df: pd.DataFrame,
+    df_error: pd.DataFrame,
+    total_records_inserted: DefaultDict[str, int],
+    manifest: Optional[LoadManifest] = None,
+    path: str = DATA_FILE,
+    bulk: bool = False,
+) -> None:
+    """Populates database with valid data of a chunk and exports its validation errors
+
+    Args:
+        index (int): chunk number (in read order)
+        df (pd.DataFrame): validated data
+        df_error (pd.DataFrame): rejected rows
+        total_records_inserted (DefaultDict[str, int]): running totals of inserted records per table
+        manifest (Optional[LoadManifest], optional): load manifest to record a committed chunk in.
+         Defaults to None.
+        path (str, optional): path to a loaded file (recorded with its rejected rows).
+         Defaults to DATA_FILE.
+        bulk (bool, optional): bulk mode (see populate_db). Defaults to False.
+    """
+    # a chunk (dimensions, events, aggregates and its manifest record) is committed at once
+    records_inserted = {}
+    try:
+        with metrics.timer("chunk_transaction", rows=df.shape[0]), unit_of_work():
+            if not df.empty:
+                records_inserted = populate_db(df, bulk)
+            if manifest is not None:
+                manifest.commit_chunk(df.shape[0] + df_error.shape[0])
+    except Exception:
+        for cache in dimension_caches.values():
+            cache.rollback()
+        raise
+    for cache in dimension_caches.values():
+        cache.commit()
+
+    # rejected rows are exported after a chunk is committed, so a resumed load doesn't repeat them
+    if not df_error.empty:
+        with metrics.timer("export_errors", rows=df_error.shape[0]):
+            error_sink.write(df_error, path, index)
+        logger.warning(
+            f"Validation errors found in chunk {index}. Exported to a file: '{error_sink.path}'"
+        )
+
+    for key, value in records_inserted.items():
+        logger.info(f"{value} records inserted into the '{key}' table")
+        total_records_inserted[key] += records_inserted[key]
+
+
+def measure_chunk(
+    index: int,
+    df: pd.DataFrame,
+    df_error: pd.DataFrame,
+    load: Callable[[int, pd.DataFrame, pd.DataFrame], None],
+    chunk_sizer: AdaptiveChunkSizer,
+) -> None:
+    """Loads a validated chunk, feeding its memory and time to a chunk sizer (pipelined load)"""
+    with chunk_sizer.measure(df, df_error):
+        load(index, df, df_error)
+
+
+def save_profile(file_id: int, profile: DatasetProfile) -> None:
+    """Stores metrics of a loaded file and logs their drift from previous loads
+
+    Args:
+        file_id (int): id of a 'load_file' record
+        profile (DatasetProfile): profile of a whole file
+    """
+    metrics = profile.metrics()
+    previous = load_metric.get_previous(file_id, PROFILE_BASELINE_LOADS)
+    for alert in detect_drift(metrics, previous):
+        logger.warning(f"data drift: {alert}")
+    load_metric.save(file_id, metrics)
+
+
+def ingest(source: SourceConfig, job: str = "load") -> Dict[str, int]:
+    """Loads a source: checks its data quality, loads it chunk by chunk (resuming an interrupted
+        load) and stores its data profile. A regular (not bulk) load holds a shared load lock and
+        doesn't start while event indexes are dropped by a bulk load
+
+    Args:
+        source (SourceConfig): source config
+        job (str, optional): job name of exported stage metrics. Defaults to "load".
+
+    Raises:
+        BulkModeError: a bulk load is running or wasn't restored
+
+    Returns:
+        Dict[str, int]: table name -> number of inserted records
+    """
+    if source.bulk:
+        # a bulk load holds an exclusive lock (see bulk_mode.DeferredIndexes.deferred)
+        return _ingest(source, job)
+    with load_lock():
+        DeferredIndexes().check_restored()
+        return _ingest(source, job)
+
+
+def _ingest(source: SourceConfig, job: str) -> Dict[str, int]:
+    adapter = create_adapter(source)
     total_records_inserted = defaultdict(lambda: 0)
+    manifest = LoadManifest(source.path)
+    start_row = manifest.start()
+
+    if start_row == 0:
+        try:
+            QualityGate(rules=source.rules).run(
+                source.path,
+                source.columns,
+                dtype=dict.fromkeys(source.columns, str),
+                backend=adapter.backend or source.backend,
+                transform=adapter.to_target,
+            )
+        except DataQualityError:
+            manifest.reject()
+            raise
 
-    for chunk in tqdm(
-        data_utils.read_csv_chunks(
-            columns=COLUMN_NAMES,
-            chunksize=CHUNK_SIZE,
+    if start_row is not None:
+        chunk_sizer = AdaptiveChunkSizer(
+            source.chunk_size,
+            min_size=MIN_CHUNK_SIZE,
+            max_size=MAX_CHUNK_SIZE,
+            memory_budget=CHUNK_MEMORY_BUDGET,
+            target_seconds=CHUNK_TARGET_SECONDS,
         )
-    ):
-        df, df_error = validate_and_clean_data(
-            chunk=chunk,
-            integer_columns=INTEGER_COLUMNS,
-            date_columns=DATE_COLUMNS,
-            currency_columns=CURRENCY_COLUMNS,
+        profile = DatasetProfile(COLUMN_NAMES)
+        chunks = tqdm(
+            profile.observe(
+                metrics.iterate(
+                    "read_csv_chunks",
+                    adapter.read_chunks(chunk_sizer.next_size, start_row=start_row),
+                )
+            ),
+            desc=source.name,
         )
-        if not df_error.empty:
-            path_ = f"{ERROR_FILE_PATH}/df_errors_{datetime.now()}.csv"
-            df_error.to_csv(path_)
-            logger.warning(f"Validation errors found. Exported to a file: '{path_}")
-        if not df.empty:
-            records_inserted = populate_db(df)
+        load = partial(
+            load_chunk,
+            total_records_inserted=total_records_inserted,
+            manifest=manifest,
+            path=source.path,
+            bulk=source.bulk,
+        )
+        validate = partial(validate_and_clean_data, rules=source.rules)
 
-            for key, value in records_inserted.items():
-                logger.info(f"{value} records inserted into the '{key}' table")
-                total_records_inserted[key] += records_inserted[key]
+        if source.shards:
+            # validation and loading run in shard worker processes
+            for key, value in (
+                ShardedLoader(source.shards, source.rules, job=job, error_sink=error_sink)
+                .run(chunks, manifest, source.path)
+                .items()
+            ):
+                total_records_inserted[key] += value
+        elif source.pipeline_workers:
+            # validation runs in worker processes, only a load is measured
+            Pipeline(
+                validate,
+                partial(measure_chunk, load=load, chunk_sizer=chunk_sizer),
+                workers=source.pipeline_workers,
+                queue_size=PIPELINE_QUEUE_SIZE,
+            ).run(chunks)
+        else:
+            for index, chunk in enumerate(chunks):
+                with chunk_sizer.measure(chunk):
+                    load(index, *validate(chunk=chunk))
+        manifest.finish()
+        # a profile of a resumed load covers only its remaining rows
+        if start_row == 0:
+            save_profile(manifest.file_id, profile)
 
     for key, value in total_records_inserted.items():
-        logger.info(f"inserted total: '{value}' records into a '{key}' table")
+        logger.info(f"{source.name}: inserted total: '{value}' records into a '{key}' table")
+
+    for key, cache in dimension_caches.items():
+        logger.info(f"dimension cache '{key}': {cache.stats()}")
+    metrics.export(job)
+    # a worker process may ingest several sources, each exports only its own stages
+    metrics.reset()
+    return dict(total_records_inserted)
+
+
+def ingest_sources(
+    sources: List[SourceConfig],
+    max_workers: int = INGEST_MAX_WORKERS,
+    max_db_connections: int = INGEST_MAX_DB_CONNECTIONS,
+) -> Dict[str, Dict[str, int]]:
+    """Loads independent sources concurrently (a process per source) within a shared budget of
+        processes and database connections. Sources start in config order as soon as the budget
+        has room for them, a failed source doesn't stop the others
+
+    Args:
+        sources (List[SourceConfig]): source configs
+        max_workers (int, optional): max number of processes. Defaults to INGEST_MAX_WORKERS.
+        max_db_connections (int, optional): max number of database connections.
+         Defaults to INGEST_MAX_DB_CONNECTIONS.
+
+    Raises:
+        Exception: the first error of a failed source (after all sources finished)
+
+    Returns:
+        Dict[str, Dict[str, int]]: source name -> table name -> number of inserted records
+    """
+    budget = IngestionBudget(max_workers, max_db_connections)
+    for source in sources:
+        budget.check(source)
+
+    results, errors = {}, {}
+    pending = list(sources)
+    running = {}
+    # spawned, not forked: a worker must not share pooled connections of this process
+    with ProcessPoolExecutor(
+        max_workers=min(len(sources), max_workers),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        while pending or running:
+            while pending and budget.acquire(pending[0]):
+                source = pending.pop(0)
+                running[executor.submit(ingest, source, f"load_{source.name}")] = source
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = running.pop(future)
+                budget.release(source)
+                try:
+                    results[source.name] = future.result()
+                    logger.info(f"source '{source.name}' loaded: {results[source.name]}")
+                except Exception as error:
+                    logger.error(f"source '{source.name}' failed: {error!r}")
+                    errors[source.name] = error
+    if errors:
+        raise next(iter(errors.values()))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loads usage data sources")
+    parser.add_argument(
+        "--source", action="append", help="name of a source to load (default: all sources)"
+    )
+    args = parser.parse_args()
+
+    event_partitions.ensure_partitions()
+    sources = load_sources(SOURCES, args.source)
+    if len(sources) == 1:
+        ingest(sources[0])
+    else:
+        ingest_sources(sources)
@@ -0,0 +1,76 @@
+import logging
+import os
+from typing import Optional
+
+from crud import data_version, load_chunk, load_file
+from data_utils import data_utils
+from unit_of_work import unit_of_work
+
+logger = logging.getLogger("__name__")
+
+
+class LoadManifest:
+    """Records what was loaded from a file, so reruns of a crashed load (or of a resent file)
+        skip committed chunks and continue from the first incomplete one
+
+    Attributes:
+        path: path to a loaded file
+        file_id: id of a 'load_file' record
+        next_chunk_index: index of the next chunk to commit
+        start_row: first row not loaded yet (0 - the first data row of a file)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file_id = None
+        self.next_chunk_index = 0
+        self.start_row = 0
+
+    def start(self) -> Optional[int]:
+        """Registers a file (by a fingerprint of its content) and finds where to resume loading
+
+        Returns:
+            Optional[int]: first row to load, None if a file was already loaded completely
+        """
+        record = load_file.get_or_create(
+            self.path, data_utils.file_fingerprint(self.path), os.path.getsize(self.path)
+        )
+        self.file_id = int(record.at[0, "id"])
+        if record.at[0, "status"] == "loaded":
+            logger.info(f"'{self.path}' was already loaded (load file {self.file_id})")
+            return None
+
+        # chunks are committed in order, resume after the contiguous committed prefix
+        for chunk in load_chunk.get_committed(self.file_id).itertuples():
+            if chunk.chunk_index != self.next_chunk_index or chunk.start_row != self.start_row:
+                break
+            self.next_chunk_index += 1
+            self.start_row += chunk.row_count
+
+        if self.start_row:
+            logger.info(
+                f"resuming '{self.path}' (load file {self.file_id}) from row {self.start_row}, "
+                f"{self.next_chunk_index} chunks already committed"
+            )
+        return self.start_row
+
+    def commit_chunk(self, row_count: int) -> None:
+        """Records the next chunk as committed and bumps a data version of reports (in a current
+            unit of work, e.g. a chunk transaction)
+
+        Args:
+            row_count (int): number of file rows in a chunk (valid and rejected)
+        """
+        with unit_of_work():
+            load_chunk.commit(
+                self.file_id, self.next_chunk_index, self.start_row, row_count
+            )
+            data_version.bump()
+        self.next_chunk_index += 1
+        self.start_row += row_count
+
+    def finish(self) -> None:
+        load_file.set_status(self.file_id, "loaded")
+
+    def reject(self) -> None:
+        load_file.set_status(self.file_id, "rejected")
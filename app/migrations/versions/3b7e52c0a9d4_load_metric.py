@@ -0,0 +1,32 @@
+"""load metric
+
+Revision ID: 3b7e52c0a9d4
+Revises: dfcaf55ac1eb
+Create Date: 2026-10-18 14:02:17.845213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e52c0a9d4'
+down_revision = 'dfcaf55ac1eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('load_metric',
+    sa.Column('file_fk', sa.Integer(), nullable=False),
+    sa.Column('column_name', sa.String(), nullable=False),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['file_fk'], ['load_file.id'], ),
+    sa.PrimaryKeyConstraint('file_fk', 'column_name', 'metric')
+    )
+
+
+def downgrade():
+    op.drop_table('load_metric')
@@ -0,0 +1,35 @@
+"""customer sketch
+
+Revision ID: 5e91d2f4b7a6
+Revises: 3b7e52c0a9d4
+Create Date: 2026-10-18 15:11:42.308517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e91d2f4b7a6'
+down_revision = '3b7e52c0a9d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('customer_sketch',
+    sa.Column('service_type_fk', sa.Integer(), nullable=False),
+    sa.Column('rate_plan_fk', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('registers', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['rate_plan_fk'], ['plan.id'], ),
+    sa.ForeignKeyConstraint(['service_type_fk'], ['service.id'], ),
+    sa.PrimaryKeyConstraint('service_type_fk', 'rate_plan_fk', 'day')
+    )
+    # sketches are built in python, sketches of already loaded events are built by
+    # crud.customer_sketch.rebuild()
+
+
+def downgrade():
+    op.drop_table('customer_sketch')
@@ -0,0 +1,41 @@
+"""dimension last_seen_at
+
+Revision ID: 667c2ec0ff24
+Revises: e8970cd4c4e1
+Create Date: 2026-10-18 11:02:17.904116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '667c2ec0ff24'
+down_revision = 'e8970cd4c4e1'
+branch_labels = None
+depends_on = None
+
+DIMENSIONS = (
+    ('customer', 'customer_fk'),
+    ('service', 'service_type_fk'),
+    ('plan', 'rate_plan_fk'),
+)
+
+
+def upgrade():
+    for table, event_fk in DIMENSIONS:
+        op.add_column(table, sa.Column('last_seen_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+        # one-off backfill from existing events, later maintained by loads and purges
+        op.execute(f"""
+            UPDATE {table} SET last_seen_at = seen.created_at
+            FROM (SELECT {event_fk} AS id, max(created_at) AS created_at FROM event GROUP BY {event_fk}) AS seen
+            WHERE {table}.id = seen.id
+        """)
+        op.execute(f"UPDATE {table} SET last_seen_at = created_at WHERE id NOT IN (SELECT {event_fk} FROM event WHERE {event_fk} IS NOT NULL)")
+        op.create_index(op.f(f'ix_{table}_last_seen_at'), table, ['last_seen_at'], unique=False)
+
+
+def downgrade():
+    for table, _ in DIMENSIONS:
+        op.drop_index(op.f(f'ix_{table}_last_seen_at'), table_name=table)
+        op.drop_column(table, 'last_seen_at')
@@ -0,0 +1,64 @@
+"""compact event layout
+
+Revision ID: 8c4a1f6d2e93
+Revises: 5e91d2f4b7a6
+Create Date: 2026-10-18 16:37:05.912644
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4a1f6d2e93'
+down_revision = '5e91d2f4b7a6'
+branch_labels = None
+depends_on = None
+
+# id indexes duplicating primary key indexes
+ID_INDEXES = (
+    ('ix_customer_id', 'customer'),
+    ('ix_plan_id', 'plan'),
+    ('ix_service_id', 'service'),
+    ('ix_event_id', 'event'),
+)
+BRIN_INDEXES = ('created_at', 'start_date')
+
+
+def upgrade():
+    for index, table in ID_INDEXES:
+        op.drop_index(op.f(index), table_name=table)
+    op.drop_index(op.f('ix_event_created_at'), table_name='event')
+    # a month is derived from a start date, source month text is not kept
+    op.drop_column('event', 'month')
+    # all type changes in one statement, partitions are rewritten once
+    op.execute("""
+        ALTER TABLE event
+            ALTER COLUMN billing_flag_1 TYPE smallint,
+            ALTER COLUMN billing_flag_2 TYPE smallint,
+            ALTER COLUMN charge TYPE bigint USING round(charge * 1000000)::bigint,
+            ADD COLUMN month date GENERATED ALWAYS AS (date_trunc('month', start_date)::date) STORED
+    """)
+    op.alter_column('event', 'charge', new_column_name='charge_micros')
+    for column in BRIN_INDEXES:
+        op.create_index(
+            op.f(f'ix_event_{column}'), 'event', [column], unique=False, postgresql_using='brin'
+        )
+
+
+def downgrade():
+    for column in BRIN_INDEXES:
+        op.drop_index(op.f(f'ix_event_{column}'), table_name='event')
+    op.alter_column('event', 'charge_micros', new_column_name='charge')
+    op.drop_column('event', 'month')
+    op.execute("""
+        ALTER TABLE event
+            ALTER COLUMN billing_flag_1 TYPE integer,
+            ALTER COLUMN billing_flag_2 TYPE integer,
+            ALTER COLUMN charge TYPE numeric USING round(charge / 1000000.0, 6),
+            ADD COLUMN month varchar
+    """)
+    op.execute("UPDATE event SET month = to_char(start_date, 'YYYYMM')")
+    op.create_index(op.f('ix_event_created_at'), 'event', ['created_at'], unique=False)
+    for index, table in ID_INDEXES:
+        op.create_index(op.f(index), table, ['id'], unique=False)
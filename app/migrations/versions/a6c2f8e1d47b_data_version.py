@@ -0,0 +1,29 @@
+"""data version
+
+Revision ID: a6c2f8e1d47b
+Revises: b3d7e9a41c58
+Create Date: 2026-10-18 19:02:37.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c2f8e1d47b'
+down_revision = 'b3d7e9a41c58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('data_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO data_version (id, version) VALUES (1, 0)")
+
+
+def downgrade():
+    op.drop_table('data_version')
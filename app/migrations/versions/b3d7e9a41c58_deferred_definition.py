@@ -0,0 +1,31 @@
+"""deferred definition
+
+Revision ID: b3d7e9a41c58
+Revises: 8c4a1f6d2e93
+Create Date: 2026-10-18 17:24:51.207386
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d7e9a41c58'
+down_revision = '8c4a1f6d2e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('deferred_definition',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('table_name', sa.String(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('definition', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('deferred_definition')
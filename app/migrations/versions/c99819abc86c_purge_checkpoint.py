@@ -0,0 +1,33 @@
+"""purge checkpoint
+
+Revision ID: c99819abc86c
+Revises: 667c2ec0ff24
+Create Date: 2026-10-18 11:40:52.117342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c99819abc86c'
+down_revision = '667c2ec0ff24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('purge_checkpoint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cutoff', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_event_id', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('deleted', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('purge_checkpoint')
@@ -0,0 +1,49 @@
+"""load manifest
+
+Revision ID: dfcaf55ac1eb
+Revises: f08d8b6a3c1a
+Create Date: 2026-10-18 13:05:44.271690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dfcaf55ac1eb'
+down_revision = 'f08d8b6a3c1a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('load_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False),
+    sa.Column('fingerprint', sa.String(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('fingerprint')
+    )
+    op.create_table('load_chunk',
+    sa.Column('file_fk', sa.Integer(), nullable=False),
+    sa.Column('chunk_index', sa.Integer(), nullable=False),
+    sa.Column('start_row', sa.BigInteger(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['file_fk'], ['load_file.id'], ),
+    sa.PrimaryKeyConstraint('file_fk', 'chunk_index')
+    )
+    op.add_column('event', sa.Column('row_hash', sa.BigInteger(), nullable=True))
+    op.create_index(op.f('ix_event_row_hash'), 'event', ['row_hash'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_event_row_hash'), table_name='event')
+    op.drop_column('event', 'row_hash')
+    op.drop_table('load_chunk')
+    op.drop_table('load_file')
@@ -0,0 +1,94 @@
+"""partition event by month
+
+Revision ID: e8970cd4c4e1
+Revises: 9d50fc75f961
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8970cd4c4e1'
+down_revision = '9d50fc75f961'
+branch_labels = None
+depends_on = None
+
+EVENT_INDEXES = ('created_at', 'customer_fk', 'id', 'rate_plan_fk', 'service_type_fk')
+EVENT_COLUMNS = (
+    'id, customer_fk, start_date, service_type_fk, rate_plan_fk, '
+    'billing_flag_1, billing_flag_2, duration, charge, month, created_at'
+)
+
+
+def _event_columns():
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('event_id_seq'::regclass)"), nullable=False),
+        sa.Column('customer_fk', sa.Integer(), nullable=True),
+        sa.Column('start_date', sa.DateTime(), nullable=True),
+        sa.Column('service_type_fk', sa.Integer(), nullable=True),
+        sa.Column('rate_plan_fk', sa.Integer(), nullable=True),
+        sa.Column('billing_flag_1', sa.Integer(), nullable=True),
+        sa.Column('billing_flag_2', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Integer(), nullable=True),
+        sa.Column('charge', sa.Numeric(scale=6), nullable=True),
+        sa.Column('month', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['customer_fk'], ['customer.id'], ),
+        sa.ForeignKeyConstraint(['rate_plan_fk'], ['plan.id'], ),
+        sa.ForeignKeyConstraint(['service_type_fk'], ['service.id'], ),
+    ]
+
+
+def _replace_event_table(*table_args, **table_kwargs):
+    op.execute('ALTER TABLE event RENAME TO event_old')
+    op.execute('ALTER TABLE event_old RENAME CONSTRAINT event_pkey TO event_old_pkey')
+    op.execute('ALTER SEQUENCE event_id_seq OWNED BY NONE')
+    for column in EVENT_INDEXES:
+        op.drop_index(op.f(f'ix_event_{column}'), table_name='event_old')
+
+    op.create_table('event', *_event_columns(), *table_args, **table_kwargs)
+    for column in EVENT_INDEXES:
+        op.create_index(op.f(f'ix_event_{column}'), 'event', [column], unique=False)
+
+
+def upgrade():
+    _replace_event_table(
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    # monthly partitions covering existing data and the upcoming months
+    op.execute("""
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce((SELECT min(created_at) FROM event_old), now())),
+                    date_trunc('month', now()) + interval '3 months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF event FOR VALUES FROM (%L) TO (%L)',
+                    'event_' || to_char(month, 'YYYY_MM'), month, (month + interval '1 month')::date
+                );
+            END LOOP;
+        END $$;
+    """)
+    op.execute(
+        f'INSERT INTO event ({EVENT_COLUMNS}) '
+        f"SELECT {EVENT_COLUMNS.replace('created_at', 'coalesce(created_at, now())')} FROM event_old"
+    )
+    op.drop_table('event_old')
+    op.execute('ALTER SEQUENCE event_id_seq OWNED BY event.id')
+
+
+def downgrade():
+    _replace_event_table(sa.PrimaryKeyConstraint('id'))
+    op.execute(f'INSERT INTO event ({EVENT_COLUMNS}) SELECT {EVENT_COLUMNS} FROM event_old')
+    op.drop_table('event_old')
+    op.execute('ALTER SEQUENCE event_id_seq OWNED BY event.id')
+    op.alter_column('event', 'created_at', nullable=True)
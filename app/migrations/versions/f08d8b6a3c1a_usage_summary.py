@@ -0,0 +1,61 @@
+"""usage summary
+
+Revision ID: f08d8b6a3c1a
+Revises: c99819abc86c
+Create Date: 2026-10-18 12:21:06.530981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f08d8b6a3c1a'
+down_revision = 'c99819abc86c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('usage_summary',
+    sa.Column('service_type_fk', sa.Integer(), nullable=False),
+    sa.Column('rate_plan_fk', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('event_count', sa.BigInteger(), nullable=False),
+    sa.Column('total_duration', sa.BigInteger(), nullable=False),
+    sa.Column('total_charge', sa.Numeric(scale=6), nullable=False),
+    sa.Column('customers', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['rate_plan_fk'], ['plan.id'], ),
+    sa.ForeignKeyConstraint(['service_type_fk'], ['service.id'], ),
+    sa.PrimaryKeyConstraint('service_type_fk', 'rate_plan_fk', 'month')
+    )
+    op.create_table('usage_summary_customer',
+    sa.Column('service_type_fk', sa.Integer(), nullable=False),
+    sa.Column('rate_plan_fk', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('customer_fk', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('service_type_fk', 'rate_plan_fk', 'month', 'customer_fk')
+    )
+    # initial build from already loaded events
+    op.execute("""
+        INSERT INTO usage_summary_customer (service_type_fk, rate_plan_fk, month, customer_fk)
+        SELECT DISTINCT service_type_fk, rate_plan_fk, date_trunc('month', start_date)::date, customer_fk
+        FROM event
+        WHERE service_type_fk IS NOT NULL AND rate_plan_fk IS NOT NULL AND start_date IS NOT NULL
+          AND customer_fk IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO usage_summary
+            (service_type_fk, rate_plan_fk, month, event_count, total_duration, total_charge, customers)
+        SELECT service_type_fk, rate_plan_fk, date_trunc('month', start_date)::date, count(*),
+               coalesce(sum(duration), 0), coalesce(sum(charge), 0), count(DISTINCT customer_fk)
+        FROM event
+        WHERE service_type_fk IS NOT NULL AND rate_plan_fk IS NOT NULL AND start_date IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_table('usage_summary_customer')
+    op.drop_table('usage_summary')
@@ -2,55 +2,205 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy import (
     Column,
+    Computed,
+    Index,
     String,
     Integer,
+    SmallInteger,
+    BigInteger,
     ForeignKey,
     DateTime,
     Numeric,
-    create_engine
+    Date,
+    Float,
+    LargeBinary,
+    create_engine,
+    event,
 )
 from sqlalchemy.sql import func
 
-from setup import SQLALCHEMY_CON_STR
+from setup import DB_POOL_SIZE, DB_STATEMENT_TIMEOUT_MS, SQLALCHEMY_CON_STR
 
-engine = create_engine(SQLALCHEMY_CON_STR)
+engine = create_engine(SQLALCHEMY_CON_STR, pool_size=DB_POOL_SIZE, pool_pre_ping=True)
+
+
+def set_statement_timeout(dbapi_connection, connection_record) -> None:
+    """Sets a statement timeout of a new postgres connection (a session setting)"""
+    autocommit = dbapi_connection.autocommit
+    # outside a transaction, so a rollback of a first transaction doesn't undo it
+    dbapi_connection.autocommit = True
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET statement_timeout = {int(DB_STATEMENT_TIMEOUT_MS)}")
+    cursor.close()
+    dbapi_connection.autocommit = autocommit
+
+
+# postgres only, a libpq connect argument ('options') would break connecting other backends
+if engine.dialect.name == "postgresql":
+    event.listen(engine, "connect", set_statement_timeout)
 Base = declarative_base()
 
 
 class Event(Base):
     __tablename__ = "event"
-    id = Column(Integer, primary_key=True, index=True)
+    # monthly range partitions on 'created_at' are managed by partitions.py. Events are appended
+    # in (roughly) start and creation order, so block range (BRIN) indexes serve range scans of
+    # reports and of the retention purge at a fraction of a btree size and insert cost
+    __table_args__ = (
+        Index("ix_event_start_date", "start_date", postgresql_using="brin"),
+        Index("ix_event_created_at", "created_at", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
     customer_fk = Column(Integer, ForeignKey("customer.id"), index=True)
+    # UTC, offsets of source timestamps are applied (see DataUtils.parse_timestamps)
     start_date = Column(DateTime)
     service_type_fk = Column(Integer, ForeignKey("service.id"), index=True)
     rate_plan_fk = Column(Integer, ForeignKey("plan.id"), index=True)
-    billing_flag_1 = Column(Integer)
-    billing_flag_2 = Column(Integer)
+    billing_flag_1 = Column(SmallInteger)
+    billing_flag_2 = Column(SmallInteger)
     duration = Column(Integer)
-    charge = Column(Numeric(scale=6))
-    month = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # charge scaled by 10**6 (see EventCrud.charge_scale)
+    charge_micros = Column(BigInteger)
+    # month of an event start, derived by the database (not loaded)
+    month = Column(Date, Computed("date_trunc('month', start_date)::date", persisted=True))
+    # hash of natural event attributes, used to skip events of resent files
+    row_hash = Column(BigInteger, index=True)
+    created_at = Column(
+        DateTime(timezone=True), server_default=func.now(), primary_key=True
+    )
 
 
 class Customer(Base):
     __tablename__ = "customer"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     customer_id = Column(Integer, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # time of the latest load referencing a record (orphan cleanup candidates)
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     event = relationship("Event")
 
 
 class ServiceType(Base):
     __tablename__ = "service"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     service_type = Column(String, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # time of the latest load referencing a record (orphan cleanup candidates)
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     event = relationship("Event")
 
 
 class RatePlan(Base):
     __tablename__ = "plan"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     rate_plan_id = Column(Integer, unique=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # time of the latest load referencing a record (orphan cleanup candidates)
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     event = relationship("Event")
+
+
+class PurgeCheckpoint(Base):
+    __tablename__ = "purge_checkpoint"
+    id = Column(Integer, primary_key=True)
+    cutoff = Column(DateTime(timezone=True), nullable=False)
+    # events are purged in id order, a resumed purge continues after this id
+    last_event_id = Column(BigInteger, nullable=False, server_default="0")
+    deleted = Column(BigInteger, nullable=False, server_default="0")
+    finished_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class UsageSummary(Base):
+    # usage by service type, rate plan and month of an event start. Maintained incrementally
+    # by loads, rebuilt for purged months by a retention purge
+    __tablename__ = "usage_summary"
+    service_type_fk = Column(Integer, ForeignKey("service.id"), primary_key=True)
+    rate_plan_fk = Column(Integer, ForeignKey("plan.id"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    event_count = Column(BigInteger, nullable=False)
+    total_duration = Column(BigInteger, nullable=False)
+    total_charge = Column(Numeric(scale=6), nullable=False)
+    customers = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class UsageSummaryCustomer(Base):
+    # distinct customers of usage_summary records, keeps distinct counts incremental
+    __tablename__ = "usage_summary_customer"
+    service_type_fk = Column(Integer, primary_key=True)
+    rate_plan_fk = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)
+    customer_fk = Column(Integer, primary_key=True)
+
+
+class CustomerSketch(Base):
+    # HyperLogLog registers (sketches.HyperLogLog) of customers by service type, rate plan and
+    # day of an event start. Distinct customers of any range of days are estimated by merging them
+    __tablename__ = "customer_sketch"
+    service_type_fk = Column(Integer, ForeignKey("service.id"), primary_key=True)
+    rate_plan_fk = Column(Integer, ForeignKey("plan.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LoadFile(Base):
+    __tablename__ = "load_file"
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False)
+    fingerprint = Column(String, unique=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    # 'loading', 'loaded' or 'rejected' (failed a data quality gate)
+    status = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LoadChunk(Base):
+    __tablename__ = "load_chunk"
+    file_fk = Column(Integer, ForeignKey("load_file.id"), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    start_row = Column(BigInteger, nullable=False)
+    row_count = Column(Integer, nullable=False)
+    status = Column(String, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class LoadMetric(Base):
+    """Data profile metric of a loaded file (see profiling.DatasetProfile)"""
+
+    __tablename__ = "load_metric"
+    file_fk = Column(Integer, ForeignKey("load_file.id"), primary_key=True)
+    # '*' for metrics of a whole file
+    column_name = Column(String, primary_key=True)
+    metric = Column(String, primary_key=True)
+    value = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DeferredDefinition(Base):
+    """Definition of an index or a foreign key dropped for a bulk load (see bulk_mode.py). Kept
+    until it's restored, so a crashed bulk load can be restored by the next run"""
+
+    __tablename__ = "deferred_definition"
+    name = Column(String, primary_key=True)
+    table_name = Column(String, nullable=False)
+    # 'index' or 'foreign_key'
+    kind = Column(String, nullable=False)
+    # CREATE INDEX statement or a constraint definition
+    definition = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DataVersion(Base):
+    """Version of reported data (see reporting.UsageReport), one record. Every transaction
+    changing reported data (a committed load chunk, a purge step) increments it. Increments of
+    concurrent transactions wait for each other on its row lock, so it grows in commit order,
+    unlike a transaction start time (now())"""
+
+    __tablename__ = "data_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default="0")
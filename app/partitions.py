@@ -0,0 +1,209 @@
+import datetime
+import logging
+import re
+from typing import Iterable, List, NamedTuple, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from instrumentation import metrics
+from models import Event, engine
+from setup import PARTITION_DETACH_LOCK_TIMEOUT, PARTITION_MONTHS_AHEAD
+from unit_of_work import unit_of_work
+
+logger = logging.getLogger("__name__")
+
+
+class Partition(NamedTuple):
+    """Monthly partition of a table
+
+    Attributes:
+        name: partition table name
+        month: first day of a month the partition holds
+        estimated_rows: row estimate from planner statistics
+        detach_pending: a concurrent detach of the partition was interrupted
+    """
+
+    name: str
+    month: datetime.date
+    estimated_rows: int
+    detach_pending: bool = False
+
+    @property
+    def upper_bound(self) -> datetime.date:
+        return add_months(self.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    """Adds a number of months to a first day of a month
+
+    Args:
+        month (datetime.date): first day of a month
+        months (int): number of months to add
+
+    Returns:
+        datetime.date: first day of a resulting month
+    """
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return datetime.date(year, month_index + 1, 1)
+
+
+def expired_partitions(
+    partitions: Iterable[Partition], cutoff: datetime.datetime
+) -> List[Partition]:
+    """Selects partitions holding only rows created before a cutoff: months ending on or before
+        a cutoff day. A month of a cutoff is row-deleted by a purge
+
+    Args:
+        partitions (Iterable[Partition]): monthly partitions
+        cutoff (datetime.datetime): rows created before it are expired
+
+    Returns:
+        List[Partition]: expired partitions ordered by month
+    """
+    return sorted(
+        (partition for partition in partitions if partition.upper_bound <= cutoff.date()),
+        key=lambda partition: partition.month,
+    )
+
+
+class MonthlyPartitions:
+    """Manages monthly range partitions of a table partitioned by 'created_at'
+
+    Attributes:
+        table: name of a partitioned table
+        months_ahead: number of upcoming months to keep partitions created for
+    """
+
+    def __init__(self, table: str, months_ahead: int = PARTITION_MONTHS_AHEAD):
+        self.table = table
+        self.months_ahead = months_ahead
+        self._name_pattern = re.compile(rf"^{table}_(\d{{4}})_(0[1-9]|1[0-2])$")
+
+    def partition_name(self, month: datetime.date) -> str:
+        return f"{self.table}_{month:%Y_%m}"
+
+    def ensure_partitions(self) -> List[str]:
+        """Creates partitions for the current month and upcoming months (if they don't exist yet)
+
+        Returns:
+            List[str]: names of ensured partitions
+        """
+        current_month = datetime.date.today().replace(day=1)
+        names = []
+        with unit_of_work() as connection:
+            for months in range(self.months_ahead + 1):
+                month = add_months(current_month, months)
+                name = self.partition_name(month)
+                connection.execute(
+                    text(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.table} "
+                        f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+                    )
+                )
+                names.append(name)
+        return names
+
+    def parse_partitions(self, rows: Iterable[Tuple[str, float, bool]]) -> List[Partition]:
+        """Parses monthly partitions of a table, tables not named as monthly partitions (see
+            partition_name) are skipped
+
+        Args:
+            rows (Iterable[Tuple[str, float, bool]]): (name, row estimate, detach pending) rows
+
+        Returns:
+            List[Partition]: partitions ordered by month
+        """
+        partitions = []
+        for name, estimated_rows, detach_pending in rows:
+            match = self._name_pattern.match(name)
+            if match:
+                month = datetime.date(int(match[1]), int(match[2]), 1)
+                partitions.append(
+                    Partition(name, month, max(int(estimated_rows), 0), bool(detach_pending))
+                )
+        return sorted(partitions, key=lambda partition: partition.month)
+
+    def list_partitions(self) -> List[Partition]:
+        """Lists monthly partitions of a table
+
+        Returns:
+            List[Partition]: partitions ordered by month
+        """
+        with unit_of_work() as connection:
+            # detaching concurrently (and its pending state) is postgres 14+
+            detach_pending = (
+                "pg_inherits.inhdetachpending"
+                if connection.dialect.server_version_info >= (14,)
+                else "false"
+            )
+            rows = connection.execute(
+                text(
+                    f"""SELECT child.relname, child.reltuples, {detach_pending}
+                        FROM pg_inherits
+                        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                        WHERE parent.relname = :table"""
+                ),
+                {"table": self.table},
+            ).all()
+        return self.parse_partitions(rows)
+
+    def _detach(self, partition: Partition) -> None:
+        if partition.detach_pending:
+            statement = f"ALTER TABLE {self.table} DETACH PARTITION {partition.name} FINALIZE"
+        else:
+            statement = f"ALTER TABLE {self.table} DETACH PARTITION {partition.name} CONCURRENTLY"
+        # a concurrent detach can't run in a transaction block, it takes its own connection
+        with engine.execution_options(isolation_level="AUTOCOMMIT").connect() as connection:
+            connection.execute(text(statement))
+
+    def _detach_locked(self, partition: Partition) -> bool:
+        # postgres < 14: an exclusive lock of a table is waited for briefly, loads and reports
+        # don't queue behind a waiting detach
+        try:
+            with unit_of_work() as connection:
+                connection.execute(
+                    text("SELECT set_config('lock_timeout', :timeout, true)"),
+                    {"timeout": PARTITION_DETACH_LOCK_TIMEOUT},
+                )
+                connection.execute(
+                    text(f"ALTER TABLE {self.table} DETACH PARTITION {partition.name}")
+                )
+        except OperationalError as error:
+            logger.warning(
+                f"partition '{partition.name}' not detached, '{self.table}' is in use: {error!r}"
+            )
+            return False
+        return True
+
+    def drop_expired(self, cutoff: datetime.datetime) -> List[Partition]:
+        """Detaches and drops partitions holding only rows created before a cutoff (see
+            expired_partitions). Postgres 14+ detaches them concurrently, so loads and reports of
+            a table aren't blocked. Older servers detach them under an exclusive lock waited for
+            at most PARTITION_DETACH_LOCK_TIMEOUT, partitions left attached are row-deleted by
+            a purge
+
+        Args:
+            cutoff (datetime.datetime): rows created before it are expired
+
+        Returns:
+            List[Partition]: dropped partitions
+        """
+        partitions = self.list_partitions()
+        # a server version is known once a connection was made
+        concurrently = engine.dialect.server_version_info >= (14,)
+        dropped = []
+        for partition in expired_partitions(partitions, cutoff):
+            with metrics.timer("drop_partition", partition.name, rows=partition.estimated_rows):
+                if concurrently:
+                    self._detach(partition)
+                elif not self._detach_locked(partition):
+                    break
+                with unit_of_work() as connection:
+                    connection.execute(text(f"DROP TABLE {partition.name}"))
+            dropped.append(partition)
+        return dropped
+
+
+event_partitions = MonthlyPartitions(Event.__tablename__)
@@ -0,0 +1,93 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import queue
+import threading
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+import pandas as pd
+
+_DONE = object()
+
+
+class Pipeline:
+    """Pipelined ETL: chunks are validated in a process pool while a loader thread writes
+        already validated chunks. Chunks are handed to the loader in read order, bounded
+        queues apply backpressure to the reader when validation or loading falls behind
+
+    Attributes:
+        validate: picklable (module level) function taking a chunk and returning (data, error_ds),
+         run in spawned worker processes
+        load: function taking a chunk index, data and error_ds. Called from a single loader thread
+        workers: number of validation worker processes
+        queue_size: max number of validated chunks waiting for the loader
+    """
+
+    def __init__(
+        self,
+        validate: Callable[[pd.DataFrame], Tuple[pd.DataFrame, pd.DataFrame]],
+        load: Callable[[int, pd.DataFrame, pd.DataFrame], Any],
+        workers: int = 2,
+        queue_size: int = 2,
+    ):
+        self.validate = validate
+        self.load = load
+        self.workers = workers
+        self.queue_size = queue_size
+        self._error: Optional[BaseException] = None
+
+    def _loader(self, validated: queue.Queue) -> None:
+        while True:
+            item = validated.get()
+            if item is _DONE:
+                return
+            if self._error is None:
+                try:
+                    self.load(*item)
+                except BaseException as error:
+                    self._error = error
+
+    def _put(self, validated: queue.Queue, item: Any) -> None:
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                validated.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run(self, chunks: Iterable[pd.DataFrame]) -> None:
+        """Validates and loads chunks
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): chunks to process (e.g. data_utils.read_csv_chunks)
+
+        Raises:
+            BaseException: the first error raised by validation or loading
+        """
+        self._error = None
+        validated = queue.Queue(maxsize=self.queue_size)
+        loader = threading.Thread(target=self._loader, args=(validated,), daemon=True)
+        loader.start()
+        # spawned, not forked: the loader thread runs already and a worker must not share
+        # pooled (or pinned) connections of this process
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        pending = deque()
+        try:
+            for index, chunk in enumerate(chunks):
+                pending.append((index, executor.submit(self.validate, chunk)))
+                while len(pending) > self.workers:
+                    index_, future = pending.popleft()
+                    self._put(validated, (index_, *future.result()))
+            while pending:
+                index_, future = pending.popleft()
+                self._put(validated, (index_, *future.result()))
+        finally:
+            executor.shutdown(cancel_futures=True)
+            validated.put(_DONE)
+            loader.join()
+        if self._error is not None:
+            raise self._error
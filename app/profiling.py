@@ -0,0 +1,187 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_utils import data_utils
+from setup import (
+    DRIFT_MAX_RATE_CHANGE,
+    DRIFT_MAX_RELATIVE_CHANGE,
+    PROFILE_QUANTILE_COLUMNS,
+    PROFILE_TOP_K,
+    PROFILE_TOP_K_COLUMNS,
+)
+from sketches import DDSketch, HyperLogLog, TopK
+
+QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+# metrics compared as an absolute change of a rate (other metrics by a relative change)
+RATE_METRICS = ("null_rate", "duplicate_rate")
+SHARE_PREFIX = "share:"
+# metrics stored only, not compared
+STORED_ONLY_METRICS = ("min", "max")
+
+
+class ColumnProfile:
+    """Streaming statistics of a column: null rate, distinct count and (optionally) min/max with
+        quantiles of numeric values and shares of the most frequent values
+
+    Attributes:
+        name: column name
+        rows: number of profiled values
+        nulls: number of null values
+        distinct: distinct count sketch
+        sketch: quantile sketch (numeric columns)
+        top_k: most frequent values
+    """
+
+    def __init__(self, name: str, quantiles: bool = False, top_k: Optional[int] = None):
+        self.name = name
+        self.rows = 0
+        self.nulls = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.distinct = HyperLogLog()
+        self.sketch = DDSketch() if quantiles else None
+        self.top_k = TopK(top_k) if top_k else None
+
+    def update(self, column: pd.Series) -> None:
+        values = column.dropna()
+        self.rows += column.shape[0]
+        self.nulls += column.shape[0] - values.shape[0]
+        self.distinct.add(values)
+        if self.sketch is not None:
+            numeric = pd.to_numeric(values, errors="coerce").to_numpy(dtype=np.float64)
+            numeric = numeric[np.isfinite(numeric)]
+            if numeric.shape[0]:
+                self.min = min(self.min, float(numeric.min()))
+                self.max = max(self.max, float(numeric.max()))
+                self.sketch.add(numeric)
+        if self.top_k is not None:
+            self.top_k.add(values)
+
+    def metrics(self) -> Dict[str, float]:
+        if not self.rows:
+            return {}
+        metrics = {
+            "null_rate": self.nulls / self.rows,
+            "distinct": self.distinct.count(),
+        }
+        if self.sketch is not None and self.sketch.count:
+            metrics.update(min=self.min, max=self.max)
+            for name, q in QUANTILES.items():
+                metrics[name] = self.sketch.quantile(q)
+        if self.top_k is not None and self.top_k.total:
+            for value, count in self.top_k.top():
+                metrics[f"{SHARE_PREFIX}{value}"] = count / self.top_k.total
+        return metrics
+
+
+class DatasetProfile:
+    """Streaming profile of a loaded file, updated chunk by chunk in one pass with constant memory
+
+    Attributes:
+        columns: column name -> profile
+        rows: number of profiled rows
+        distinct_rows: distinct count sketch of whole rows (detects duplicate bursts)
+    """
+
+    def __init__(
+        self,
+        columns: List[str],
+        quantile_columns: List[str] = PROFILE_QUANTILE_COLUMNS,
+        top_k_columns: List[str] = PROFILE_TOP_K_COLUMNS,
+        top_k: int = PROFILE_TOP_K,
+    ):
+        self.columns = {
+            column: ColumnProfile(
+                column,
+                quantiles=column in quantile_columns,
+                top_k=top_k if column in top_k_columns else None,
+            )
+            for column in columns
+        }
+        self.rows = 0
+        self.distinct_rows = HyperLogLog()
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.rows += chunk.shape[0]
+        self.distinct_rows.add_hashes(
+            data_utils.hash_rows(chunk).to_numpy().view(np.uint64)
+        )
+        for column, profile in self.columns.items():
+            profile.update(chunk[column])
+
+    def observe(self, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Profiles chunks while they are passed on (to validation)"""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def metrics(self) -> pd.DataFrame:
+        """Metrics of a profile
+
+        Returns:
+            pd.DataFrame: 'column_name', 'metric', 'value' records (dataset metrics have a '*' column name)
+        """
+        records = [("*", "rows", float(self.rows))]
+        if self.rows:
+            records.append(
+                ("*", "duplicate_rate", max(1 - self.distinct_rows.count() / self.rows, 0.0))
+            )
+        for column, profile in self.columns.items():
+            records.extend(
+                (column, metric, float(value))
+                for metric, value in profile.metrics().items()
+            )
+        return pd.DataFrame(records, columns=["column_name", "metric", "value"])
+
+
+def detect_drift(
+    current: pd.DataFrame,
+    previous: pd.DataFrame,
+    max_rate_change: float = DRIFT_MAX_RATE_CHANGE,
+    max_relative_change: float = DRIFT_MAX_RELATIVE_CHANGE,
+) -> List[str]:
+    """Compares metrics of a load with an average of previous loads. Rates and value shares are
+        compared by an absolute change, other metrics by a change relative to a baseline. A value
+        missing from top values of a load (or of previous loads) has a share of 0
+
+    Args:
+        current (pd.DataFrame): metrics of a load (see DatasetProfile.metrics)
+        previous (pd.DataFrame): metrics of previous loads with a 'file_fk' column
+        max_rate_change (float, optional): max absolute change of a rate. Defaults to DRIFT_MAX_RATE_CHANGE.
+        max_relative_change (float, optional): max relative change of other metrics.
+         Defaults to DRIFT_MAX_RELATIVE_CHANGE.
+
+    Returns:
+        List[str]: drift descriptions
+    """
+    if previous.empty:
+        return []
+
+    key = ["column_name", "metric"]
+    baseline = (
+        previous.pivot_table(index=key, columns="file_fk", values="value")
+        .fillna(0)
+        .mean(axis=1)
+    )
+    values = current.set_index(key)["value"]
+    compared = pd.concat(
+        [values.rename("current"), baseline.rename("baseline")], axis=1
+    ).fillna(0)
+
+    alerts = []
+    for (column, metric), row in compared.iterrows():
+        if metric in STORED_ONLY_METRICS:
+            continue
+        change = row["current"] - row["baseline"]
+        if metric in RATE_METRICS or metric.startswith(SHARE_PREFIX):
+            drifted = abs(change) > max_rate_change
+        else:
+            drifted = abs(change) > max_relative_change * abs(row["baseline"])
+        if drifted:
+            alerts.append(
+                f"'{column}' {metric}: {row['current']:.6g} vs {row['baseline']:.6g} "
+                "in previous loads"
+            )
+    return alerts
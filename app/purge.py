@@ -0,0 +1,84 @@
+import datetime
+import logging
+import time
+
+from crud import data_version, event, purge_checkpoint
+from instrumentation import metrics
+from setup import PURGE_BATCH_SIZE, PURGE_THROTTLE_SECONDS
+from unit_of_work import unit_of_work
+
+logger = logging.getLogger("__name__")
+
+
+class RetentionPurge:
+    """Batched, resumable purge of expired events. Every batch is committed together with
+        a checkpoint, so an interrupted purge resumes after the last committed batch (with the
+        cutoff it was started with)
+
+    Attributes:
+        batch_size: max number of events deleted in one transaction
+        throttle_seconds: pause between batches, leaves room for concurrent loads
+        checkpoint_id: id of a current 'purge_checkpoint' record
+        cutoff: events created before it are purged
+    """
+
+    def __init__(
+        self,
+        batch_size: int = PURGE_BATCH_SIZE,
+        throttle_seconds: float = PURGE_THROTTLE_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.throttle_seconds = throttle_seconds
+        self.checkpoint_id = None
+        self.cutoff = None
+
+    def start(self, cutoff: datetime.datetime) -> datetime.datetime:
+        """Resumes an unfinished purge or starts a new one
+
+        Args:
+            cutoff (datetime.datetime): cutoff of a new purge
+
+        Returns:
+            datetime.datetime: cutoff of a started (or resumed) purge
+        """
+        checkpoint = purge_checkpoint.get_unfinished()
+        if checkpoint.empty:
+            checkpoint = purge_checkpoint.start(cutoff)
+        else:
+            logger.info(
+                f"resuming purge {checkpoint.at[0, 'id']}: {checkpoint.at[0, 'deleted']} "
+                f"events deleted up to id {checkpoint.at[0, 'last_event_id']}"
+            )
+        self.checkpoint_id = int(checkpoint.at[0, "id"])
+        self.cutoff = checkpoint.at[0, "cutoff"].to_pydatetime()
+        return self.cutoff
+
+    def delete_events(self) -> int:
+        """Deletes expired events batch by batch
+
+        Returns:
+            int: number of events deleted by this run
+        """
+        deleted = 0
+        while True:
+            with metrics.timer("purge_batch", event.model.__tablename__) as counts:
+                with unit_of_work():
+                    count, last_id = event.delete_expired_batch(
+                        self.checkpoint_id, self.batch_size
+                    )
+                    data_version.bump()
+                counts["rows"] = count
+            deleted += count
+            if count:
+                logger.info(
+                    f"purge {self.checkpoint_id}: deleted {count} events up to id {last_id}"
+                )
+            if count < self.batch_size:
+                return deleted
+            time.sleep(self.throttle_seconds)
+
+    def finish(self) -> None:
+        # rebuilt aggregates and dropped partitions of a purge are reported after it finishes
+        with unit_of_work():
+            purge_checkpoint.finish(self.checkpoint_id)
+            data_version.bump()
@@ -0,0 +1,200 @@
+import io
+import logging
+import os
+import re
+import shutil
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+import pandas as pd
+
+from data_utils import data_utils
+from rule_engine import rule_engine
+from setup import (
+    QUALITY_ACTION,
+    QUALITY_HEAD_ROWS,
+    QUALITY_MAX_COLUMN_ERROR_RATE,
+    QUALITY_MAX_ERROR_RATE,
+    QUALITY_SAMPLE_ROWS,
+    QUALITY_SAMPLE_STRATA,
+    QUARANTINE_PATH,
+    VALIDATION_RULES,
+)
+
+logger = logging.getLogger("__name__")
+
+
+class DataQualityError(Exception):
+    """Raised when a file fails a data quality gate"""
+
+
+class QualityReport(NamedTuple):
+    rows: int
+    error_rate: float
+    column_error_rates: Dict[str, float]
+
+
+class QualityGate:
+    """Validates the first rows of a file and a sample spread evenly over its whole length
+        before loading starts, so bad files are rejected without loading them first
+
+    Attributes:
+        head_rows: number of first rows to validate
+        sample_rows: number of rows sampled from the rest of a file (plain csv only, byte offsets
+         of compressed and parquet files can't be seeked to)
+        strata: number of equal byte ranges rows are sampled from
+        max_error_rate: max share of rejected rows
+        max_column_error_rate: max share of rows rejected by one column
+        action: "abort" or "quarantine" (a file is moved to quarantine_path)
+        quarantine_path: directory failed files are moved to
+        rules: validation rules (see rule_engine.RuleEngine.split)
+    """
+
+    def __init__(
+        self,
+        head_rows: int = QUALITY_HEAD_ROWS,
+        sample_rows: int = QUALITY_SAMPLE_ROWS,
+        strata: int = QUALITY_SAMPLE_STRATA,
+        max_error_rate: float = QUALITY_MAX_ERROR_RATE,
+        max_column_error_rate: float = QUALITY_MAX_COLUMN_ERROR_RATE,
+        action: str = QUALITY_ACTION,
+        quarantine_path: str = QUARANTINE_PATH,
+        rules: Dict[str, Union[List[str], Dict[str, Any]]] = VALIDATION_RULES,
+    ):
+        if action not in ("abort", "quarantine"):
+            raise ValueError(f"unknown data quality action: '{action}'")
+        self.head_rows = head_rows
+        self.sample_rows = sample_rows
+        self.strata = strata
+        self.max_error_rate = max_error_rate
+        self.max_column_error_rate = max_column_error_rate
+        self.action = action
+        self.quarantine_path = quarantine_path
+        self.rules = rules
+
+    def sample(
+        self,
+        path: str,
+        columns: List[str],
+        dtype: Optional[Dict[str, type]] = None,
+        backend: str = "pandas",
+    ) -> pd.DataFrame:
+        """Reads the first rows of a file and (plain csv only) a stratified sample of its rows
+
+        Args:
+            path (str): path to a file
+            columns (List[str]): column names to asign to a dataframe
+            dtype (Optional[Dict[str, type]], optional): column name -> type to read a column as.
+             Defaults to None.
+            backend (str, optional): reader backend (see DataUtils.read_csv_chunks). Defaults to "pandas".
+
+        Returns:
+            pd.DataFrame: sampled rows
+        """
+        head = next(
+            data_utils.read_csv_chunks(
+                columns, self.head_rows, dtype=dtype, backend=backend, path=path
+            ),
+            pd.DataFrame(columns=columns),
+        )
+        if not path.endswith(".csv") or not self.sample_rows:
+            return head
+
+        size = os.path.getsize(path)
+        rows_per_stratum = max(self.sample_rows // self.strata, 1)
+        lines = []
+        with open(path, "rb") as file:
+            for stratum in range(self.strata):
+                file.seek(size * stratum // self.strata)
+                # skip a partial line (a header in the first stratum)
+                file.readline()
+                for _ in range(rows_per_stratum):
+                    line = file.readline()
+                    if not line:
+                        break
+                    lines.append(line if line.endswith(b"\n") else line + b"\n")
+        if not lines:
+            return head
+
+        sample = pd.read_csv(
+            io.BytesIO(b"".join(lines)), names=columns, header=None, dtype=dtype
+        )
+        return pd.concat([head, sample], ignore_index=True)
+
+    def check(self, sample: pd.DataFrame) -> QualityReport:
+        """Validates sampled rows
+
+        Args:
+            sample (pd.DataFrame): sampled rows
+
+        Returns:
+            QualityReport: number of sampled rows, share of rejected rows in total and per column
+        """
+        if sample.empty:
+            return QualityReport(0, 0.0, {})
+
+        _, error_ds = rule_engine.split(sample, self.rules)
+        column_error_rates = {}
+        for column in sample.columns:
+            rejected = error_ds["reason"].str.contains(
+                f"(?:^|; ){re.escape(column)}:"
+            )
+            column_error_rates[column] = rejected.sum() / sample.shape[0]
+        return QualityReport(
+            sample.shape[0], error_ds.shape[0] / sample.shape[0], column_error_rates
+        )
+
+    def failures(self, report: QualityReport) -> List[str]:
+        failures = []
+        if report.error_rate > self.max_error_rate:
+            failures.append(
+                f"{report.error_rate:.2%} of rows rejected (max {self.max_error_rate:.2%})"
+            )
+        for column, rate in report.column_error_rates.items():
+            if rate > self.max_column_error_rate:
+                failures.append(
+                    f"{rate:.2%} of rows rejected by '{column}' (max {self.max_column_error_rate:.2%})"
+                )
+        return failures
+
+    def run(
+        self,
+        path: str,
+        columns: List[str],
+        dtype: Optional[Dict[str, type]] = None,
+        backend: str = "pandas",
+        transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+    ) -> QualityReport:
+        """Samples and checks a file, aborts (or quarantines) a file failing thresholds
+
+        Args:
+            path (str): path to a file
+            columns (List[str]): column names to asign to a dataframe
+            dtype (Optional[Dict[str, type]], optional): column name -> type to read a column as.
+             Defaults to None.
+            backend (str, optional): reader backend (see DataUtils.read_csv_chunks). Defaults to "pandas".
+            transform (Optional[Callable[[pd.DataFrame], pd.DataFrame]], optional): maps sampled rows
+             to a layout rules are defined for (see sources.SourceAdapter.to_target). Defaults to None.
+
+        Raises:
+            DataQualityError: a file failed a gate
+
+        Returns:
+            QualityReport: report of a passed file
+        """
+        sample = self.sample(path, columns, dtype, backend)
+        report = self.check(transform(sample) if transform is not None else sample)
+        failures = self.failures(report)
+        if not failures:
+            logger.info(
+                f"'{path}' passed a data quality gate: {report.rows} rows sampled, "
+                f"{report.error_rate:.2%} rejected"
+            )
+            return report
+
+        message = f"'{path}' failed a data quality gate: {'; '.join(failures)}"
+        if self.action == "quarantine":
+            os.makedirs(self.quarantine_path, exist_ok=True)
+            quarantined = shutil.move(path, self.quarantine_path)
+            message += f". Quarantined to '{quarantined}'"
+        logger.error(message)
+        raise DataQualityError(message)
@@ -0,0 +1,190 @@
+import datetime
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+from sqlalchemy import Numeric, cast, func, select
+
+from crud import crud, customer_sketch, data_version, event
+from models import (
+    Event,
+    RatePlan,
+    ServiceType,
+    UsageSummary,
+    UsageSummaryCustomer,
+)
+from result_cache import ResultCache
+from setup import REPORT_CACHE_CHECK_INTERVAL, REPORT_CACHE_MAX_BYTES
+
+
+def _whole_months(start: datetime.date, end: datetime.date) -> bool:
+    return start.day == 1 and end.day == 1
+
+
+class UsageReport:
+    """Usage distribution and customer counts by service type and rate plan over a date range
+        [start, end). Ranges of whole months are answered from usage aggregates, other ranges
+        scan events. Results are cached until a load or a retention purge changes data
+
+    Attributes:
+        cache: result cache
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = REPORT_CACHE_MAX_BYTES,
+        check_interval: float = REPORT_CACHE_CHECK_INTERVAL,
+    ):
+        # a data version is bumped by every committed load chunk and purge step
+        self.cache = ResultCache(max_bytes, data_version.get, check_interval)
+
+    def _query(self, name: str, statement, *parameters) -> pd.DataFrame:
+        return self.cache.get_or_compute(
+            (name, *parameters), lambda: crud.execute_statement(statement)
+        )
+
+    def usage_distribution(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        service_types: Optional[List[str]] = None,
+        rate_plan_ids: Optional[List[int]] = None,
+        by_month: bool = False,
+    ) -> pd.DataFrame:
+        """Number of events, total and average duration and charge by service type and rate plan
+
+        Args:
+            start (datetime.date): first day of a range
+            end (datetime.date): day after the last day of a range
+            service_types (Optional[List[str]], optional): service types to report. Defaults to None (all).
+            rate_plan_ids (Optional[List[int]], optional): rate plans to report. Defaults to None (all).
+            by_month (bool, optional): also group by a month of an event start. Defaults to False.
+
+        Returns:
+            pd.DataFrame: DataFrame with 'service_type', 'rate_plan_id', ('month'), 'events',
+             'total_duration', 'total_charge', 'avg_duration' and 'avg_charge' columns
+        """
+        if _whole_months(start, end):
+            source = UsageSummary
+            month = UsageSummary.month
+            events = func.sum(UsageSummary.event_count)
+            total_duration = func.sum(UsageSummary.total_duration)
+            total_charge = func.sum(UsageSummary.total_charge)
+            conditions = [UsageSummary.month >= start, UsageSummary.month < end]
+        else:
+            source = Event
+            # derived from a start date by the database, a date as in aggregates
+            month = Event.month
+            events = func.count()
+            total_duration = func.coalesce(func.sum(Event.duration), 0)
+            # charges are stored as scaled integers (see EventCrud.charge_scale)
+            total_charge = cast(
+                func.coalesce(func.sum(Event.charge_micros), 0), Numeric
+            ) / 10 ** event.charge_scale
+            conditions = [Event.start_date >= start, Event.start_date < end]
+
+        groups = [ServiceType.service_type, RatePlan.rate_plan_id] + ([month] if by_month else [])
+        statement = self._filter(
+            select(
+                *groups,
+                events.label("events"),
+                total_duration.label("total_duration"),
+                total_charge.label("total_charge"),
+                # numeric, integer division would truncate averages
+                (cast(total_duration, Numeric) / events).label("avg_duration"),
+                (cast(total_charge, Numeric) / events).label("avg_charge"),
+            ),
+            source,
+            conditions,
+            service_types,
+            rate_plan_ids,
+        ).group_by(*groups).order_by(*groups)
+        return self._query(
+            "usage_distribution", statement, start, end, *self._key(service_types, rate_plan_ids), by_month
+        )
+
+    def customer_counts(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        service_types: Optional[List[str]] = None,
+        rate_plan_ids: Optional[List[int]] = None,
+    ) -> pd.DataFrame:
+        """Number of distinct customers by service type and rate plan
+
+        Args:
+            start (datetime.date): first day of a range
+            end (datetime.date): day after the last day of a range
+            service_types (Optional[List[str]], optional): service types to report. Defaults to None (all).
+            rate_plan_ids (Optional[List[int]], optional): rate plans to report. Defaults to None (all).
+
+        Returns:
+            pd.DataFrame: DataFrame with 'service_type', 'rate_plan_id' and 'customers' columns
+        """
+        if _whole_months(start, end):
+            # distinct over months, monthly counts of a customer active in several months can't be summed
+            source = UsageSummaryCustomer
+            customers = func.count(func.distinct(UsageSummaryCustomer.customer_fk))
+            conditions = [UsageSummaryCustomer.month >= start, UsageSummaryCustomer.month < end]
+        else:
+            source = Event
+            customers = func.count(func.distinct(Event.customer_fk))
+            conditions = [Event.start_date >= start, Event.start_date < end]
+
+        groups = [ServiceType.service_type, RatePlan.rate_plan_id]
+        statement = self._filter(
+            select(*groups, customers.label("customers")),
+            source,
+            conditions,
+            service_types,
+            rate_plan_ids,
+        ).group_by(*groups).order_by(*groups)
+        return self._query(
+            "customer_counts", statement, start, end, *self._key(service_types, rate_plan_ids)
+        )
+
+    def estimated_customer_counts(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        service_types: Optional[List[str]] = None,
+        rate_plan_ids: Optional[List[int]] = None,
+    ) -> pd.DataFrame:
+        """Estimated number of distinct customers by service type and rate plan, merged from daily
+            customer sketches (see CustomerSketchCrud for error bounds). Any range of days is
+            answered without scanning events
+
+        Args:
+            start (datetime.date): first day of a range
+            end (datetime.date): day after the last day of a range
+            service_types (Optional[List[str]], optional): service types to report. Defaults to None (all).
+            rate_plan_ids (Optional[List[int]], optional): rate plans to report. Defaults to None (all).
+
+        Returns:
+            pd.DataFrame: DataFrame with 'service_type', 'rate_plan_id' and 'customers' columns
+        """
+        return self.cache.get_or_compute(
+            ("estimated_customer_counts", start, end, *self._key(service_types, rate_plan_ids)),
+            lambda: customer_sketch.count_customers(start, end, service_types, rate_plan_ids),
+        )
+
+    def _filter(self, statement, source, conditions, service_types, rate_plan_ids):
+        statement = statement.select_from(source).join(
+            ServiceType, ServiceType.id == source.service_type_fk
+        ).join(RatePlan, RatePlan.id == source.rate_plan_fk)
+        if service_types:
+            conditions.append(ServiceType.service_type.in_(service_types))
+        if rate_plan_ids:
+            conditions.append(RatePlan.rate_plan_id.in_(rate_plan_ids))
+        return statement.where(*conditions)
+
+    def _key(self, service_types, rate_plan_ids) -> tuple:
+        return (
+            tuple(sorted(service_types or ())),
+            tuple(sorted(rate_plan_ids or ())),
+        )
+
+    def cache_stats(self) -> Dict[str, Union[int, float]]:
+        return self.cache.stats()
+
+
+usage_report = UsageReport()
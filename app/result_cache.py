@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import time
+from typing import Any, Callable, Dict, Hashable, Union
+
+import pandas as pd
+
+
+def result_size(value: Any) -> int:
+    """Approximate memory held by a cached result (bytes)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    return 1
+
+
+class ResultCache:
+    """Size-bounded LRU cache of query results. All results are dropped when a data version
+        changes (e.g. a load committed a chunk or a purge ran)
+
+    Attributes:
+        max_bytes: max total size of cached results, least recently used ones are evicted
+        version: returns a current data version
+        check_interval: seconds a checked data version is trusted for (0 - checked on every lookup)
+        hits: number of results served from the cache
+        misses: number of computed results
+        evictions: number of evicted results
+        invalidations: number of times the cache was cleared by a data version change
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        version: Callable[[], Hashable],
+        check_interval: float = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.version = version
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._results = OrderedDict()
+        self._size = 0
+        self._version = None
+        self._checked_at = None
+
+    def _check_version(self) -> None:
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = self.version()
+        if version != self._version:
+            if self._results:
+                self.invalidations += 1
+            self.clear()
+            self._version = version
+
+    def clear(self) -> None:
+        self._results.clear()
+        self._size = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Returns a cached result or computes (and caches) it
+
+        Args:
+            key (Hashable): query and its parameters
+            compute (Callable[[], Any]): computes a result
+
+        Returns:
+            Any: result
+        """
+        self._check_version()
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+
+        self.misses += 1
+        value = compute()
+        size = result_size(value)
+        if size <= self.max_bytes:
+            self._results[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._results.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+        return value
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Cache counters
+
+        Returns:
+            Dict[str, Union[int, float]]: entries, size, hits, misses,
+             evictions, invalidations and hit ratio
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._results),
+            "size_bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
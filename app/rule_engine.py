@@ -0,0 +1,134 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from data_utils import DATE_FORMAT, data_utils
+from instrumentation import metrics
+
+
+class RuleEngine:
+    """Validates a chunk in a single pass. Every rule is evaluated once against the original chunk
+        as a boolean mask, the chunk is split into valid and rejected rows at the end
+
+    Attributes:
+        rules: rule name -> check. A check takes a column and a column option (e.g. scale of
+         a currency column) and returns a mask of invalid values and (optionally) a converted column
+        reasons: rule name -> reason reported for rejected rows ('{option}' is replaced with
+         a column option)
+        default_options: rule name -> option used for columns declared without one
+    """
+
+    reasons = {
+        "not_null": "null value",
+        "integer": "not an integer",
+        "date": f"Date format is not: '{DATE_FORMAT}'",
+        "currency": "wrong currency format. Tip: should be a maximum {option} digits after a decimal point",
+        "currency_range": "absolute value should be below 2**63 / 10**{option}",
+        "range": "out of range {option}",
+    }
+    default_options = {"currency": 6, "currency_range": 6}
+
+    def __init__(self):
+        self.rules: Dict[
+            str, Callable[[pd.Series, Any], Tuple[pd.Series, Optional[pd.Series]]]
+        ] = {
+            "not_null": self._not_null,
+            "integer": self._integer,
+            "date": self._date,
+            "currency": self._currency,
+            "currency_range": self._currency_range,
+            "range": self._range,
+        }
+
+    def _not_null(
+        self, column: pd.Series, option: Any = None
+    ) -> Tuple[pd.Series, Optional[pd.Series]]:
+        return column.isna(), None
+
+    def _integer(
+        self, column: pd.Series, option: Any = None
+    ) -> Tuple[pd.Series, Optional[pd.Series]]:
+        converted = pd.to_numeric(column, errors="coerce")
+        invalid = column.notna() & (converted.isna() | (converted % 1 != 0))
+        return invalid, converted
+
+    def _date(
+        self, column: pd.Series, option: Any = None
+    ) -> Tuple[pd.Series, Optional[pd.Series]]:
+        # UTC, tz-naive (see DataUtils.parse_timestamps)
+        converted = data_utils.parse_timestamps(column)
+        return column.notna() & converted.isna(), converted
+
+    def _currency(
+        self, column: pd.Series, option: int
+    ) -> Tuple[pd.Series, Optional[pd.Series]]:
+        return column.notna() & ~data_utils.valid_currency_mask(column, option), None
+
+    def _currency_range(
+        self, column: pd.Series, option: int
+    ) -> Tuple[pd.Series, Optional[pd.Series]]:
+        # a currency is stored as an integer scaled by 10**option (see EventCrud.charge_scale)
+        return column.notna() & ~data_utils.scaled_integer_in_range(column, option), None
+
+    def _range(
+        self, column: pd.Series, option: Tuple[int, int]
+    ) -> Tuple[pd.Series, Optional[pd.Series]]:
+        # values that aren't numbers are reported by the 'integer' rule
+        converted = pd.to_numeric(column, errors="coerce")
+        return converted.notna() & ~converted.between(*option), None
+
+    def split(
+        self,
+        chunk: pd.DataFrame,
+        rules: Dict[str, Union[List[str], Dict[str, Any]]],
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Splits a chunk into valid (converted) data and rejected rows. Null values are only
+            reported by the 'not_null' rule, other rules check non null values
+
+        Args:
+            chunk (pd.DataFrame): dataframe to perform validation on
+            rules (Dict[str, Union[List[str], Dict[str, Any]]]): rule name -> names of columns to apply
+             a rule to (or column name -> column option, e.g. {"charge": 6} for currency scale or
+             {"billing_flag_1": (0, 1)} for a range)
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: a tuple with cleaned/converted data and rejected rows
+             with a 'reason' column listing every failed rule ("column: reason; ...")
+        """
+        rejected = np.zeros(len(chunk), dtype=bool)
+        reasons = np.full(len(chunk), "", dtype=object)
+        converted = {}
+        for rule, columns in rules.items():
+            check = self.rules[rule]
+            if not isinstance(columns, dict):
+                columns = dict.fromkeys(columns)
+            for column, option in columns.items():
+                if option is None:
+                    option = self.default_options.get(rule)
+                with metrics.timer("rule", f"{rule}:{column}", rows=len(chunk)):
+                    invalid, values = check(chunk[column], option)
+                invalid = invalid.to_numpy(dtype=bool)
+                if values is not None:
+                    converted[column] = values
+                if invalid.any():
+                    reason = self.reasons[rule].format(option=option)
+                    reasons[invalid] += f"{column}: {reason}; "
+                    rejected |= invalid
+
+        valid = ~rejected
+        data = {}
+        for column in chunk.columns:
+            values = converted.get(column, chunk[column])[valid]
+            if column in rules.get("integer", ()) and values.notna().all():
+                values = values.astype("int64")
+            data[column] = values
+        data = pd.DataFrame(data, index=chunk.index[valid])
+
+        error_ds = chunk[rejected].assign(
+            reason=pd.Series(reasons[rejected], dtype=object).str[:-2].to_numpy()
+        )
+        return data, error_ds
+
+
+rule_engine = RuleEngine()
@@ -26,4 +26,4 @@ class EventSchema(BaseModel):
 
     @classmethod
     def get_field_names(cls):
-        return list(cls.schema().get("properties").keys())
\ No newline at end of file
+        return list(cls.model_fields)
\ No newline at end of file
@@ -0,0 +1,250 @@
+from collections import defaultdict
+import logging
+import multiprocessing
+import queue
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from data_utils import data_utils
+from error_sink import ErrorSink
+from instrumentation import metrics
+from manifest import LoadManifest
+from rule_engine import rule_engine
+from setup import DATA_FILE, DEDUPLICATE_EVENTS, PIPELINE_QUEUE_SIZE, VALIDATION_RULES
+from unit_of_work import unit_of_work
+
+logger = logging.getLogger("__name__")
+
+
+class ShardLoadError(Exception):
+    """Raised when a shard worker fails to load a chunk (or exits unexpectedly)"""
+
+
+def split_shards(chunk: pd.DataFrame, shards: int) -> List[pd.DataFrame]:
+    """Splits rows of a chunk into shards by a customer id hash (row index is kept)"""
+    numbers = data_utils.shard_of(chunk["customer_id"], shards)
+    return [chunk[numbers == shard] for shard in range(shards)]
+
+
+def _load_shards(
+    shard: int,
+    rules: Dict[str, Union[List[str], Dict[str, Any]]],
+    job: str,
+    tasks: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+) -> None:
+    """Shard worker process: validates and loads shards of chunks, each in its own transaction"""
+    # imported in a worker process only, main imports this module
+    from main import dimension_caches, populate_db
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        index, chunk = task
+        try:
+            data, rejected = rule_engine.split(chunk, rules)
+            records_inserted = {}
+            with metrics.timer("chunk_transaction", rows=data.shape[0]), unit_of_work():
+                if not data.empty:
+                    records_inserted = dict(populate_db(data))
+        except Exception as error:
+            for cache in dimension_caches.values():
+                cache.rollback()
+            # exceptions of database drivers aren't always picklable
+            results.put(
+                (shard, index, ShardLoadError(f"shard {shard}, chunk {index}: {error!r}"), None)
+            )
+            break
+        for cache in dimension_caches.values():
+            cache.commit()
+        results.put((shard, index, records_inserted, rejected))
+    metrics.export(f"{job}_shard_{shard}")
+
+
+class ShardedLoader:
+    """Loads chunks with several worker processes (each with its own database connection and
+        dimension caches), rows are sharded by a customer id hash. Rows of a customer are always
+        loaded by one worker, so workers don't insert the same customers. Shared records
+        (services, plans, aggregates) are upserted with ON CONFLICT in key order, so concurrent
+        workers wait for each other instead of failing or deadlocking.
+
+        A coordinator (this process) merges per-worker row counts and rejected rows. A chunk is
+        recorded in a load manifest and its rejected rows are exported once all of its shards are
+        committed. Shards of a chunk commit separately, a resumed load repeats a partially
+        committed chunk, so event deduplication (DEDUPLICATE_EVENTS) must be on to skip its
+        already loaded events. A bulk load doesn't look loaded events up, it isn't sharded
+        (see sources.SourceConfig)
+
+    Attributes:
+        shards: number of worker processes
+        rules: validation rules (see rule_engine.RuleEngine.split)
+        queue_size: max number of shards waiting for a worker
+        job: job name of exported worker stage metrics
+        error_sink: sink of rejected rows
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        rules: Dict[str, Union[List[str], Dict[str, Any]]] = VALIDATION_RULES,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        job: str = "load",
+        error_sink: Optional[ErrorSink] = None,
+    ):
+        self.shards = shards
+        self.rules = rules
+        self.queue_size = queue_size
+        self.job = job
+        self.error_sink = error_sink or ErrorSink()
+        if not DEDUPLICATE_EVENTS:
+            logger.warning(
+                "sharded load without event deduplication: a resumed load may repeat events"
+            )
+
+    def _reset(
+        self, results: multiprocessing.Queue, manifest: Optional[LoadManifest], path: str
+    ) -> None:
+        """Starts a run: no chunks pending, the next chunk to commit is the first one"""
+        self._results = results
+        self._pending = {}
+        self._next_index = 0
+        self._manifest = manifest
+        self._path = path
+        self._totals = defaultdict(lambda: 0)
+        self._workers = []
+
+    def _check_workers(self) -> None:
+        for shard, worker in enumerate(self._workers):
+            if worker.exitcode is not None:
+                # an error a worker reported before exiting
+                self._collect()
+                raise ShardLoadError(
+                    f"shard worker {shard} exited with code {worker.exitcode}"
+                )
+
+    def _put(self, tasks: multiprocessing.Queue, item: Tuple[int, pd.DataFrame]) -> None:
+        while True:
+            try:
+                tasks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                self._collect()
+                self._check_workers()
+
+    def _submit(
+        self, index: int, chunk: pd.DataFrame, tasks: List[multiprocessing.Queue]
+    ) -> None:
+        """Queues non empty shards of a chunk, a chunk without rows is committed right away"""
+        shards = split_shards(chunk, self.shards)
+        self._pending[index] = {
+            "shards": sum(not shard.empty for shard in shards),
+            "rows": chunk.shape[0],
+            "inserted": defaultdict(lambda: 0),
+            "rejected": [],
+        }
+        for shard, data in enumerate(shards):
+            if not data.empty:
+                self._put(tasks[shard], (index, data))
+        self._commit_ready()
+
+    def _collect(self, timeout: float = 0) -> None:
+        """Merges results of loaded shards and commits chunks whose shards are all loaded"""
+        while True:
+            try:
+                shard, index, records_inserted, rejected = (
+                    self._results.get(timeout=timeout)
+                    if timeout
+                    else self._results.get_nowait()
+                )
+            except queue.Empty:
+                return
+            if isinstance(records_inserted, Exception):
+                raise records_inserted
+            chunk = self._pending[index]
+            chunk["shards"] -= 1
+            for key, value in records_inserted.items():
+                chunk["inserted"][key] += value
+            if not rejected.empty:
+                chunk["rejected"].append(rejected)
+            self._commit_ready()
+            timeout = 0
+
+    def _commit_ready(self) -> None:
+        # chunks are committed in read order, a manifest records a contiguous prefix
+        while (
+            self._next_index in self._pending
+            and not self._pending[self._next_index]["shards"]
+        ):
+            index = self._next_index
+            chunk = self._pending.pop(index)
+            if self._manifest is not None:
+                self._manifest.commit_chunk(chunk["rows"])
+            if chunk["rejected"]:
+                rejected = pd.concat(chunk["rejected"]).sort_index()
+                with metrics.timer("export_errors", rows=rejected.shape[0]):
+                    self.error_sink.write(rejected, self._path, index)
+                logger.warning(
+                    f"Validation errors found in chunk {index}. "
+                    f"Exported to a file: '{self.error_sink.path}'"
+                )
+            for key, value in chunk["inserted"].items():
+                logger.info(f"{value} records inserted into the '{key}' table")
+                self._totals[key] += value
+            self._next_index += 1
+
+    def run(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        manifest: Optional[LoadManifest] = None,
+        path: str = DATA_FILE,
+    ) -> Dict[str, int]:
+        """Validates and loads chunks
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): raw chunks (see sources.SourceAdapter.read_chunks)
+            manifest (Optional[LoadManifest], optional): load manifest to record committed chunks in.
+             Defaults to None.
+            path (str, optional): path to a loaded file (recorded with its rejected rows).
+             Defaults to DATA_FILE.
+
+        Raises:
+            ShardLoadError: a worker failed to load a shard
+
+        Returns:
+            Dict[str, int]: table name -> number of inserted records
+        """
+        context = multiprocessing.get_context("spawn")
+        tasks = [context.Queue(maxsize=self.queue_size) for _ in range(self.shards)]
+        self._reset(context.Queue(), manifest, path)
+        self._workers = [
+            context.Process(
+                target=_load_shards,
+                args=(shard, self.rules, self.job, tasks[shard], self._results),
+                daemon=True,
+            )
+            for shard in range(self.shards)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        try:
+            for index, chunk in enumerate(chunks):
+                self._submit(index, chunk, tasks)
+                self._collect()
+            while self._pending:
+                self._collect(timeout=0.1)
+                if self._pending:
+                    self._check_workers()
+        except BaseException:
+            # a worker killed mid-transaction is rolled back by the database
+            for worker in self._workers:
+                worker.terminate()
+            raise
+
+        for shard_tasks in tasks:
+            shard_tasks.put(None)
+        for worker in self._workers:
+            worker.join()
+        return dict(self._totals)
@@ -0,0 +1,203 @@
+import math
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """64-bit hashes of values (equal values get equal hashes in every chunk)"""
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Vectorized int.bit_length of uint64 values. Computed on 32-bit halves, float64 represents
+    them (and their log2) exactly enough"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        high_bits = np.where(high > 0, np.floor(np.log2(high)) + 33, 0)
+        low_bits = np.where(low > 0, np.floor(np.log2(low)) + 1, 0)
+    return np.where(high > 0, high_bits, low_bits).astype(np.int64)
+
+
+def register_ranks(hashes: np.ndarray, precision: int) -> Tuple[np.ndarray, np.ndarray]:
+    """HyperLogLog register of every hash and a rank (position of the first set bit) it records"""
+    hashes = hashes.astype(np.uint64, copy=False)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    rank = (64 - precision - _bit_length(rest) + 1).astype(np.uint8)
+    return index, rank
+
+
+def grouped_registers(
+    groups: np.ndarray, group_count: int, hashes: np.ndarray, precision: int
+) -> np.ndarray:
+    """HyperLogLog registers of many groups of values at once (one sketch per row)
+
+    Args:
+        groups (np.ndarray): group number (0 .. group_count - 1) of every hash
+        group_count (int): number of groups
+        hashes (np.ndarray): hashes of values (see hash_values)
+        precision (int): number of hash bits selecting a register
+
+    Returns:
+        np.ndarray: uint8 array of group_count x 2**precision registers
+    """
+    registers = np.zeros((group_count, 1 << precision), dtype=np.uint8)
+    if len(hashes):
+        index, rank = register_ranks(hashes, precision)
+        np.maximum.at(registers, (groups, index), rank)
+    return registers
+
+
+class HyperLogLog:
+    """Approximate distinct count in constant memory (2**precision one-byte registers),
+        relative error is about 1.04 / sqrt(2**precision). Sketches of chunks are merged
+        by a register-wise maximum
+
+    Attributes:
+        precision: number of hash bits selecting a register
+        registers: max rank seen per register
+    """
+
+    def __init__(self, precision: int = 14, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.registers = (
+            registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+        )
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if not len(hashes):
+            return
+        index, rank = register_ranks(hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+    def add(self, values: pd.Series) -> None:
+        self.add_hashes(hash_values(values))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> float:
+        size = self.registers.shape[0]
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size**2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * size and zeros:
+            # linear counting is more accurate for small cardinalities
+            return size * math.log(size / zeros)
+        return float(estimate)
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        registers = np.frombuffer(data, dtype=np.uint8).copy()
+        return cls(int(registers.shape[0]).bit_length() - 1, registers)
+
+
+class DDSketch:
+    """Mergeable quantile sketch with a relative accuracy guarantee. Values are counted in
+        logarithmic buckets, so memory depends on a range of values, not on their number
+
+    Attributes:
+        relative_accuracy: max relative error of a quantile
+        min_value: absolute values below it are counted as zeros
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-9):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.count = 0
+        self.zeros = 0
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+
+    def _add_keys(self, store: Dict[int, int], values: np.ndarray) -> None:
+        keys, counts = np.unique(
+            np.ceil(np.log(values) / math.log(self.gamma)).astype(np.int64),
+            return_counts=True,
+        )
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        self.count += values.shape[0]
+        zeros = np.abs(values) < self.min_value
+        self.zeros += int(np.count_nonzero(zeros))
+        self._add_keys(self.positive, values[~zeros & (values > 0)])
+        self._add_keys(self.negative, -values[~zeros & (values < 0)])
+
+    def merge(self, other: "DDSketch") -> None:
+        self.count += other.count
+        self.zeros += other.zeros
+        for store, other_store in (
+            (self.positive, other.positive),
+            (self.negative, other.negative),
+        ):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+
+class TopK:
+    """Approximate most frequent values. Counts of at most capacity values are kept, the least
+        frequent ones are dropped when a capacity is exceeded (exact for low cardinality columns)
+
+    Attributes:
+        k: number of reported values
+        capacity: number of tracked values
+        total: number of counted values
+    """
+
+    def __init__(self, k: int = 10, capacity: Optional[int] = None):
+        self.k = k
+        self.capacity = capacity or k * 10
+        self.total = 0
+        self.counts: Dict[Union[str, int], int] = {}
+
+    def add(self, values: pd.Series) -> None:
+        self.total += values.shape[0]
+        for value, count in values.value_counts().items():
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+        self._trim()
+
+    def merge(self, other: "TopK") -> None:
+        self.total += other.total
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self._trim()
+
+    def _trim(self) -> None:
+        if len(self.counts) > self.capacity:
+            self.counts = dict(self.top(self.capacity))
+
+    def top(self, k: Optional[int] = None) -> List[Tuple[Union[str, int], int]]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[
+            : k or self.k
+        ]
@@ -0,0 +1,259 @@
+from abc import ABC, abstractmethod
+import inspect
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
+
+import pandas as pd
+from pydantic import BaseModel, model_validator
+
+from data_utils import data_utils
+from setup import (
+    CHUNK_SIZE,
+    COLUMN_NAMES,
+    LOAD_SHARDS,
+    PIPELINE_WORKERS,
+    READER_BACKEND,
+    VALIDATION_RULES,
+)
+
+
+class SourceConfig(BaseModel):
+    """Declarative config of a usage data source (see SOURCES in setup.py)
+
+    Attributes:
+        name: unique source name (used in logs and metric job names)
+        path: location of a source dataset
+        format: adapter reading a source (see register_adapter)
+        backend: reader backend (see DataUtils.read_csv_chunks)
+        columns: source column names (in file order)
+        mapping: source column name -> target (COLUMN_NAMES) column name of renamed columns
+        defaults: target column name -> value of target columns a source doesn't have
+        rules: validation rules by target column names (see rule_engine.RuleEngine.split)
+        chunk_size: number of rows of the first chunk
+        pipeline_workers: number of validation worker processes (0 - serial load)
+        shards: number of sharded loader processes (see sharded_loader.ShardedLoader), replaces
+         pipeline workers (0 - no sharding)
+        bulk: load in bulk mode (see main.populate_db), set by backfill.py. A bulk load isn't
+         sharded: shards of a chunk commit separately and a resumed bulk load doesn't skip events
+         of already committed shards
+    """
+
+    name: str
+    path: str
+    format: str = "csv"
+    backend: str = READER_BACKEND
+    columns: List[str] = COLUMN_NAMES
+    mapping: Dict[str, str] = {}
+    defaults: Dict[str, str] = {}
+    rules: Dict[str, Union[List[str], Dict[str, Any]]] = VALIDATION_RULES
+    chunk_size: int = CHUNK_SIZE
+    pipeline_workers: int = PIPELINE_WORKERS
+    shards: int = LOAD_SHARDS
+    bulk: bool = False
+
+    @model_validator(mode="after")
+    def check_bulk(self) -> "SourceConfig":
+        if self.bulk and self.shards:
+            raise ValueError(f"source '{self.name}': a bulk load can't be sharded (shards=0)")
+        return self
+
+
+class SourceAdapter(ABC):
+    """Reads a source and maps it to the target layout (COLUMN_NAMES, read as text)
+
+    Attributes:
+        config: source config
+    """
+
+    def __init__(self, config: SourceConfig):
+        self.config = config
+        mapped = {config.mapping.get(column, column) for column in config.columns}
+        missing = [
+            column
+            for column in COLUMN_NAMES
+            if column not in mapped and column not in config.defaults
+        ]
+        if missing:
+            raise ValueError(
+                f"source '{config.name}' has no columns mapped to {missing} and no defaults for them"
+            )
+
+    @abstractmethod
+    def read(
+        self, chunksize: Union[int, Callable[[], int]], start_row: int = 0
+    ) -> Iterator[pd.DataFrame]:
+        """Reads source rows in chunks (source layout), indexed by a row number of a source"""
+
+    def to_target(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Renames source columns, adds defaults of missing ones and drops unmapped ones"""
+        chunk = chunk.rename(columns=self.config.mapping)
+        for column, value in self.config.defaults.items():
+            if column not in chunk.columns:
+                chunk[column] = value
+        return chunk[COLUMN_NAMES]
+
+    def read_chunks(
+        self, chunksize: Union[int, Callable[[], int]], start_row: int = 0
+    ) -> Iterator[pd.DataFrame]:
+        """Reads a source in chunks of the target layout
+
+        Args:
+            chunksize (Union[int, Callable[[], int]]): number of rows to read in one chunk, or
+             a callable returning a size of the next chunk
+            start_row (int, optional): number of data rows to skip (e.g. already loaded). Defaults to 0.
+
+        Yields:
+            Iterator[pd.DataFrame]: a dataframe with COLUMN_NAMES columns
+        """
+        for chunk in self.read(chunksize, start_row):
+            yield self.to_target(chunk)
+
+
+ADAPTERS: Dict[str, Type[SourceAdapter]] = {}
+
+
+def register_adapter(format: str) -> Callable[[Type[SourceAdapter]], Type[SourceAdapter]]:
+    """Registers an adapter class of a source format (class decorator)"""
+
+    def register(adapter: Type[SourceAdapter]) -> Type[SourceAdapter]:
+        if inspect.isabstract(adapter):
+            raise TypeError(
+                f"adapter '{adapter.__name__}' of a '{format}' format doesn't implement "
+                f"{sorted(adapter.__abstractmethods__)}"
+            )
+        ADAPTERS[format] = adapter
+        return adapter
+
+    return register
+
+
+@register_adapter("csv")
+class FileSource(SourceAdapter):
+    """Csv (optionally .gz/.zst compressed) or parquet file, see DataUtils.read_csv_chunks
+
+    Attributes:
+        backend: reader backend of a format (None - the one of a source config)
+    """
+
+    backend = None
+
+    def read(
+        self, chunksize: Union[int, Callable[[], int]], start_row: int = 0
+    ) -> Iterator[pd.DataFrame]:
+        # columns are read as text and converted by validation rules
+        yield from data_utils.read_csv_chunks(
+            self.config.columns,
+            chunksize,
+            dtype=dict.fromkeys(self.config.columns, str),
+            start_row=start_row,
+            backend=self.backend or self.config.backend,
+            path=self.config.path,
+        )
+
+
+@register_adapter("parquet")
+class ParquetSource(FileSource):
+    """Parquet file (read by the arrow reader backend only)"""
+
+    backend = "arrow"
+
+
+def create_adapter(config: SourceConfig) -> SourceAdapter:
+    """Creates an adapter of a source by its format
+
+    Args:
+        config (SourceConfig): source config
+
+    Raises:
+        ValueError: unknown source format or a source not covering the target layout
+
+    Returns:
+        SourceAdapter: source adapter
+    """
+    adapter = ADAPTERS.get(config.format)
+    if adapter is None:
+        raise ValueError(f"unknown source format: '{config.format}'")
+    return adapter(config)
+
+
+class IngestionBudget:
+    """Shared resource budget of sources ingested concurrently. A source takes one process
+        (plus its validation workers) and one database connection (two when pipelined,
+        a loader thread connects separately). A sharded source takes a process and a connection
+        per shard on top of its coordinator
+
+    Attributes:
+        workers: max number of processes
+        db_connections: max number of database connections
+    """
+
+    def __init__(self, workers: int, db_connections: int):
+        self.workers = workers
+        self.db_connections = db_connections
+        self._workers_used = 0
+        self._db_connections_used = 0
+
+    @staticmethod
+    def requirements(config: SourceConfig) -> Tuple[int, int]:
+        """Number of processes and of database connections a source takes"""
+        if config.shards:
+            return 1 + config.shards, 1 + config.shards
+        return 1 + config.pipeline_workers, 2 if config.pipeline_workers else 1
+
+    def check(self, config: SourceConfig) -> None:
+        workers, db_connections = self.requirements(config)
+        if workers > self.workers or db_connections > self.db_connections:
+            raise ValueError(
+                f"source '{config.name}' needs {workers} processes and {db_connections} database "
+                f"connections, budget is {self.workers} and {self.db_connections}"
+            )
+
+    def acquire(self, config: SourceConfig) -> bool:
+        """Reserves resources of a source if they're available
+
+        Args:
+            config (SourceConfig): source config
+
+        Returns:
+            bool: resources were reserved
+        """
+        workers, db_connections = self.requirements(config)
+        if (
+            self._workers_used + workers > self.workers
+            or self._db_connections_used + db_connections > self.db_connections
+        ):
+            return False
+        self._workers_used += workers
+        self._db_connections_used += db_connections
+        return True
+
+    def release(self, config: SourceConfig) -> None:
+        workers, db_connections = self.requirements(config)
+        self._workers_used -= workers
+        self._db_connections_used -= db_connections
+
+
+def load_sources(
+    configs: List[Dict[str, Any]], names: Optional[List[str]] = None
+) -> List[SourceConfig]:
+    """Parses source configs
+
+    Args:
+        configs (List[Dict[str, Any]]): source configs (see SOURCES in setup.py)
+        names (Optional[List[str]], optional): names of sources to keep. Defaults to None (all).
+
+    Raises:
+        ValueError: duplicate or unknown source names
+
+    Returns:
+        List[SourceConfig]: parsed source configs
+    """
+    sources = [SourceConfig(**config) for config in configs]
+    known = [source.name for source in sources]
+    if len(set(known)) < len(known):
+        raise ValueError(f"duplicate source names: {known}")
+    if names:
+        unknown = set(names) - set(known)
+        if unknown:
+            raise ValueError(f"unknown sources: {sorted(unknown)}")
+        sources = [source for source in sources if source.name in names]
+    return sources
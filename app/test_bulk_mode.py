@@ -0,0 +1,72 @@
+from contextlib import contextmanager, nullcontext
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+# models create a database engine, a driver is required (no database connection)
+bulk_mode = pytest.importorskip("bulk_mode", reason="requires a postgres driver")
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = mock.MagicMock()
+
+    @contextmanager
+    def pinned_connection():
+        yield connection
+
+    monkeypatch.setattr(bulk_mode, "pinned_connection", pinned_connection)
+    return connection
+
+
+def statements(connection):
+    return [str(call.args[0]) for call in connection.execute.call_args_list]
+
+
+def test_load_lock_shared_and_released(connection):
+    connection.execute.return_value.scalar.return_value = True
+    with bulk_mode.load_lock():
+        assert statements(connection) == ["SELECT pg_try_advisory_lock_shared(:key)"]
+    assert statements(connection)[1] == "SELECT pg_advisory_unlock_shared(:key)"
+
+
+def test_load_lock_conflict(connection):
+    connection.execute.return_value.scalar.return_value = False
+    with pytest.raises(bulk_mode.BulkModeError, match="a bulk load is running"):
+        with bulk_mode.load_lock():
+            pass
+    with pytest.raises(bulk_mode.BulkModeError, match="other loads are running"):
+        with bulk_mode.load_lock(exclusive=True):
+            pass
+    assert statements(connection) == [
+        "SELECT pg_try_advisory_lock_shared(:key)",
+        "SELECT pg_try_advisory_lock(:key)",
+    ]
+
+
+def test_DeferredIndexes_check_restored(monkeypatch):
+    get_deferred = mock.Mock(return_value=pd.DataFrame())
+    monkeypatch.setattr(bulk_mode.deferred_definition, "get_deferred", get_deferred)
+    bulk_mode.DeferredIndexes().check_restored()
+
+    get_deferred.return_value = pd.DataFrame({"name": ["ix_event_row_hash"], "kind": ["index"]})
+    with pytest.raises(bulk_mode.BulkModeError, match="--restore"):
+        bulk_mode.DeferredIndexes().check_restored()
+
+
+def test_DeferredIndexes_deferred_keeps_load_error(monkeypatch):
+    monkeypatch.setattr(bulk_mode, "load_lock", lambda exclusive: nullcontext())
+    indexes = bulk_mode.DeferredIndexes()
+    monkeypatch.setattr(indexes, "drop", mock.Mock(return_value=2))
+    monkeypatch.setattr(indexes, "restore", mock.Mock(side_effect=RuntimeError("restore")))
+
+    with pytest.raises(ValueError, match="load"):
+        with indexes.deferred():
+            raise ValueError("load")
+    indexes.restore.assert_called_once()
+
+    # without a load error, a restore error is raised
+    with pytest.raises(RuntimeError, match="restore"):
+        with indexes.deferred():
+            pass
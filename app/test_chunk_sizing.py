@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from chunk_sizing import AdaptiveChunkSizer
+
+
+def test_AdaptiveChunkSizer_fixed_without_limits():
+    sizer = AdaptiveChunkSizer(1000)
+    assert sizer.observe(1000, 10**9, 100.0) == 1000
+
+
+def test_AdaptiveChunkSizer_shrinks_to_memory_budget_and_time():
+    sizer = AdaptiveChunkSizer(
+        1000, min_size=10, max_size=10000, memory_budget=10**6, target_seconds=10
+    )
+    # 2 KB per row -> 500 rows fit a budget
+    assert sizer.observe(1000, 2 * 10**6, 1.0) == 500
+    # 0.04 s per row -> 250 rows in 10 s
+    assert sizer.observe(500, 10**5, 20.0) == 250
+    assert sizer.observe(250, 10**10, 1.0) == 10
+
+
+def test_AdaptiveChunkSizer_leaves_retained_memory_out_of_chunk_peak():
+    sizer = AdaptiveChunkSizer(1000, min_size=10, max_size=10000, memory_budget=10**6)
+    # 100 B per row and 0.6 MB retained -> 4000 rows fit the rest of a budget
+    assert sizer.observe(1000, 10**5, 1.0, retained_bytes=6 * 10**5) == 2000
+    assert sizer.observe(2000, 2 * 10**5, 1.0, retained_bytes=6 * 10**5) == 4000
+    # retained memory alone exceeds a budget
+    assert sizer.observe(4000, 4 * 10**5, 1.0, retained_bytes=2 * 10**6) == 10
+
+
+def test_AdaptiveChunkSizer_grows_gradually_within_bounds():
+    sizer = AdaptiveChunkSizer(1000, max_size=3000, target_seconds=10)
+    assert sizer.observe(1000, 0, 0.1) == 2000
+    assert sizer.observe(2000, 0, 0.1) == 3000
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/clear_refs"), reason="peak RSS is measured on Linux only"
+)
+def test_AdaptiveChunkSizer_measure():
+    sizer = AdaptiveChunkSizer(100, max_size=1000, memory_budget=10**9)
+    with sizer.measure(pd.DataFrame({"a": range(100)})):
+        [0] * 1000
+    assert sizer.next_size() == 200
+
+    sizer = AdaptiveChunkSizer(100, min_size=1, memory_budget=20 * 2**20)
+    with sizer.measure(pd.DataFrame({"a": range(100)})):
+        # 80 MiB resident while a chunk is processed, a quarter of it fits a budget
+        values = np.ones(10 * 2**20)
+        del values
+    assert 1 <= sizer.next_size() <= 25
+
+    # 80 MiB retained after a chunk: a small next chunk isn't charged for it
+    sizer = AdaptiveChunkSizer(100, max_size=1000, memory_budget=100 * 2**20)
+    retained = []
+    with sizer.measure(pd.DataFrame({"a": range(100)})):
+        retained.append(np.ones(10 * 2**20))
+    assert 100 <= sizer.next_size() <= 130
+    size = sizer.next_size()
+    with sizer.measure(pd.DataFrame({"a": range(size)})):
+        [0] * 1000
+    assert sizer.next_size() == 2 * size
@@ -0,0 +1,69 @@
+from typing import Optional
+
+import pandas as pd
+import pytest
+from pandas.api.types import is_datetime64_any_dtype, is_integer_dtype
+from pydantic import BaseModel, condecimal
+
+from columnar_schema import ColumnSpec, columnar_schema
+from schemas import CustomerSchema, EventSchema
+
+
+def get_data():
+    return {
+        "customer_fk": [1, "2"],
+        "start_date": [
+            "2016-01-22T05:34:48.000+02:00",
+            "2016-01-23T05:34:48.000+02:00",
+        ],
+        "service_type_fk": [1, 2],
+        "rate_plan_fk": [1.0, 2.0],
+        "billing_flag_1": [0, 1],
+        "billing_flag_2": [1, 0],
+        "duration": [32, 33],
+        "charge": [0.212325, 1.5],
+        "month": ["2016-01", "2016-01"],
+    }
+
+
+def test_ColumnarSchema_columns_derived_from_pydantic_model():
+    schema = columnar_schema(EventSchema)
+    assert schema.field_names == EventSchema.get_field_names()
+    assert ColumnSpec("charge", "decimal", False, 6) in schema.columns
+    assert ColumnSpec("month", "str") in schema.columns
+
+
+def test_ColumnarSchema_validate_converts_columns():
+    data = columnar_schema(EventSchema).validate(pd.DataFrame(get_data()))
+    assert is_integer_dtype(data["customer_fk"])
+    assert is_integer_dtype(data["rate_plan_fk"])
+    assert is_datetime64_any_dtype(data["start_date"])
+    # decimals are handed to loaders as integers scaled by 10**scale
+    assert data["charge"].dtype == "int64"
+    assert data["charge"].tolist() == [212325, 1500000]
+
+
+def test_ColumnarSchema_validate_scales_nullable_decimals():
+    class Payment(BaseModel):
+        amount: Optional[condecimal(decimal_places=2)]
+
+    data = columnar_schema(Payment).validate(pd.DataFrame({"amount": ["1.5", None, "-0.25"]}))
+    assert data["amount"].dtype == "Int64"
+    assert data["amount"].tolist() == [150, pd.NA, -25]
+
+
+def test_ColumnarSchema_validate_errors():
+    schema = columnar_schema(EventSchema)
+    for column, values in (
+        ("customer_fk", [1, 2.5]),
+        ("service_type_fk", [1, None]),
+        ("charge", [0.2123251, 1.5]),
+        ("start_date", ["2016-01-22T05:34:48.000+02:00", "k"]),
+    ):
+        data = get_data()
+        data[column] = values
+        with pytest.raises(ValueError, match=column):
+            schema.validate(pd.DataFrame(data))
+
+    with pytest.raises(ValueError, match="missing columns"):
+        columnar_schema(CustomerSchema).validate(pd.DataFrame({"id": [1]}))
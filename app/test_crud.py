@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+# models create a database engine, a driver is required (no database connection)
+crud_module = pytest.importorskip("crud", reason="requires a postgres driver")
+
+
+def get_data():
+    return pd.DataFrame(
+        {
+            "customer_id": [1, 2],
+            "created_at": pd.to_datetime(["2026-10-18 12:30:00", None]),
+            "last_seen_at": [datetime.datetime(2026, 10, 18, 12, 30, 5), None],
+        }
+    )
+
+
+def engine(dialect):
+    return SimpleNamespace(dialect=SimpleNamespace(name=dialect))
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = mock.MagicMock()
+
+    @contextmanager
+    def unit_of_work():
+        yield connection
+
+    monkeypatch.setattr(crud_module, "unit_of_work", unit_of_work)
+    return connection
+
+
+def test_Crud_bulk_load_copies_csv(connection, monkeypatch):
+    monkeypatch.setattr(crud_module, "engine", engine("postgresql"))
+    copied = []
+    cursor = connection.connection.cursor.return_value.__enter__.return_value
+    cursor.copy_expert.side_effect = lambda statement, buffer: copied.append(
+        (statement, buffer.read())
+    )
+
+    assert crud_module.customer.bulk_load(get_data()) == 2
+    statement, csv = copied[0]
+    assert statement == (
+        "COPY customer (customer_id, created_at, last_seen_at) FROM STDIN WITH (FORMAT csv)"
+    )
+    # nulls are empty unquoted fields (COPY csv NULL), datetimes are ISO text
+    assert csv.splitlines() == ["1,2026-10-18 12:30:00,2026-10-18 12:30:05", "2,,"]
+
+
+def test_Crud_bulk_load_inserts_on_other_backends(connection, monkeypatch):
+    monkeypatch.setattr(crud_module, "engine", engine("sqlite"))
+
+    assert crud_module.customer.bulk_load(get_data()) == 2
+    statement, records = connection.execute.call_args.args
+    assert statement.table.name == "customer"
+    assert [record["customer_id"] for record in records] == [1, 2]
+    connection.connection.cursor.assert_not_called()
+
+    assert crud_module.customer.bulk_load(get_data().iloc[:0]) == 0
+    assert connection.execute.call_count == 1
@@ -1,4 +1,7 @@
-from data_utils import data_utils
+import data_utils as data_utils_module
+from data_utils import DATE_FORMAT, data_utils
+import numpy as np
+import pytest
 import pandas as pd
 from pandas.api.types import is_object_dtype, is_integer_dtype, is_float_dtype
 
@@ -91,7 +94,7 @@ def test_DataUtils_validate_convert_date_columns_correct_format():
     ]
     df = pd.DataFrame(values)
     data, error_ds = data_utils.validate_convert_date_columns(df, ["event_start_time"])
-    df["event_start_time"] = pd.to_datetime(df["event_start_time"])
+    df["event_start_time"] = pd.to_datetime(["2016-01-22 03:34:48"] * 2).astype("datetime64[ns]")
     assert error_ds.empty
     assert data.equals(df)
 
@@ -119,8 +122,8 @@ def test_DataUtils_validate_convert_date_columns_one_record_correct_one_incorect
     data, error_ds = data_utils.validate_convert_date_columns(df, ["event_start_time"])
     data_to_compare_to = pd.DataFrame(df.iloc[:1])
     data_to_compare_to["event_start_time"] = pd.to_datetime(
-        data_to_compare_to["event_start_time"]
-    )
+        ["2016-01-22 03:34:48"]
+    ).astype("datetime64[ns]")
     errors_to_compare_to = df.iloc[1:]
     errors_to_compare_to["reason"] = "Date format is not: '%Y-%m-%dT%H:%M:%S.%f%z'"
     assert error_ds.equals(errors_to_compare_to)
@@ -159,3 +162,194 @@ def test_DataUtils_validate_currency_all_incorect():
     ] = "wrong currency format. Tip: should be a maximum 6 digits after a decimal point"
     assert data.empty
     assert error_ds.equals(errors_to_compare_to.sort_index())
+
+
+def test_DataUtils_valid_currency_mask_raw_text():
+    column = pd.Series(
+        ["0.212325", "1", "1.5000000", " -2.1 ", "0.2123251", "1e-7", "2.5e-5", "k", "inf"]
+    )
+    mask = data_utils.valid_currency_mask(column)
+    assert mask.tolist() == [True, True, True, True, False, False, True, False, False]
+    assert data_utils.valid_currency_mask(column, 0).tolist()[:3] == [False, True, False]
+
+
+def test_DataUtils_to_scaled_integer_exact():
+    column = pd.Series(["0.212325", "1", "-.5", "+12345678901.000001", "2.5e-5"])
+    scaled = data_utils.to_scaled_integer(column)
+    assert scaled.tolist() == [212325, 1000000, -500000, 12345678901000001, 25]
+    assert data_utils.format_scaled_integer(scaled).tolist() == [
+        "0.212325",
+        "1.000000",
+        "-0.500000",
+        "12345678901.000001",
+        "0.000025",
+    ]
+
+
+def test_DataUtils_scaled_integer_range():
+    column = pd.Series(["9223372036854.775807", "-9223372036854.775808", "99999999999999.5", "k"])
+    assert data_utils.scaled_integer_in_range(column).tolist() == [True, False, False, True]
+    assert data_utils.to_scaled_integer(column[:1]).tolist() == [2**63 - 1]
+    with pytest.raises(ValueError, match="64-bit"):
+        data_utils.to_scaled_integer(column[:3])
+
+
+def test_DataUtils_validate_currency_columns_per_column_scale():
+    df = pd.DataFrame({"charge": ["0.123", "0.1234"], "fee": ["1.12", "1.1"]})
+    data, error_ds = data_utils.validate_currency_columns(df, {"charge": 3, "fee": 2})
+    assert data.index.tolist() == [0]
+    assert error_ds.index.tolist() == [1]
+
+
+def test_DataUtils_file_fingerprint(tmp_path):
+    path = tmp_path / "usage.csv"
+    path.write_bytes(b"a,b\n1,2\n" * 1000)
+    fingerprint = data_utils.file_fingerprint(str(path), block_size=100)
+    assert fingerprint == data_utils.file_fingerprint(str(path))
+    path.write_bytes(b"a,b\n1,2\n" * 999 + b"a,b\n1,3\n")
+    assert fingerprint != data_utils.file_fingerprint(str(path))
+
+
+def test_DataUtils_hash_rows():
+    df = pd.DataFrame({"customer_id": [1, 2, 1], "charge": ["0.1", "0.1", "0.1"]})
+    hashes = data_utils.hash_rows(df)
+    assert hashes.dtype == "int64"
+    assert hashes[0] == hashes[2]
+    assert hashes[0] != hashes[1]
+
+
+def write_usage_csv(path):
+    path.write_text(
+        "customer_id,charge\n" + "".join(f"{i},0.{i}\n" for i in range(10)) + "x,\n"
+    )
+
+
+def test_DataUtils_read_csv_chunks_start_row(tmp_path):
+    path = tmp_path / "usage.csv"
+    write_usage_csv(path)
+    chunks = list(
+        data_utils.read_csv_chunks(
+            ["customer_id", "charge"],
+            chunksize=4,
+            dtype={"customer_id": str, "charge": str},
+            start_row=3,
+            path=str(path),
+        )
+    )
+    assert [len(chunk) for chunk in chunks] == [4, 4]
+    assert list(chunks[0].index) == [3, 4, 5, 6]
+    assert chunks[0]["customer_id"].tolist() == ["3", "4", "5", "6"]
+    assert chunks[1]["charge"].isna().tolist() == [False, False, False, True]
+
+
+def test_DataUtils_read_csv_chunks_start_row_skipped_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_utils_module, "SKIP_CHUNK_SIZE", 2)
+    path = tmp_path / "usage.csv"
+    write_usage_csv(path)
+    kwargs = {
+        "columns": ["customer_id", "charge"],
+        "dtype": {"customer_id": str, "charge": str},
+        "path": str(path),
+    }
+    chunks = list(data_utils.read_csv_chunks(chunksize=3, start_row=7, **kwargs))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert list(chunks[0].index) == [7, 8, 9]
+    assert chunks[0]["customer_id"].tolist()[0] == "7"
+    assert list(data_utils.read_csv_chunks(chunksize=3, start_row=20, **kwargs)) == []
+
+
+def test_DataUtils_read_csv_chunks_arrow_matches_pandas(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "usage.csv"
+    write_usage_csv(path)
+    kwargs = {
+        "columns": ["customer_id", "charge"],
+        "chunksize": 4,
+        "dtype": {"customer_id": str, "charge": str},
+        "start_row": 1,
+        "path": str(path),
+    }
+    expected = pd.concat(data_utils.read_csv_chunks(**kwargs))
+    chunks = list(data_utils.read_csv_chunks(backend="arrow", **kwargs))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    result = pd.concat(chunks)
+    assert list(result.index) == list(expected.index)
+    assert result["customer_id"].tolist() == expected["customer_id"].tolist()
+    assert result["charge"].isna().tolist() == expected["charge"].isna().tolist()
+
+
+def test_DataUtils_read_csv_chunks_variable_size(tmp_path):
+    path = tmp_path / "usage.csv"
+    write_usage_csv(path)
+    sizes = [2]
+
+    lengths = []
+    for chunk in data_utils.read_csv_chunks(
+        ["customer_id", "charge"], chunksize=lambda: sizes[-1], path=str(path)
+    ):
+        lengths.append(len(chunk))
+        sizes.append(5)
+    assert lengths == [2, 5, 4]
+
+
+def test_DataUtils_validate_convert_integer_columns_errors_in_several_columns():
+    df = pd.DataFrame({"a": ["1", "x", "3", "4"], "b": ["1", "2", "y", "4"]})
+    data, errors = data_utils.validate_convert_integer_columns(df, ["a", "b"])
+    assert data.index.tolist() == [0, 3]
+    assert sorted(errors.index.tolist()) == [1, 2]
+    assert errors.loc[2, "b"] == "y"
+
+
+def test_shard_of_hashes_integer_keys():
+    keys = pd.Series([str(value) for value in range(1000)] + ["042", "42", "x", None])
+    shards = data_utils.shard_of(keys, 4)
+    assert set(shards.tolist()) == {0, 1, 2, 3}
+    assert shards[1000] == shards[1001] == shards[42]
+    assert shards[1002] == shards[1003] == 0
+    # a shard of a key doesn't depend on a chunk it is in
+    assert data_utils.shard_of(keys.iloc[40:50], 4).tolist() == shards[40:50].tolist()
+
+
+def test_parse_timestamps_converts_to_utc():
+    values = pd.Series(
+        [
+            "2016-02-29T23:59:59.123456-05:30",
+            "2016-01-22T05:34:48.5Z",
+            "2016-01-22T05:34:48.000+0200",
+            "2016-1-2T05:34:48.000+02:00",
+            "2015-02-29T00:00:00.000+00:00",
+            "2016-01-22 05:34:48.000+02:00",
+            None,
+            "2016-02-29T23:59:59.123456-05:30",
+        ],
+        index=range(10, 18),
+    )
+    parsed = data_utils.parse_timestamps(values)
+    assert parsed.index.tolist() == values.index.tolist()
+    assert str(parsed.dtype) == "datetime64[ns]"
+    assert parsed.tolist()[:4] == [
+        pd.Timestamp("2016-03-01 05:29:59.123456"),
+        pd.Timestamp("2016-01-22 05:34:48.5"),
+        pd.Timestamp("2016-01-22 03:34:48"),
+        # not of the fixed layout, parsed by pandas
+        pd.Timestamp("2016-01-02 03:34:48"),
+    ]
+    assert parsed.iloc[4:7].isna().all()
+    assert parsed.iloc[7] == parsed.iloc[0]
+
+
+def test_parse_timestamps_matches_pandas():
+    rng = np.random.default_rng(0)
+    times = pd.Timestamp("1990-01-01") + pd.to_timedelta(
+        rng.integers(0, 40 * 365 * 86400 * 10**6, 2000), unit="us"
+    )
+    offsets = rng.integers(-14 * 60, 14 * 60, 2000)
+    values = pd.Series(
+        [
+            time.strftime("%Y-%m-%dT%H:%M:%S.") + f"{time.microsecond:06d}"[: 1 + index % 6]
+            + ("-" if offset < 0 else "+") + f"{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+            for index, (time, offset) in enumerate(zip(times, offsets))
+        ]
+    )
+    expected = pd.to_datetime(values, format=DATE_FORMAT, utc=True).dt.tz_localize(None)
+    assert (data_utils.parse_timestamps(values).to_numpy() == expected.to_numpy()).all()
@@ -0,0 +1,79 @@
+import pandas as pd
+
+from dimension_cache import DimensionCache
+
+
+class FakeCrud:
+    natural_key = "customer_id"
+
+    def __init__(self, existing):
+        self.rows = dict(existing)
+        self.lookups = 0
+
+    def get_all(self):
+        return pd.DataFrame(
+            {"id": list(self.rows.values()), "customer_id": list(self.rows.keys())}
+        )
+
+    def get_ids(self, values):
+        self.lookups += 1
+        found = {value: self.rows[value] for value in values if value in self.rows}
+        return pd.DataFrame({"id": list(found.values()), "customer_id": list(found)})
+
+    def insert_missing(self, values):
+        inserted = {}
+        for value in values:
+            if value not in self.rows:
+                self.rows[value] = inserted[value] = len(self.rows) + 1
+        return pd.DataFrame(
+            {"id": list(inserted.values()), "customer_id": list(inserted)}
+        )
+
+
+def test_DimensionCache_resolve_unbounded():
+    crud = FakeCrud({10: 1, 20: 2})
+    cache = DimensionCache(crud)
+
+    mappings, inserted = cache.resolve([10, 20, 30, 30])
+    assert mappings == {10: 1, 20: 2, 30: 3}
+    assert inserted == 1
+    assert crud.lookups == 0
+
+    mappings, inserted = cache.resolve([30, 10])
+    assert mappings == {30: 3, 10: 1}
+    assert inserted == 0
+    assert cache.stats()["hits"] == 4
+    assert cache.stats()["misses"] == 1
+
+
+def test_DimensionCache_resolve_bounded_evicts_and_falls_back():
+    crud = FakeCrud({10: 1, 20: 2, 30: 3})
+    cache = DimensionCache(crud, max_size=2)
+
+    mappings, inserted = cache.resolve([10, 20, 30])
+    assert mappings == {10: 1, 20: 2, 30: 3}
+    assert inserted == 0
+    assert cache.stats()["size"] == 2
+    assert cache.stats()["evictions"] == 1
+
+    mappings, inserted = cache.resolve([10, 40])
+    assert mappings == {10: 1, 40: 4}
+    assert inserted == 1
+    assert crud.lookups == 2
+
+
+def test_DimensionCache_rollback_discards_pending_inserts():
+    crud = FakeCrud({10: 1})
+    cache = DimensionCache(crud)
+
+    cache.resolve([10, 20])
+    cache.commit()
+    cache.resolve([30])
+    cache.rollback()
+    assert cache.stats()["size"] == 2
+
+    # a rolled back record is not in the database anymore, it is inserted again
+    del crud.rows[30]
+    mappings, inserted = cache.resolve([20, 30])
+    assert mappings == {20: 2, 30: 3}
+    assert inserted == 1
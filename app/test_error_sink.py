@@ -0,0 +1,20 @@
+import pandas as pd
+
+from error_sink import ErrorSink
+
+
+def test_ErrorSink_write_appends(tmp_path):
+    sink = ErrorSink(str(tmp_path / "errors.csv.gz"))
+    rejected = pd.DataFrame(
+        {"customer_id": ["x", "1"], "reason": ["customer_id: not an integer", "null value"]},
+        index=[3, 7],
+    )
+    assert sink.write(rejected, "usage.csv", 0) == 2
+    assert sink.write(rejected.iloc[:0], "usage.csv", 1) == 0
+    assert sink.write(rejected.iloc[:1], "usage.csv", 2) == 1
+
+    errors = pd.read_csv(sink.path, dtype=str)
+    assert list(errors.columns) == ["file", "chunk", "row", "reason", "customer_id"]
+    assert errors["chunk"].tolist() == ["0", "0", "2"]
+    assert errors["row"].tolist() == ["3", "7", "3"]
+    assert errors["customer_id"].tolist() == ["x", "1", "x"]
@@ -0,0 +1,22 @@
+import datetime
+
+import numpy as np
+
+from generate_data import generate_chunk
+from rule_engine import rule_engine
+from setup import COLUMN_NAMES, VALIDATION_RULES
+
+
+def test_generate_chunk_injects_errors_per_rule():
+    rng = np.random.default_rng(1)
+    week_start = datetime.datetime(2026, 10, 5)
+    clean = generate_chunk(rng, 2000, 100, 5, week_start, {})
+    assert list(clean.columns) == COLUMN_NAMES
+    data, errors = rule_engine.split(clean, VALIDATION_RULES)
+    assert errors.empty
+    assert data["customer_id"].between(1, 100).all()
+
+    for rule in ("not_null", "integer", "date", "currency"):
+        chunk = generate_chunk(rng, 2000, 100, 5, week_start, {rule: 0.1})
+        _, errors = rule_engine.split(chunk, VALIDATION_RULES)
+        assert 0.05 < errors.shape[0] / 2000 < 0.15
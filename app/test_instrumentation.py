@@ -0,0 +1,39 @@
+import json
+import logging
+
+import pandas as pd
+
+from instrumentation import StageMetrics
+
+
+def test_StageMetrics_timer_and_iterate():
+    metrics = StageMetrics(textfile_dir=None)
+    with metrics.timer("bulk_load", "event", rows=10) as counts:
+        counts["bytes"] = 100
+    with metrics.timer("bulk_load", "event", rows=5):
+        pass
+    chunks = [pd.DataFrame({"a": range(3)}), pd.DataFrame({"a": range(2)})]
+    assert len(list(metrics.iterate("read_csv_chunks", chunks))) == 2
+
+    stats = metrics.stages[("bulk_load", "event")]
+    assert (stats["calls"], stats["rows"], stats["bytes"]) == (2, 15, 100)
+    assert stats["seconds"] >= stats["max_seconds"] >= 0
+    assert metrics.stages[("read_csv_chunks", "")]["rows"] == 5
+    assert metrics.stages[("read_csv_chunks", "")]["bytes"] == 40
+
+
+def test_StageMetrics_export(tmp_path, caplog):
+    metrics = StageMetrics(textfile_dir=str(tmp_path))
+    metrics.record("rule", "integer:customer_id", seconds=0.5, rows=100)
+    with caplog.at_level(logging.INFO):
+        metrics.export("load")
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["job"] == "load"
+    assert line["rows"] == 100
+    textfile = (tmp_path / "etl_load.prom").read_text()
+    assert (
+        'etl_stage_seconds_total{job="load",stage="rule",detail="integer:customer_id"} 0.5'
+        in textfile
+    )
+    assert "etl_last_run_timestamp_seconds" in textfile
@@ -0,0 +1,114 @@
+import datetime
+from unittest import mock
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+# models create a database engine, a driver is required (no database connection)
+partitions = pytest.importorskip("partitions", reason="requires a postgres driver")
+
+from partitions import MonthlyPartitions, Partition, add_months, expired_partitions
+
+
+def get_partitions(*months):
+    return [Partition(f"event_{month:%Y_%m}", month, 10) for month in months]
+
+
+def test_add_months():
+    assert add_months(datetime.date(2026, 11, 1), 1) == datetime.date(2026, 12, 1)
+    assert add_months(datetime.date(2026, 12, 1), 1) == datetime.date(2027, 1, 1)
+    assert add_months(datetime.date(2026, 1, 1), -1) == datetime.date(2025, 12, 1)
+    assert add_months(datetime.date(2026, 3, 1), 25) == datetime.date(2028, 4, 1)
+
+
+def test_MonthlyPartitions_names():
+    event_partitions = MonthlyPartitions("event")
+    assert event_partitions.partition_name(datetime.date(2026, 4, 1)) == "event_2026_04"
+    parsed = event_partitions.parse_partitions(
+        [
+            ("event_2026_05", 20.0, False),
+            ("event_2026_04", -1.0, True),
+            # a default partition, other tables and months out of range aren't monthly partitions
+            ("event_default", 5.0, False),
+            ("event_2026_4", 5.0, False),
+            ("event_2026_13", 5.0, False),
+            ("event_2026_05_old", 5.0, False),
+            ("usage_event_2026_05", 5.0, False),
+        ]
+    )
+    assert parsed == [
+        Partition("event_2026_04", datetime.date(2026, 4, 1), 0, True),
+        Partition("event_2026_05", datetime.date(2026, 5, 1), 20, False),
+    ]
+
+
+def test_expired_partitions_boundary_month():
+    months = [datetime.date(2026, month, 1) for month in (5, 3, 4, 6)]
+    # April ends on May 1st, a cutoff day: only rows before the cutoff are in it
+    expired = expired_partitions(get_partitions(*months), datetime.datetime(2026, 5, 1))
+    assert [partition.name for partition in expired] == ["event_2026_03", "event_2026_04"]
+    expired = expired_partitions(get_partitions(*months), datetime.datetime(2026, 5, 1, 23, 59))
+    assert [partition.name for partition in expired] == ["event_2026_03", "event_2026_04"]
+    # a month of a cutoff holds rows created after it
+    expired = expired_partitions(get_partitions(*months), datetime.datetime(2026, 4, 30, 23, 59))
+    assert [partition.name for partition in expired] == ["event_2026_03"]
+    assert expired_partitions(get_partitions(*months), datetime.datetime(2026, 3, 15)) == []
+
+
+def test_MonthlyPartitions_drop_expired_detaches_concurrently(monkeypatch):
+    event_partitions = MonthlyPartitions("event")
+    listed = [
+        Partition("event_2026_03", datetime.date(2026, 3, 1), 10, True),
+        Partition("event_2026_04", datetime.date(2026, 4, 1), 10),
+        Partition("event_2026_05", datetime.date(2026, 5, 1), 10),
+    ]
+    monkeypatch.setattr(event_partitions, "list_partitions", lambda: listed)
+    engine = mock.MagicMock()
+    engine.dialect.server_version_info = (14, 5)
+    monkeypatch.setattr(partitions, "engine", engine)
+    connection = mock.MagicMock()
+    monkeypatch.setattr(partitions, "unit_of_work", mock.MagicMock())
+    partitions.unit_of_work.return_value.__enter__.return_value = connection
+
+    dropped = event_partitions.drop_expired(datetime.datetime(2026, 5, 1, 12))
+    assert dropped == listed[:2]
+    engine.execution_options.assert_called_with(isolation_level="AUTOCOMMIT")
+    detached = engine.execution_options.return_value.connect.return_value.__enter__.return_value
+    assert [str(call.args[0]) for call in detached.execute.call_args_list] == [
+        # an interrupted concurrent detach is finished
+        "ALTER TABLE event DETACH PARTITION event_2026_03 FINALIZE",
+        "ALTER TABLE event DETACH PARTITION event_2026_04 CONCURRENTLY",
+    ]
+    assert [str(call.args[0]) for call in connection.execute.call_args_list] == [
+        "DROP TABLE event_2026_03",
+        "DROP TABLE event_2026_04",
+    ]
+
+
+def test_MonthlyPartitions_drop_expired_stops_at_lock_timeout(monkeypatch):
+    event_partitions = MonthlyPartitions("event")
+    listed = get_partitions(datetime.date(2026, 3, 1), datetime.date(2026, 4, 1))
+    monkeypatch.setattr(event_partitions, "list_partitions", lambda: listed)
+    engine = mock.MagicMock()
+    engine.dialect.server_version_info = (13, 3)
+    monkeypatch.setattr(partitions, "engine", engine)
+    statements = []
+
+    def execute(statement, parameters=None):
+        statements.append(str(statement))
+        if "event_2026_04" in str(statement):
+            raise OperationalError(str(statement), parameters, Exception("lock timeout"))
+
+    monkeypatch.setattr(partitions, "unit_of_work", mock.MagicMock())
+    partitions.unit_of_work.return_value.__enter__.return_value.execute.side_effect = execute
+
+    # postgres 13 detaches under a lock waited for briefly, a busy table is row-deleted instead
+    assert event_partitions.drop_expired(datetime.datetime(2026, 6, 1)) == listed[:1]
+    assert statements == [
+        "SELECT set_config('lock_timeout', :timeout, true)",
+        "ALTER TABLE event DETACH PARTITION event_2026_03",
+        "DROP TABLE event_2026_03",
+        "SELECT set_config('lock_timeout', :timeout, true)",
+        "ALTER TABLE event DETACH PARTITION event_2026_04",
+    ]
+    engine.execution_options.assert_not_called()
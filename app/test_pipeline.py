@@ -0,0 +1,49 @@
+import sys
+
+import pandas as pd
+import pytest
+
+from pipeline import Pipeline
+
+# state of a parent process, a forked worker would inherit a changed one
+STATE = "imported"
+
+
+def validate(chunk):
+    return chunk[chunk["value"] >= 0], chunk[chunk["value"] < 0]
+
+
+def test_Pipeline_run_loads_chunks_in_order():
+    chunks = [pd.DataFrame({"value": [i, -i - 1]}) for i in range(10)]
+    loaded = []
+    Pipeline(
+        validate,
+        lambda index, data, error_ds: loaded.append(
+            (index, data["value"].tolist(), error_ds["value"].tolist())
+        ),
+        workers=3,
+        queue_size=1,
+    ).run(chunks)
+    assert loaded == [(i, [i], [-i - 1]) for i in range(10)]
+
+
+def validate_state(chunk):
+    return chunk.assign(state=STATE), chunk.iloc[:0]
+
+
+def test_Pipeline_run_spawns_workers(monkeypatch):
+    monkeypatch.setattr(sys.modules[__name__], "STATE", "changed")
+    loaded = []
+    Pipeline(
+        validate_state, lambda index, data, error_ds: loaded.extend(data["state"]), workers=1
+    ).run([pd.DataFrame({"value": [1]})])
+    assert loaded == ["imported"]
+
+
+def test_Pipeline_run_raises_loader_error():
+    def load(index, data, error_ds):
+        raise RuntimeError("db is down")
+
+    chunks = [pd.DataFrame({"value": [i]}) for i in range(10)]
+    with pytest.raises(RuntimeError, match="db is down"):
+        Pipeline(validate, load, workers=2, queue_size=1).run(chunks)
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from profiling import DatasetProfile, detect_drift
+
+
+def get_chunk():
+    return pd.DataFrame(
+        {
+            "customer_id": ["1", "2", "3", None],
+            "rate_plan_id": ["10", "10", "20", "20"],
+            "charge": ["0.5", "1.5", "x", "2.5"],
+        }
+    )
+
+
+def get_profile():
+    profile = DatasetProfile(
+        ["customer_id", "rate_plan_id", "charge"],
+        quantile_columns=["charge"],
+        top_k_columns=["rate_plan_id"],
+        top_k=5,
+    )
+    for _ in profile.observe([get_chunk(), get_chunk()]):
+        pass
+    return profile
+
+
+def test_DatasetProfile_metrics():
+    metrics = get_profile().metrics().set_index(["column_name", "metric"])["value"]
+    assert metrics[("*", "rows")] == 8
+    assert abs(metrics[("*", "duplicate_rate")] - 0.5) < 0.01
+    assert metrics[("customer_id", "null_rate")] == 0.25
+    assert round(metrics[("customer_id", "distinct")]) == 3
+    assert metrics[("charge", "min")] == 0.5
+    assert metrics[("charge", "max")] == 2.5
+    assert abs(metrics[("charge", "p50")] - 1.5) < 0.02
+    assert metrics[("rate_plan_id", "share:10")] == 0.5
+
+
+def test_detect_drift():
+    current = get_profile().metrics()
+    previous = pd.concat(
+        [current.assign(file_fk=1), current.assign(file_fk=2)], ignore_index=True
+    )
+    assert detect_drift(current, previous) == []
+    assert detect_drift(current, previous.iloc[:0]) == []
+
+    # a rate plan disappears, null rate grows
+    drifted = current[current["metric"] != "share:20"].copy()
+    drifted.loc[drifted["metric"] == "null_rate", "value"] += 0.1
+    alerts = detect_drift(drifted, previous)
+    assert any("share:20" in alert for alert in alerts)
+    assert any("'customer_id' null_rate" in alert for alert in alerts)
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from quality_gate import DataQualityError, QualityGate
+
+COLUMNS = ["customer_id", "charge"]
+RULES = {"not_null": COLUMNS, "integer": ["customer_id"], "currency": {"charge": 6}}
+
+
+def write_csv(path, bad_from):
+    rows = [f"{'x' if i >= bad_from else i},{i}.5\n" for i in range(1000)]
+    path.write_text("customer_id,charge\n" + "".join(rows))
+
+
+def get_gate(**kwargs):
+    options = {
+        "head_rows": 50,
+        "sample_rows": 100,
+        "strata": 10,
+        "max_error_rate": 0.05,
+        "max_column_error_rate": 0.05,
+        "rules": RULES,
+    }
+    options.update(kwargs)
+    return QualityGate(**options)
+
+
+def test_QualityGate_sample_covers_whole_file(tmp_path):
+    path = tmp_path / "usage.csv"
+    write_csv(path, bad_from=1000)
+    sample = get_gate().sample(str(path), COLUMNS, dtype=dict.fromkeys(COLUMNS, str))
+    assert sample.shape[0] == 150
+    assert sample["customer_id"].astype(int).max() > 900
+
+
+def test_QualityGate_run_passes_clean_file(tmp_path):
+    path = tmp_path / "usage.csv"
+    write_csv(path, bad_from=1000)
+    report = get_gate().run(str(path), COLUMNS, dtype=dict.fromkeys(COLUMNS, str))
+    assert report.error_rate == 0
+
+
+def test_QualityGate_run_detects_errors_past_head(tmp_path):
+    path = tmp_path / "usage.csv"
+    write_csv(path, bad_from=500)
+    gate = get_gate(action="quarantine", quarantine_path=str(tmp_path / "quarantine"))
+    with pytest.raises(DataQualityError, match="'customer_id'"):
+        gate.run(str(path), COLUMNS, dtype=dict.fromkeys(COLUMNS, str))
+    assert not path.exists()
+    assert (tmp_path / "quarantine" / "usage.csv").exists()
+
+
+def test_QualityGate_check_column_error_rates():
+    sample = pd.DataFrame({"customer_id": ["1", "x", "2", "3"], "charge": ["1", "2", None, "3"]})
+    report = get_gate().check(sample)
+    assert report.error_rate == 0.5
+    assert report.column_error_rates == {"customer_id": 0.25, "charge": 0.25}
@@ -0,0 +1,88 @@
+import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.dialects import postgresql
+
+# models create a database engine, a driver is required (no database connection)
+reporting = pytest.importorskip("reporting", reason="requires a postgres driver")
+
+from models import DataVersion, LoadChunk
+from result_cache import ResultCache
+import unit_of_work
+
+
+@pytest.fixture
+def report(monkeypatch):
+    statements = []
+
+    def execute_statement(statement, data=None):
+        statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return pd.DataFrame({"events": [len(statements)]})
+
+    monkeypatch.setattr(reporting.crud, "execute_statement", execute_statement)
+    report = reporting.UsageReport()
+    report.cache = ResultCache(2**20, lambda: None)
+    report.statements = statements
+    return report
+
+
+def test_UsageReport_usage_distribution_sources(report):
+    report.usage_distribution(datetime.date(2026, 1, 1), datetime.date(2026, 3, 1), by_month=True)
+    report.usage_distribution(datetime.date(2026, 1, 5), datetime.date(2026, 3, 1), by_month=True)
+    summary, events = report.statements
+
+    assert "FROM usage_summary" in summary
+    assert "usage_summary.month" in summary
+    assert "FROM event" in events
+    # months of both paths are dates: a generated column, not date_trunc of a start
+    assert "event.month" in events
+    assert "date_trunc" not in events
+    assert "sum(event.charge_micros)" in events
+
+
+def test_UsageReport_cache_keys(report):
+    start, end = datetime.date(2026, 1, 1), datetime.date(2026, 2, 1)
+    report.usage_distribution(start, end, ["SMS", "DATA"], [2, 1])
+    report.usage_distribution(start, end, ["DATA", "SMS"], [1, 2])
+    assert len(report.statements) == 1
+    assert "service.service_type IN" in report.statements[0]
+
+    report.usage_distribution(start, end, ["DATA", "SMS"], [1, 2], by_month=True)
+    report.usage_distribution(start, end, ["DATA"], [1, 2])
+    report.customer_counts(start, end, ["DATA", "SMS"], [1, 2])
+    assert len(report.statements) == 4
+    assert report.cache_stats()["hits"] == 1
+
+
+def test_data_version_grows_in_commit_order(monkeypatch):
+    engine = create_engine("sqlite://")
+    for model in (DataVersion, LoadChunk):
+        model.__table__.create(engine)
+    monkeypatch.setattr(unit_of_work, "engine", engine)
+    with unit_of_work.unit_of_work() as connection:
+        connection.execute(insert(DataVersion).values(id=1))
+
+    def commit_chunk(index, started_at):
+        with unit_of_work.unit_of_work() as connection:
+            connection.execute(
+                insert(LoadChunk).values(
+                    file_fk=1, chunk_index=index, start_row=0, row_count=1,
+                    status="committed", updated_at=started_at,
+                )
+            )
+            reporting.data_version.bump()
+
+    computed = []
+    cache = ResultCache(2**20, reporting.data_version.get)
+    commit_chunk(1, datetime.datetime(2026, 10, 18, 12, 0, 5))
+    cache.get_or_compute("usage", lambda: computed.append(1))
+    # a chunk transaction started earlier commits last: a max of start times doesn't change
+    commit_chunk(0, datetime.datetime(2026, 10, 18, 12, 0, 0))
+    with unit_of_work.unit_of_work() as connection:
+        loaded_at = connection.execute(select(func.max(LoadChunk.updated_at))).scalar()
+    assert loaded_at == datetime.datetime(2026, 10, 18, 12, 0, 5)
+    cache.get_or_compute("usage", lambda: computed.append(2))
+    assert computed == [1, 2]
+    assert reporting.data_version.get() == 2
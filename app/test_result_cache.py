@@ -0,0 +1,45 @@
+import pandas as pd
+
+from result_cache import ResultCache, result_size
+
+
+def test_ResultCache_hits_and_invalidation():
+    version = [1]
+    cache = ResultCache(2**20, lambda: version[0])
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return pd.DataFrame({"customers": [len(computed)]})
+
+    assert cache.get_or_compute(("q", 1), compute)["customers"].tolist() == [1]
+    assert cache.get_or_compute(("q", 1), compute)["customers"].tolist() == [1]
+    assert cache.stats()["hit_ratio"] == 0.5
+
+    version[0] = 2
+    assert cache.get_or_compute(("q", 1), compute)["customers"].tolist() == [2]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 2, 1)
+
+
+def test_ResultCache_evicts_least_recently_used():
+    result = pd.DataFrame({"value": range(100)})
+    size = result_size(result)
+    cache = ResultCache(2 * size, lambda: None)
+
+    cache.get_or_compute("a", lambda: result)
+    cache.get_or_compute("b", lambda: result)
+    cache.get_or_compute("a", lambda: result)
+    cache.get_or_compute("c", lambda: result)
+    stats = cache.stats()
+    assert (stats["entries"], stats["size_bytes"], stats["evictions"]) == (2, 2 * size, 1)
+
+    # "b" was evicted, "a" was used more recently
+    cache.get_or_compute("a", lambda: result)
+    assert cache.stats()["hits"] == 2
+    cache.get_or_compute("b", lambda: result)
+    assert cache.stats()["misses"] == 4
+
+    # results larger than the cache aren't cached
+    cache.get_or_compute("big", lambda: pd.DataFrame({"value": range(1000)}))
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_integer_dtype, is_datetime64_any_dtype
+
+from rule_engine import rule_engine
+
+RULES = {
+    "not_null": ["customer_id", "event_start_time", "charge"],
+    "integer": ["customer_id", "customer_id"],
+    "date": ["event_start_time"],
+    "currency": ["charge"],
+}
+
+
+def get_data():
+    return {
+        "customer_id": [1, "2", 3.5, None],
+        "event_start_time": [
+            "2016-01-22T05:34:48.000+02:00",
+            "2016-01-22T05:34:48.000+02:00",
+            "2016-01-22",
+            "2016-01-22T05:34:48.000+02:00",
+        ],
+        "charge": [0.212325, "1", 0.2123251, "k"],
+    }
+
+
+def test_RuleEngine_split_all_valid():
+    values = get_data()
+    df = pd.DataFrame(values).iloc[:2]
+    data, error_ds = rule_engine.split(df, RULES)
+    assert error_ds.empty
+    assert "reason" in error_ds.columns
+    assert data.index.tolist() == [0, 1]
+    assert is_integer_dtype(data["customer_id"])
+    assert is_datetime64_any_dtype(data["event_start_time"])
+    assert data["charge"].tolist() == [0.212325, "1"]
+
+
+def test_RuleEngine_split_reports_every_reason():
+    df = pd.DataFrame(get_data())
+    data, error_ds = rule_engine.split(df, RULES)
+    assert data.index.tolist() == [0, 1]
+    assert error_ds.index.tolist() == [2, 3]
+    assert error_ds.loc[2, "reason"] == (
+        "customer_id: not an integer; "
+        "event_start_time: Date format is not: '%Y-%m-%dT%H:%M:%S.%f%z'; "
+        "charge: wrong currency format. Tip: should be a maximum 6 digits after a decimal point"
+    )
+    assert error_ds.loc[3, "reason"] == (
+        "customer_id: null value; "
+        "charge: wrong currency format. Tip: should be a maximum 6 digits after a decimal point"
+    )
+    assert error_ds.drop(columns="reason").equals(df.iloc[2:])
+    assert np.array_equal(df.columns, data.columns)
+
+
+def test_RuleEngine_split_rejects_values_out_of_storage_range():
+    df = pd.DataFrame(
+        {
+            "billing_flag_1": ["1", "40000", "-32768", "1"],
+            "charge": ["1.5", "1", "-9223372036854.775807", "99999999999999.5"],
+        }
+    )
+    rules = {
+        "integer": ["billing_flag_1"],
+        "currency": ["charge"],
+        "currency_range": ["charge"],
+        "range": {"billing_flag_1": (-32768, 32767)},
+    }
+    data, error_ds = rule_engine.split(df, rules)
+    assert data.index.tolist() == [0, 2]
+    assert error_ds.loc[1, "reason"] == "billing_flag_1: out of range (-32768, 32767)"
+    assert error_ds.loc[3, "reason"] == "charge: absolute value should be below 2**63 / 10**6"
@@ -0,0 +1,83 @@
+import queue
+
+import pandas as pd
+import pytest
+
+# models create a database engine, a driver is required (no database connection)
+sharded_loader = pytest.importorskip("sharded_loader", reason="requires a postgres driver")
+
+
+class Manifest:
+    def __init__(self):
+        self.chunks = []
+
+    def commit_chunk(self, rows):
+        self.chunks.append(rows)
+
+
+class ErrorSink:
+    path = "errors.csv.gz"
+
+    def __init__(self):
+        self.written = []
+
+    def write(self, rejected, path, index):
+        self.written.append((index, rejected))
+
+
+def get_chunk(customer_ids, start=0):
+    return pd.DataFrame(
+        {"customer_id": [str(value) for value in customer_ids]},
+        index=range(start, start + len(customer_ids)),
+    )
+
+
+@pytest.fixture
+def loader():
+    loader = sharded_loader.ShardedLoader(2, error_sink=ErrorSink())
+    loader._reset(queue.Queue(), Manifest(), "usage.csv")
+    return loader
+
+
+def test_ShardedLoader_commits_chunks_in_order(loader):
+    tasks = [queue.Queue(), queue.Queue()]
+    chunks = [get_chunk(range(20)), get_chunk(range(20, 30), start=20)]
+    for index, chunk in enumerate(chunks):
+        loader._submit(index, chunk, tasks)
+    assert [loader._pending[index]["shards"] for index in (0, 1)] == [2, 2]
+    assert [shard_tasks.qsize() for shard_tasks in tasks] == [2, 2]
+
+    # the second chunk finishes first, it waits for the first one
+    for shard in range(2):
+        loader._results.put((shard, 1, {"event": 5}, get_chunk([])))
+    loader._collect()
+    assert loader._manifest.chunks == []
+
+    loader._results.put((0, 0, {"event": 8, "customer": 8}, get_chunk([3], start=3)))
+    loader._results.put((1, 0, {"event": 9}, get_chunk([1], start=1)))
+    loader._collect()
+    assert loader._manifest.chunks == [20, 10]
+    assert loader._totals == {"event": 27, "customer": 8}
+    # rejected rows of all shards of a chunk are written once, in row order
+    [(index, rejected)] = loader.error_sink.written
+    assert index == 0
+    assert rejected.index.tolist() == [1, 3]
+    assert not loader._pending
+
+
+def test_ShardedLoader_commits_chunk_without_rows(loader):
+    tasks = [queue.Queue(), queue.Queue()]
+    loader._submit(0, get_chunk([]), tasks)
+    assert all(shard_tasks.empty() for shard_tasks in tasks)
+    assert loader._manifest.chunks == [0]
+    assert loader._next_index == 1
+
+
+def test_ShardedLoader_raises_shard_error(loader):
+    loader._submit(0, get_chunk(range(20)), [queue.Queue(), queue.Queue()])
+    error = sharded_loader.ShardLoadError("shard 1, chunk 0: failed")
+    loader._results.put((0, 0, {"event": 8}, get_chunk([])))
+    loader._results.put((1, 0, error, None))
+    with pytest.raises(sharded_loader.ShardLoadError, match="shard 1, chunk 0"):
+        loader._collect()
+    assert loader._manifest.chunks == []
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from sketches import DDSketch, HyperLogLog, TopK, _bit_length, grouped_registers, hash_values
+
+
+def test_bit_length():
+    values = np.array([0, 1, 2, 3, 2**32 - 1, 2**32, 2**63 + 5, 2**64 - 1], dtype=np.uint64)
+    assert _bit_length(values).tolist() == [int(value).bit_length() for value in values.tolist()]
+
+
+def test_HyperLogLog_count_and_merge():
+    first, second = HyperLogLog(), HyperLogLog()
+    first.add(pd.Series(range(50000)))
+    second.add(pd.Series(range(25000, 100000)))
+    assert abs(first.count() - 50000) / 50000 < 0.03
+
+    first.merge(second)
+    assert abs(first.count() - 100000) / 100000 < 0.03
+    assert HyperLogLog.from_bytes(first.to_bytes()).count() == first.count()
+
+
+def test_HyperLogLog_small_cardinality():
+    hll = HyperLogLog()
+    hll.add(pd.Series(["a", "b", "c", "a"] * 100))
+    assert round(hll.count()) == 3
+
+
+def test_grouped_registers_match_single_sketches():
+    values = pd.Series(np.arange(30000) % 7000)
+    groups = (np.arange(30000) % 3).astype(np.int64)
+    registers = grouped_registers(groups, 3, hash_values(values), 12)
+    for group in range(3):
+        hll = HyperLogLog(12)
+        hll.add(values[groups == group])
+        assert np.array_equal(registers[group], hll.registers)
+
+    # daily sketches merge into a sketch of a range
+    merged = HyperLogLog(12, np.maximum.reduce(registers))
+    assert abs(merged.count() - 7000) / 7000 < 0.05
+
+
+def test_DDSketch_quantiles_within_relative_accuracy():
+    values = np.random.default_rng(0).lognormal(size=100000)
+    first, second = DDSketch(0.01), DDSketch(0.01)
+    first.add(values[:40000])
+    second.add(np.append(values[40000:], [np.nan, 0.0]))
+    first.merge(second)
+    assert first.count == 100001
+    for q in (0.5, 0.95, 0.99):
+        expected = np.quantile(values, q)
+        assert abs(first.quantile(q) - expected) / expected < 0.02
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_DDSketch_negative_values():
+    sketch = DDSketch()
+    sketch.add(np.array([-10.0, -1.0, 0.0, 1.0, 10.0]))
+    assert sketch.quantile(0) < -9.8
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1) > 9.8
+
+
+def test_TopK():
+    top_k = TopK(k=2, capacity=3)
+    top_k.add(pd.Series(["a", "a", "b", "c", "d"]))
+    top_k.add(pd.Series(["a", "b"]))
+    assert top_k.top() == [("a", 3), ("b", 2)]
+    assert top_k.total == 7
+    assert len(top_k.counts) == 3
@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+
+from setup import COLUMN_NAMES
+from sources import (
+    ADAPTERS,
+    FileSource,
+    IngestionBudget,
+    SourceAdapter,
+    SourceConfig,
+    create_adapter,
+    load_sources,
+    register_adapter,
+)
+
+
+def test_FileSource_maps_columns_to_target_layout(tmp_path):
+    path = tmp_path / "roaming.csv"
+    pd.DataFrame(
+        {
+            "msisdn_id": ["1", "2", "3"],
+            "started": ["2026-10-01T10:00:00.000+00:00"] * 3,
+            "service_type": ["ROAMING"] * 3,
+            "rate_plan_id": ["7"] * 3,
+            "billing_flag_1": ["0"] * 3,
+            "billing_flag_2": ["1"] * 3,
+            "duration": ["60", "120", "5"],
+            "charge": ["1.5", "0.25", "0"],
+            "operator": ["x", "y", "z"],
+        }
+    ).to_csv(path, index=False)
+    config = SourceConfig(
+        name="roaming",
+        path=str(path),
+        columns=[
+            "msisdn_id", "started", "service_type", "rate_plan_id", "billing_flag_1",
+            "billing_flag_2", "duration", "charge", "operator",
+        ],
+        mapping={"msisdn_id": "customer_id", "started": "event_start_time"},
+        defaults={"month": "202610"},
+    )
+    adapter = create_adapter(config)
+    assert isinstance(adapter, FileSource)
+
+    chunks = list(adapter.read_chunks(2, start_row=1))
+    assert [chunk.index.tolist() for chunk in chunks] == [[1, 2]]
+    assert list(chunks[0].columns) == COLUMN_NAMES
+    assert chunks[0]["customer_id"].tolist() == ["2", "3"]
+    assert chunks[0]["charge"].tolist() == ["0.25", "0"]
+    assert chunks[0]["month"].tolist() == ["202610", "202610"]
+
+
+def test_create_adapter_rejects_invalid_configs():
+    with pytest.raises(ValueError, match="unknown source format"):
+        create_adapter(SourceConfig(name="feed", path="feed.json", format="json"))
+    with pytest.raises(ValueError, match="month"):
+        create_adapter(SourceConfig(name="usage", path="usage.csv", columns=COLUMN_NAMES[:-1]))
+
+
+def test_register_adapter_rejects_incomplete_adapter():
+    class IncompleteSource(SourceAdapter):
+        pass
+
+    with pytest.raises(TypeError, match="read"):
+        register_adapter("incomplete")(IncompleteSource)
+    assert "incomplete" not in ADAPTERS
+    with pytest.raises(TypeError):
+        IncompleteSource(SourceConfig(name="usage", path="usage.csv"))
+
+
+def test_load_sources_names():
+    configs = [{"name": "usage", "path": "usage.csv"}, {"name": "roaming", "path": "roaming.csv"}]
+    assert [source.name for source in load_sources(configs)] == ["usage", "roaming"]
+    assert [source.name for source in load_sources(configs, ["roaming"])] == ["roaming"]
+    assert not load_sources(configs)[0].bulk
+    assert load_sources([{**config, "bulk": True} for config in configs])[0].bulk
+    with pytest.raises(ValueError, match="unknown sources"):
+        load_sources(configs, ["sms"])
+    with pytest.raises(ValueError, match="duplicate"):
+        load_sources(configs + [{"name": "usage", "path": "other.csv"}])
+    # a resumed sharded bulk load would repeat events of committed shards
+    with pytest.raises(ValueError, match="bulk load can't be sharded"):
+        load_sources([{**configs[0], "bulk": True, "shards": 2}])
+
+
+def test_IngestionBudget_limits_workers_and_connections():
+    budget = IngestionBudget(workers=4, db_connections=3)
+    serial = SourceConfig(name="usage", path="usage.csv", pipeline_workers=0)
+    pipelined = SourceConfig(name="roaming", path="roaming.csv", pipeline_workers=2)
+
+    assert budget.acquire(pipelined)
+    # 3 processes and 2 connections are used
+    assert budget.acquire(serial)
+    assert not budget.acquire(serial)
+    budget.release(pipelined)
+    assert budget.acquire(serial)
+
+    sharded = SourceConfig(name="sharded", path="usage.csv", shards=3)
+    assert IngestionBudget.requirements(sharded) == (4, 4)
+
+    with pytest.raises(ValueError, match="needs 5 processes"):
+        budget.check(SourceConfig(name="big", path="big.csv", pipeline_workers=4))
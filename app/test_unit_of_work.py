@@ -0,0 +1,69 @@
+from unittest import mock
+
+import pytest
+from sqlalchemy import create_engine, text
+
+# models create a database engine, a driver is required (no database connection)
+unit_of_work = pytest.importorskip("unit_of_work", reason="requires a postgres driver")
+
+import models
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY)"))
+    monkeypatch.setattr(unit_of_work, "engine", engine)
+    return engine
+
+
+def count(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT count(*) FROM item")).scalar()
+
+
+def test_unit_of_work_nested_block_joins_outer_transaction(engine):
+    with unit_of_work.unit_of_work() as outer:
+        outer.execute(text("INSERT INTO item VALUES (1)"))
+        with unit_of_work.unit_of_work() as inner:
+            assert inner is outer
+            inner.execute(text("INSERT INTO item VALUES (2)"))
+        # a nested block doesn't commit
+        assert count(engine) == 0
+    assert count(engine) == 2
+
+
+def test_unit_of_work_rolls_back_on_error(engine):
+    with pytest.raises(RuntimeError):
+        with unit_of_work.unit_of_work() as outer:
+            outer.execute(text("INSERT INTO item VALUES (1)"))
+            with unit_of_work.unit_of_work() as inner:
+                inner.execute(text("INSERT INTO item VALUES (2)"))
+            raise RuntimeError("load failed")
+    assert count(engine) == 0
+
+
+def test_pinned_connection_reused_by_units_of_work(engine):
+    with unit_of_work.pinned_connection() as pinned:
+        with unit_of_work.pinned_connection() as nested:
+            assert nested is pinned
+        for value in (1, 2):
+            # every block commits its own transaction on the pinned connection
+            with unit_of_work.unit_of_work() as connection:
+                assert connection is pinned
+                connection.execute(text(f"INSERT INTO item VALUES ({value})"))
+            assert not pinned.in_transaction()
+            assert count(engine) == value
+    assert pinned.closed
+    with unit_of_work.pinned_connection() as connection:
+        assert connection is not pinned
+
+
+def test_set_statement_timeout_outside_transaction():
+    dbapi_connection = mock.MagicMock(autocommit=False)
+    models.set_statement_timeout(dbapi_connection, None)
+    dbapi_connection.cursor.return_value.execute.assert_called_once_with(
+        f"SET statement_timeout = {models.DB_STATEMENT_TIMEOUT_MS}"
+    )
+    assert dbapi_connection.autocommit is False
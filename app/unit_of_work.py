@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy.engine import Connection
+
+from models import engine
+
+# connection pinned by a current pinned_connection() block
+_connection: ContextVar[Optional[Connection]] = ContextVar("connection", default=None)
+
+
+@contextmanager
+def pinned_connection() -> Iterator[Connection]:
+    """Checks out one pooled connection for all crud statements executed in a block
+        (nested blocks reuse it)
+
+    Yields:
+        Iterator[Connection]: pinned connection
+    """
+    connection = _connection.get()
+    if connection is not None:
+        yield connection
+        return
+
+    with engine.connect() as connection:
+        token = _connection.set(connection)
+        try:
+            yield connection
+        finally:
+            _connection.reset(token)
+
+
+@contextmanager
+def unit_of_work() -> Iterator[Connection]:
+    """Runs crud statements of a block in one transaction on a pinned connection. It is
+        committed when the block exits and rolled back if it raises. A nested block joins
+        the outer transaction, so every crud statement can run in a unit of work of its own
+        or as a part of a bigger one (e.g. a whole chunk)
+
+    Yields:
+        Iterator[Connection]: connection of a transaction
+    """
+    with pinned_connection() as connection:
+        if connection.in_transaction():
+            yield connection
+            return
+
+        with connection.begin():
+            yield connection